@@ -0,0 +1,37 @@
+"""Time the csv outputs end to end on a 5-minute NEM12 file
+
+Usage: python benchmarks/bench_outputs.py [num_nmis] [num_days]
+"""
+
+import logging
+import sys
+import tempfile
+from pathlib import Path
+
+from bench_tokenizer import make_nem12, timed
+
+from nemreader import NEMFile, output_as_csv, output_as_daily_csv
+from nemreader.columnar import readings_to_columnar
+
+
+def main() -> None:
+    logging.disable(logging.WARNING)
+    num_nmis = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    num_days = int(sys.argv[2]) if len(sys.argv) > 2 else 120
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = Path(tmp) / "nem12_5min.csv"
+        make_nem12(file_path, num_nmis, num_days)
+        size_mb = file_path.stat().st_size / 1024 / 1024
+        print(f"{num_nmis} NMIs x 2 channels x {num_days} days ({size_mb:.1f} MB)")
+
+        def readings_columnar():
+            readings_to_columnar(NEMFile(file_path).nem_data().readings)
+
+        timed("nem_data + to columnar", readings_columnar)
+        timed("columnar_data", NEMFile(file_path).columnar_data)
+        timed("output_as_daily_csv", lambda: output_as_daily_csv(file_path, tmp))
+        timed("output_as_csv", lambda: output_as_csv(file_path, tmp))
+
+
+if __name__ == "__main__":
+    main()
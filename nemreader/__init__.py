@@ -8,27 +8,41 @@ NEM13 (accumulated metering data) data files
 import logging
 from logging import NullHandler
 
-from .nem_reader import NEMFile, read_nem_file
-from .output_db import extend_sqlite, output_as_sqlite, output_folder_as_sqlite
+from .cache import ParseCache
+from .nem_reader import NEMFile, file_stats, read_nem_file, validate_file
+from .output_db import (
+    extend_sqlite,
+    output_as_sqlite,
+    output_folder_as_sqlite,
+    read_readings,
+)
+from .output_parquet import output_as_parquet
 from .outputs import (
     nmis_in_file,
     output_as_csv,
     output_as_daily_csv,
     output_as_data_frames,
 )
+from .stream_parser import NEM12StreamParser
 from .version import __version__
 
 __all__ = [
+    "NEM12StreamParser",
     "NEMFile",
+    "ParseCache",
     "__version__",
     "extend_sqlite",
+    "file_stats",
     "nmis_in_file",
     "output_as_csv",
     "output_as_daily_csv",
     "output_as_data_frames",
+    "output_as_parquet",
     "output_as_sqlite",
     "output_folder_as_sqlite",
     "read_nem_file",
+    "read_readings",
+    "validate_file",
 ]
 
 # Set default logging handler to avoid "No handler found" warnings.
@@ -0,0 +1,161 @@
+import csv
+import logging
+import os
+import re
+from collections.abc import Generator
+from datetime import date, datetime
+from itertools import islice
+from pathlib import Path
+
+from sqlite_utils import Database
+
+from .output_db import get_reader, readings_channels, readings_nmis
+
+log = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = None
+    pq = None
+
+BUCKET_SECONDS = {"min": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+AGGREGATE_COLUMNS = ("nmi", "bucket", "num_intervals", "total", "mean", "maximum")
+
+
+def bucket_expression(bucket: str) -> str:
+    """SQL expression for the start of the bucket containing t_start
+
+    :param bucket: A number of minutes, hours or days such as
+        "30min", "1h" or "7d", or "month" for calendar months
+    """
+    if bucket == "month":
+        return "substr(t_start, 1, 7) || '-01T00:00:00'"
+    match = re.fullmatch(r"(\d+)(min|h|d)", bucket)
+    if not match or not int(match[1]):
+        raise ValueError(f"Invalid bucket size {bucket!r}")
+    seconds = int(match[1]) * BUCKET_SECONDS[match[2]]
+    epoch = "CAST(strftime('%s', t_start) AS INTEGER)"
+    return (
+        f"strftime('%Y-%m-%dT%H:%M:%S', {epoch} / {seconds} * {seconds}, 'unixepoch')"
+    )
+
+
+def aggregate_readings(
+    db_path: Path,
+    nmi: str | None = None,
+    bucket: str = "1h",
+    start: date | datetime | None = None,
+    end: date | datetime | None = None,
+    channels: list[str] | None = None,
+) -> Generator[dict, None, None]:
+    """Aggregate readings into time buckets within SQLite
+
+    Channels are first combined into a net value for each interval,
+    with B (export) channels negated as in the `combined_readings` view.
+    Only E and B channels are included unless `channels` is given.
+    Readings are filtered with `start <= t_start < end`.
+
+    :param nmi: Limit to a single NMI, defaults to all
+        which are aggregated one NMI at a time
+    :param bucket: The bucket size, see `bucket_expression`
+    :returns: Rows of the total, mean and maximum net value per bucket
+    """
+    db = get_reader(db_path).db
+    for x in [nmi] if nmi else readings_nmis(db):
+        sql, params = aggregate_query(db, x, bucket, start, end, channels)
+        for row in db.execute(sql, params):
+            yield dict(zip(AGGREGATE_COLUMNS, row, strict=True))
+
+
+def aggregate_query(
+    db: Database,
+    nmi: str,
+    bucket: str = "1h",
+    start: date | datetime | None = None,
+    end: date | datetime | None = None,
+    channels: list[str] | None = None,
+) -> tuple[str, list]:
+    """The SQL and parameters of `aggregate_readings` for a NMI
+
+    The channels are listed explicitly, so the time range
+    is searched within the primary key of each channel.
+    """
+    if not channels:
+        channels = [x for x in readings_channels(db, nmi) if x[:1] in ("B", "E")]
+    where = ["nmi = ?", f"channel IN ({', '.join('?' for _ in channels)})"]
+    params: list = [nmi, *channels]
+    if start:
+        where.append("t_start >= ?")
+        params.append(start.isoformat())
+    if end:
+        where.append("t_start < ?")
+        params.append(end.isoformat())
+
+    sql = f"""
+    SELECT nmi, {bucket_expression(bucket)} as bucket,
+    COUNT(*) as num_intervals, SUM(value) as total,
+    AVG(value) as mean, MAX(value) as maximum
+    FROM (
+        SELECT nmi, t_start,
+        SUM(CASE WHEN substr(channel,1,1) = 'B' THEN -1 * value ELSE value END)
+        as value
+        FROM readings
+        WHERE {" AND ".join(where)}
+        GROUP BY nmi, t_start
+    )
+    GROUP BY nmi, bucket
+    ORDER BY nmi, bucket
+    """
+    return sql, params
+
+
+def output_aggregate(
+    db_path: Path,
+    output_path: Path,
+    nmi: str | None = None,
+    bucket: str = "1h",
+    start: date | datetime | None = None,
+    end: date | datetime | None = None,
+    channels: list[str] | None = None,
+    batch_size: int = 10_000,
+) -> Path:
+    """Write bucketed readings to a CSV or parquet file
+
+    The format is chosen from the file extension and rows are written
+    as they are read from the database.
+    """
+    output_path = Path(output_path)
+    rows = aggregate_readings(db_path, nmi, bucket, start, end, channels)
+    os.makedirs(output_path.parent, exist_ok=True)
+
+    if output_path.suffix == ".parquet":
+        if pa is None:
+            raise ImportError(
+                "Parquet output requires pyarrow: pip install nemreader[parquet]"
+            )
+        schema = pa.schema(
+            [
+                ("nmi", pa.string()),
+                ("bucket", pa.timestamp("s")),
+                ("num_intervals", pa.int64()),
+                ("total", pa.float64()),
+                ("mean", pa.float64()),
+                ("maximum", pa.float64()),
+            ]
+        )
+        with pq.ParquetWriter(output_path, schema) as writer:
+            while batch := list(islice(rows, batch_size)):
+                for row in batch:
+                    row["bucket"] = datetime.fromisoformat(row["bucket"])
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+    elif output_path.suffix == ".csv":
+        with open(output_path, "w", newline="") as f:
+            csv_writer = csv.DictWriter(f, fieldnames=AGGREGATE_COLUMNS)
+            csv_writer.writeheader()
+            csv_writer.writerows(rows)
+    else:
+        raise ValueError(f"Unknown output format {output_path.suffix!r}")
+    log.debug("Wrote aggregated readings to %s", output_path)
+    return output_path
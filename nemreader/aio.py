@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import os
+from collections import Counter
+from collections.abc import AsyncGenerator, Iterable
+from concurrent.futures import Executor, ThreadPoolExecutor
+from pathlib import Path
+
+from sqlite_utils import Database
+
+from .nem_objects import ReadingBlock
+from .nem_reader import NEMFile
+from .output_db import create_nmi_summary_view, reading_items, save_readings
+from .stream_parser import NEM12StreamParser
+
+log = logging.getLogger(__name__)
+
+
+async def aiter_blocks(
+    stream,
+    chunk_size: int = 64 * 1024,
+    file_name: str = "",
+    executor: Executor | None = None,
+) -> AsyncGenerator[ReadingBlock, None]:
+    """Parse NEM12 data from an asyncio stream one block at a time
+
+    :param stream: An `asyncio.StreamReader` or any object with `async read(n)`
+    :param chunk_size: Number of bytes to read at a time
+    :param executor: Where to run the parsing, defaults to the loop executor
+    """
+    loop = asyncio.get_running_loop()
+    parser = NEM12StreamParser(file_name=file_name)
+    while chunk := await stream.read(chunk_size):
+        for block in await loop.run_in_executor(executor, parser.feed, chunk):
+            yield block
+    for block in await loop.run_in_executor(executor, parser.close):
+        yield block
+
+
+async def ingest_many(
+    paths: Iterable[Path],
+    output_path: Path,
+    concurrency: int = 4,
+    split_days: bool = False,
+    set_interval: int | None = None,
+    batch_size: int = 10_000,
+    skip_errors: bool = True,
+) -> dict[Path, int]:
+    """Parse many NEM files concurrently into a single SQLite DB
+
+    Files are parsed by a pool of `concurrency` threads so the event loop
+    is never blocked. Readings are passed to a single writer in batches
+    through a bounded queue, so parsers wait when the writer falls behind.
+
+    :returns: The number of readings committed for each file.
+        A file that fails partway keeps the batches written before the error.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    os.makedirs(Path(output_path).parent, exist_ok=True)
+
+    written: Counter[Path] = Counter()  # Readings committed from each file
+
+    def parse_file(file_name: Path) -> None:
+        """Parse a file in a worker thread and queue its readings"""
+
+        def put(batch: list[dict]) -> None:
+            item = (file_name, batch)
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        batch: list[dict] = []
+        for block in NEMFile(file_name, strict=False).iter_blocks():
+            batch += reading_items(
+                block.nmi, block.suffix, block.readings, split_days, set_interval
+            )
+            if len(batch) >= batch_size:
+                put(batch)
+                batch = []
+        if batch:
+            put(batch)
+
+    async def write_batches() -> None:
+        """Write queued batches one at a time from a dedicated thread"""
+        db_holder: list[Database] = []
+        error = None
+
+        def write(batch: list[dict]) -> None:
+            if not db_holder:
+                db_holder.append(Database(output_path))
+            save_readings(db_holder[0], batch)
+
+        def finish() -> None:
+            db = db_holder[0] if db_holder else Database(output_path)
+            create_nmi_summary_view(db)
+            db.close()
+
+        with ThreadPoolExecutor(max_workers=1) as db_thread:
+            while (item := await queue.get()) is not None:
+                if error:
+                    continue  # Keep draining so parsers are not blocked
+                file_name, batch = item
+                try:
+                    await loop.run_in_executor(db_thread, write, batch)
+                except Exception as e:
+                    error = e
+                else:
+                    written[file_name] += len(batch)
+            if error:
+                raise error
+            await loop.run_in_executor(db_thread, finish)
+
+    async def ingest(file_name: Path, parsers: Executor) -> Exception | None:
+        try:
+            await loop.run_in_executor(parsers, parse_file, file_name)
+        except Exception as e:
+            log.error("Unable to process %s", file_name)
+            return e
+        return None
+
+    paths = list(paths)
+    writer = asyncio.create_task(write_batches())
+    with ThreadPoolExecutor(max_workers=concurrency) as parsers:
+        # Every parser runs to completion so none are left waiting on the queue
+        results = await asyncio.gather(*[ingest(x, parsers) for x in paths])
+    await queue.put(None)
+    await writer
+
+    errors = [x for x in results if x is not None]
+    if errors and not skip_errors:
+        raise errors[0]
+    return {x: written[x] for x in paths}
@@ -0,0 +1,198 @@
+import json
+import logging
+import mmap
+import os
+from collections.abc import Generator
+from datetime import date
+from pathlib import Path
+from typing import NamedTuple
+
+log = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+
+class RecordSpan(NamedTuple):
+    """Byte range of a 300 row and any 400/500 rows that follow it"""
+
+    interval_date: str
+    start: int
+    end: int
+
+
+class ChannelSpan(NamedTuple):
+    """Byte range of a 200 row and the records that belong to it"""
+
+    nmi: str
+    suffix: str
+    start: int
+    end: int
+    records: list[RecordSpan]
+
+
+class BlockIndex:
+    """Byte offsets of the data blocks in an uncompressed NEM12 file
+
+    Build it once with `BlockIndex.build()` and use `rows()` to read
+    only the parts of the file for a single NMI or date range.
+    """
+
+    def __init__(
+        self,
+        file_path,
+        size: int,
+        mtime_ns: int,
+        header: tuple[int, int] | None,
+        channels: list[ChannelSpan],
+    ) -> None:
+        self.file_path = file_path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.header = header
+        self.channels = channels
+
+    def __repr__(self):
+        return f"<BlockIndex {self.file_path}>"
+
+    @property
+    def nmis(self) -> list[str]:
+        """NMIs in file"""
+        return list(dict.fromkeys(x.nmi for x in self.channels))
+
+    @staticmethod
+    def sidecar_path(file_path) -> Path:
+        """Default location of the saved index for a file"""
+        return Path(f"{file_path}.idx.json")
+
+    @classmethod
+    def build(cls, file_path) -> "BlockIndex":
+        """Scan the file once and record where each block starts and ends"""
+        stat = os.stat(file_path)
+        header = None
+        channels: list[ChannelSpan] = []
+        channel = None
+        record = None  # (interval_date, start) of the current 300 row
+
+        def close_record(end: int) -> None:
+            nonlocal record
+            if record:
+                channel.records.append(RecordSpan(record[0], record[1], end))
+            record = None
+
+        if not stat.st_size:
+            return cls(file_path, stat.st_size, stat.st_mtime_ns, header, channels)
+
+        with (
+            open(file_path, "rb") as f,
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm,
+        ):
+            pos = 0
+            while pos < stat.st_size:
+                nl = mm.find(b"\n", pos)
+                end = stat.st_size if nl == -1 else nl + 1
+                prefix = mm[pos : pos + 4]
+                if prefix in (b"400,", b"500,"):
+                    pass  # Belongs to the current record
+                elif prefix == b"300," and channel:
+                    close_record(pos)
+                    line = mm[pos:end]
+                    record = (line.split(b",", 2)[1].decode(), pos)
+                elif prefix == b"200,":
+                    close_record(pos)
+                    if channel:
+                        channels.append(channel._replace(end=pos))
+                    fields = mm[pos:end].decode().split(",")
+                    channel = ChannelSpan(fields[1], fields[4], pos, end, [])
+                elif prefix == b"100,":
+                    header = (pos, end)
+                elif mm[pos:end].strip():
+                    close_record(pos)
+                pos = end
+            close_record(pos)
+            if channel:
+                channels.append(channel._replace(end=pos))
+        log.debug("Indexed %s channel blocks in %s", len(channels), file_path)
+        return cls(file_path, stat.st_size, stat.st_mtime_ns, header, channels)
+
+    def is_current(self) -> bool:
+        """Whether the file is unchanged since it was indexed"""
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return False
+        return (stat.st_size, stat.st_mtime_ns) == (self.size, self.mtime_ns)
+
+    def save(self, index_path=None) -> Path:
+        """Save the index as a JSON sidecar file"""
+        index_path = Path(index_path or self.sidecar_path(self.file_path))
+        data = {
+            "version": INDEX_VERSION,
+            "size": self.size,
+            "mtime_ns": self.mtime_ns,
+            "header": self.header,
+            "channels": self.channels,
+        }
+        with open(index_path, "w") as f:
+            json.dump(data, f)
+        return index_path
+
+    @classmethod
+    def load(cls, file_path, index_path=None) -> "BlockIndex | None":
+        """Load a saved index if it is still current for the file"""
+        index_path = Path(index_path or cls.sidecar_path(file_path))
+        try:
+            with open(index_path) as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        stat = os.stat(file_path)
+        current = (INDEX_VERSION, stat.st_size, stat.st_mtime_ns)
+        if (data["version"], data["size"], data["mtime_ns"]) != current:
+            log.debug("Ignoring out of date index %s", index_path)
+            return None
+        channels = [
+            ChannelSpan(nmi, suffix, start, end, [RecordSpan(*x) for x in records])
+            for nmi, suffix, start, end, records in data["channels"]
+        ]
+        header = tuple(data["header"]) if data["header"] else None
+        return cls(file_path, data["size"], data["mtime_ns"], header, channels)
+
+    def rows(
+        self,
+        nmi: str,
+        suffixes: list[str] | None = None,
+        start: date | None = None,
+        end: date | None = None,
+    ) -> Generator[bytes, None, None]:
+        """Yield the raw lines for a NMI, optionally limited to a date range
+
+        Each selected 200 row is followed by the 300 (and 400/500) rows
+        with an interval date between `start` and `end` inclusive.
+        """
+        first = start.strftime("%Y%m%d") if start else ""
+        last = end.strftime("%Y%m%d") if end else "99999999"
+        if not self.channels:
+            return
+        with (
+            open(self.file_path, "rb") as f,
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm,
+        ):
+            for channel in self.channels:
+                if channel.nmi != nmi:
+                    continue
+                if suffixes and channel.suffix not in suffixes:
+                    continue
+                nl = mm.find(b"\n", channel.start, channel.end)
+                detail_end = channel.end if nl == -1 else nl
+                yield mm[channel.start : detail_end].rstrip(b"\r\n")
+                for record in channel.records:
+                    if first <= record.interval_date <= last:
+                        yield from mm[record.start : record.end].splitlines()
+
+    def header_row(self) -> bytes | None:
+        """The raw header (100) line"""
+        if not self.header:
+            return None
+        with open(self.file_path, "rb") as f:
+            f.seek(self.header[0])
+            return f.read(self.header[1] - self.header[0]).rstrip(b"\r\n")
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from .columnar import ARRAY_FIELDS, ColumnarReadings
+from .nem_objects import B2BDetails12, B2BDetails13, HeaderRecord
+from .version import __version__
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024  # 1 GB
+TRANSACTION_TYPES = {x.__name__: x for x in (B2BDetails12, B2BDetails13)}
+
+
+class ParseCache:
+    """On disk cache of parsed NEM files
+
+    Entries are keyed on the file contents and library version,
+    so a changed file (or upgraded parser) is always parsed again.
+    The hash of the contents is remembered for the path, size and
+    modification time of the file, so it is only worked out once.
+    The least recently used entries are removed once the cache
+    directory grows beyond `max_size` bytes.
+    """
+
+    def __init__(self, cache_dir, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.max_size = max_size
+
+    def __repr__(self):
+        return f"<ParseCache {self.cache_dir}>"
+
+    def file_key(self, file_path) -> str:
+        """Hash of the file contents and library version"""
+        stat = os.stat(file_path)
+        stat_key = hashlib.sha256(
+            f"{__version__}|{os.path.abspath(file_path)}|"
+            f"{stat.st_size}|{stat.st_mtime_ns}".encode()
+        ).hexdigest()
+        stat_path = self.cache_dir / f"{stat_key}.key"
+        try:
+            return stat_path.read_text()
+        except OSError:
+            pass
+
+        sha = hashlib.sha256(__version__.encode())
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        key = sha.hexdigest()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(key)
+        os.replace(tmp_path, stat_path)
+        return key
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.npz"
+
+    def load(
+        self, key: str
+    ) -> tuple[HeaderRecord, ColumnarReadings, dict[str, dict[str, list]]] | None:
+        """Return the cached header, readings and transactions for a key"""
+        entry = self._entry_path(key)
+        try:
+            with np.load(entry, allow_pickle=False) as npz:
+                meta = json.loads(npz["meta"].tobytes())
+                arrays = {f: npz[f] for f in ARRAY_FIELDS}
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError):
+            log.warning("Ignoring unreadable cache entry %s", entry)
+            return None
+        os.utime(entry)  # Mark as recently used
+
+        header = HeaderRecord(*meta["header"])
+        if header.creation_date:
+            header = header._replace(
+                creation_date=datetime.fromisoformat(header.creation_date)
+            )
+        channels = [tuple(x) for x in meta["channels"]]
+        readings = ColumnarReadings(
+            channels=channels, strings=meta["strings"], **arrays
+        )
+        transactions = {
+            nmi: {
+                suffix: [TRANSACTION_TYPES[name](*fields) for name, fields in items]
+                for suffix, items in suffixes.items()
+            }
+            for nmi, suffixes in meta["transactions"].items()
+        }
+        log.debug("Loaded %s from cache", header.file_name)
+        return header, readings, transactions
+
+    def save(
+        self,
+        key: str,
+        header: HeaderRecord,
+        readings: ColumnarReadings,
+        transactions: dict[str, dict[str, list]],
+    ) -> Path:
+        """Store parsed file data then evict old entries if required"""
+        creation_date = header.creation_date
+        if creation_date:
+            creation_date = creation_date.isoformat()
+        header = header._replace(
+            creation_date=creation_date, file_name=str(header.file_name)
+        )
+        meta: dict[str, Any] = {
+            "header": list(header),
+            "channels": readings.channels,
+            "strings": readings.strings,
+            "transactions": {
+                nmi: {
+                    suffix: [(type(x).__name__, list(x)) for x in items]
+                    for suffix, items in suffixes.items()
+                }
+                for nmi, suffixes in transactions.items()
+            },
+        }
+        arrays = {f: getattr(readings, f) for f in ARRAY_FIELDS}
+        arrays["meta"] = np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = self._entry_path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, entry)  # Readers never see a partial entry
+        self.evict()
+        return entry
+
+    def evict(self) -> None:
+        """Remove least recently used entries until under the size limit
+
+        The `.key` files pointing to an entry are counted in its size and
+        removed with it. Those for entries that no longer exist are
+        removed before any entry.
+        """
+        key_files: dict[str, list[Path]] = {}
+        for path in self.cache_dir.glob("*.key"):
+            key_files.setdefault(path.read_text(), []).append(path)
+
+        entries = []  # Last used time, size and files of each entry
+        for entry in self.cache_dir.glob("*.npz"):
+            files = [entry, *key_files.pop(entry.stem, [])]
+            size = sum(x.stat().st_size for x in files)
+            entries.append((entry.stat().st_mtime, size, files))
+        entries += [(0, x.stat().st_size, [x]) for y in key_files.values() for x in y]
+        total = sum(size for _, size, _ in entries)
+        for _, size, files in sorted(entries, key=lambda x: x[0]):
+            if total <= self.max_size:
+                break
+            log.debug("Evicting %s from cache", files[0])
+            for path in files:
+                path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self) -> None:
+        """Remove all cache entries"""
+        for entry in self.cache_dir.glob("*.npz"):
+            entry.unlink(missing_ok=True)
+        for entry in self.cache_dir.glob("*.key"):
+            entry.unlink(missing_ok=True)
@@ -1,14 +1,28 @@
+import glob
+import json
 import logging
 import os
+import time
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
 from pathlib import Path
-from typing import Optional
+from typing import Any, NamedTuple, Optional
 
 import typer
 
+from .aggregate import output_aggregate
+from .nem_objects import FileValidation
+from .nem_reader import file_stats, validate_file
 from .output_db import extend_sqlite, output_as_sqlite
-from .outputs import nmis_in_file, output_as_csv, output_as_daily_csv
+from .output_parquet import output_as_parquet
+from .outputs import bytes_written, nmis_in_file, output_as_csv, output_as_daily_csv
+from .stats import ChannelStats, merge_stats
 from .version import __version__
 
+log = logging.getLogger(__name__)
+
 LOG_FORMAT = "%(asctime)s %(levelname)-8s %(message)s"
 app = typer.Typer()
 DEFAULT_DIR = Path(".")
@@ -19,6 +33,107 @@ DEFAULT_DIR_OPTION = typer.Option(
     dir_okay=True,
     writable=True,
 )
+FROM_OPTION = typer.Option(None, "--from", help="Include readings from this time")
+TO_OPTION = typer.Option(None, "--to", help="Include readings before this time")
+FILES_ARGUMENT = typer.Argument(..., help="NEM files or glob patterns")
+JOBS_OPTION = typer.Option(1, "--jobs", "-j", help="Process this many files at once")
+
+
+def expand_paths(patterns: Iterable[str]) -> list[Path]:
+    """Expand file names, folders and glob patterns into a list of files
+
+    Folders include the csv and zip files within them.
+    """
+    paths: list[Path] = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            log.info("Getting files in directory %s", pattern)
+            paths += sorted(Path(pattern).glob("*.csv"))
+            paths += sorted(Path(pattern).glob("*.zip"))
+            continue
+        if not any(x in pattern for x in "*?["):
+            paths.append(Path(pattern))
+            continue
+        matches = sorted(glob.glob(pattern, recursive=True))
+        if not matches:
+            log.warning("No files match %s", pattern)
+        paths += [Path(x) for x in matches if os.path.isfile(x)]
+    return list(dict.fromkeys(paths))
+
+
+class JobResult(NamedTuple):
+    """The result of processing a file, or why it failed"""
+
+    path: Path
+    result: Any
+    error: str | None
+
+
+def run_job(func: Callable[[Path], Any], path: Path) -> JobResult:
+    try:
+        return JobResult(path, func(path), None)
+    except Exception as e:
+        return JobResult(path, None, str(e))
+
+
+def run_jobs(
+    func: Callable[[Path], Any], paths: list[Path], jobs: int = 1
+) -> Iterator[JobResult]:
+    """Call a function for each file, in a pool of processes if jobs > 1
+
+    Results are returned in the same order as the files,
+    and a file that fails does not stop the others.
+    """
+    run = partial(run_job, func)
+    if jobs <= 1 or len(paths) <= 1:
+        yield from map(run, paths)
+        return
+    with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as executor:
+        yield from executor.map(run, paths)
+
+
+def throughput(paths: list[Path], seconds: float) -> str:
+    """Describe how quickly the files were processed"""
+    size = sum(os.path.getsize(x) for x in paths if os.path.isfile(x)) / 1e6
+    seconds = max(seconds, 1e-6)
+    return (
+        f"Processed {len(paths)} files ({size:,.1f} MB) in {seconds:.2f}s: "
+        f"{len(paths) / seconds:,.1f} files/s, {size / seconds:,.1f} MB/s"
+    )
+
+
+def process_files(
+    func: Callable[[Path], Any],
+    files: list[str],
+    jobs: int,
+    echo_result: Callable[[JobResult], None],
+) -> None:
+    """Run a command for each file, then print the overall throughput
+
+    Exits with 1 if any of the files could not be processed.
+    """
+    paths = expand_paths(files)
+    start = time.perf_counter()
+    failed = 0
+    for job in run_jobs(func, paths, jobs):
+        if job.error:
+            typer.echo(f"Unable to process {job.path}: {job.error}", err=True)
+            failed += 1
+        else:
+            echo_result(job)
+    typer.echo(throughput(paths, time.perf_counter() - start))
+    if failed:
+        raise typer.Exit(code=1)
+
+
+def echo_created(outputs: list[Path]) -> None:
+    for output, size in zip(outputs, bytes_written(outputs), strict=True):
+        typer.echo(f"Created {output} ({size:,} bytes)")
+
+
+def file_nmis(file_name: Path) -> list[tuple[str, list[str]]]:
+    """The NMIs and channels of a file"""
+    return list(nmis_in_file(file_name))
 
 
 def version_callback(value: bool):
@@ -39,68 +154,174 @@ def callback(
 
 
 @app.command()
-def list_nmis(nemfile: Path, verbose: bool = False) -> None:
+def list_nmis(
+    nemfiles: list[str] = FILES_ARGUMENT,
+    jobs: int = JOBS_OPTION,
+    verbose: bool = False,
+) -> None:
+    """List the NMIs and channels in NEM files.
+
+    nemfiles are the files, folders or glob patterns to parse.
+    """
     log_level = "DEBUG" if verbose else "WARNING"
     logging.basicConfig(level=log_level, format=LOG_FORMAT)
 
-    nmis = list(nmis_in_file(nemfile))
-    typer.echo("The following NMI[suffix] exist in this file:")
-    for nmi, suffixes in nmis:
-        suffix_str = ",".join(suffixes)
-        typer.echo(f"{nmi}[{suffix_str}]")
+    def echo_nmis(job: JobResult) -> None:
+        typer.echo(f"{job.path}")
+        typer.echo("The following NMI[suffix] exist in this file:")
+        for nmi, suffixes in job.result:
+            suffix_str = ",".join(suffixes)
+            typer.echo(f"{nmi}[{suffix_str}]")
+
+    process_files(file_nmis, nemfiles, jobs, echo_nmis)
+
+
+@app.command()
+def validate(
+    files: list[str] = FILES_ARGUMENT,
+    jobs: int = JOBS_OPTION,
+    strict: bool = False,
+    verbose: bool = False,
+) -> None:
+    """Check NEM files are valid without reading in their values.
+
+    Prints a line of JSON for each file, and exits with 1 if any are invalid.
+    With --strict a missing header (100) row is an error.
+    """
+    log_level = "DEBUG" if verbose else "CRITICAL"
+    logging.basicConfig(level=log_level, format=LOG_FORMAT)
+    check = partial(validate_file, strict=strict)
+    invalid = 0
+    for job in run_jobs(check, expand_paths(files), jobs):
+        result = job.result or FileValidation(str(job.path), False, None, job.error, [])
+        typer.echo(json.dumps(result._asdict()))
+        invalid += not result.valid
+    if invalid:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def stats(
+    files: list[str] = FILES_ARGUMENT,
+    jobs: int = JOBS_OPTION,
+    per_file: bool = False,
+    strict: bool = False,
+    verbose: bool = False,
+) -> None:
+    """Output statistics of each NMI channel as JSON.
+
+    Channels are combined across all of the files,
+    or with --per-file a line of JSON is printed for each file.
+    """
+    log_level = "DEBUG" if verbose else "ERROR"
+    logging.basicConfig(level=log_level, format=LOG_FORMAT)
+    results: list[dict[tuple[str, str], ChannelStats]] = []
+    failed = 0
+    for job in run_jobs(partial(file_stats, strict=strict), expand_paths(files), jobs):
+        if job.error:
+            typer.echo(f"Unable to read {job.path}: {job.error}", err=True)
+            failed += 1
+        elif per_file:
+            channels = [x.as_dict() for x in job.result.values()]
+            typer.echo(json.dumps({"file_name": str(job.path), "channels": channels}))
+        else:
+            results.append(job.result)
+    if not per_file:
+        channels = [x.as_dict() for x in merge_stats(results).values()]
+        typer.echo(json.dumps(channels, indent=2))
+    if failed:
+        raise typer.Exit(code=1)
 
 
 @app.command()
 def output_csv(
-    nemfile: Path,
+    nemfiles: list[str] = FILES_ARGUMENT,
+    jobs: int = JOBS_OPTION,
     verbose: bool = False,
     set_interval: int = 0,
     outdir: Path = DEFAULT_DIR_OPTION,
+    compress: Optional[str] = None,  # noqa: UP007
+    level: Optional[int] = None,  # noqa: UP007
 ) -> None:
-    """Output NEM file to transposed CSV.
+    """Output NEM files to transposed CSV.
 
-    nemfile is the name of the file to parse.
+    nemfiles are the files, folders or glob patterns to parse.
+    compress with gzip, bz2 or xz at the compression level.
     """
     log_level = "DEBUG" if verbose else "WARNING"
     logging.basicConfig(level=log_level, format=LOG_FORMAT)
-    for fname in output_as_csv(nemfile, output_dir=outdir, set_interval=set_interval):
-        typer.echo(f"Created {fname}")
+    output = partial(
+        output_as_csv,
+        output_dir=outdir,
+        set_interval=set_interval,
+        compression=compress,
+        level=level,
+    )
+    process_files(output, nemfiles, jobs, lambda x: echo_created(x.result))
 
 
 @app.command()
 def output_csv_daily(
-    nemfile: Path, verbose: bool = False, outdir: Path = DEFAULT_DIR_OPTION
+    nemfiles: list[str] = FILES_ARGUMENT,
+    jobs: int = JOBS_OPTION,
+    verbose: bool = False,
+    outdir: Path = DEFAULT_DIR_OPTION,
+    compress: Optional[str] = None,  # noqa: UP007
+    level: Optional[int] = None,  # noqa: UP007
 ) -> None:
-    """Output NEM file to transposed CSV.
+    """Output NEM files to daily totals CSV.
+
+    nemfiles are the files, folders or glob patterns to parse.
+    compress with gzip, bz2 or xz at the compression level.
+    """
+    log_level = "DEBUG" if verbose else "WARNING"
+    logging.basicConfig(level=log_level, format=LOG_FORMAT)
+    output = partial(
+        output_as_daily_csv, output_dir=outdir, compression=compress, level=level
+    )
+    process_files(output, nemfiles, jobs, lambda x: echo_created([x.result]))
+
+
+@app.command()
+def output_parquet(
+    nemfile: Path,
+    verbose: bool = False,
+    set_interval: Optional[int] = None,  # noqa: UP007
+    outdir: Path = DEFAULT_DIR_OPTION,
+) -> None:
+    """Output NEM file to a parquet dataset partitioned by NMI and month.
 
     nemfile is the name of the file to parse.
     """
     log_level = "DEBUG" if verbose else "WARNING"
     logging.basicConfig(level=log_level, format=LOG_FORMAT)
-    fname = output_as_daily_csv(nemfile, output_dir=outdir)
-    typer.echo(f"Created {fname}")
+    dataset = output_as_parquet(nemfile, output_dir=outdir, set_interval=set_interval)
+    typer.echo(f"Created {dataset}")
 
 
 @app.command()
 def output_sqlite(
-    nemfile: Path,
+    nemfiles: list[str] = FILES_ARGUMENT,
     outdir: Path = DEFAULT_DIR_OPTION,
     output_file: str = "nemdata.db",
     set_interval: Optional[int] = None,  # noqa: UP007
+    net_readings: bool = False,
+    dedup: bool = False,
+    changed_only: bool = False,
+    shards: Optional[int] = None,  # noqa: UP007
+    shard_by: str = typer.Option("nmi", help="Route readings by nmi or month"),
+    workers: Optional[int] = None,  # noqa: UP007
     verbose: bool = False,
 ) -> None:
-    """Output NEM file to SQLite DB.
+    """Output NEM files to SQLite DB.
 
-    nemfile is the name of the file or folder to parse.
+    nemfiles are the files, folders or glob patterns to parse.
+    Files are written one at a time, as SQLite has a single writer.
     """
     log_level = "DEBUG" if verbose else "WARNING"
     logging.basicConfig(level=log_level, format=LOG_FORMAT)
-    if os.path.isdir(nemfile):
-        typer.echo(f"Getting files in directory {nemfile}")
-        files = list(nemfile.glob("*.csv"))
-        files += list(nemfile.glob("*.zip"))
-    else:
-        files = [nemfile]
+    files = expand_paths(nemfiles)
+    start = time.perf_counter()
     for fp in files:
         typer.echo(f"Processing {fp}")
         try:
@@ -109,9 +330,37 @@ def output_sqlite(
                 output_dir=outdir,
                 output_file=output_file,
                 set_interval=set_interval,
+                net_readings=net_readings,
+                dedup=dedup,
+                changed_only=changed_only,
+                shards=shards,
+                shard_by=shard_by,
             )
         except Exception:
             typer.echo(f"Not a valid nem file: {fp}")
+    typer.echo(throughput(files, time.perf_counter() - start))
     db_path = outdir / output_file
-    extend_sqlite(db_path)
+    extend_sqlite(db_path, workers=workers)
     typer.echo("Finished exporting to DB.")
+
+
+@app.command()
+def aggregate(
+    dbfile: Path,
+    nmi: Optional[str] = None,  # noqa: UP007
+    bucket: str = typer.Option("1h", help="Such as 30min, 1h, 1d or month"),
+    start: Optional[datetime] = FROM_OPTION,  # noqa: UP007
+    end: Optional[datetime] = TO_OPTION,  # noqa: UP007
+    output_format: str = typer.Option("csv", "--format", help="csv or parquet"),
+    outdir: Path = DEFAULT_DIR_OPTION,
+    verbose: bool = False,
+) -> None:
+    """Output net readings from a SQLite DB summed into time buckets.
+
+    dbfile is the name of the SQLite DB created by output-sqlite.
+    """
+    log_level = "DEBUG" if verbose else "WARNING"
+    logging.basicConfig(level=log_level, format=LOG_FORMAT)
+    output_path = outdir / f"{nmi or 'all'}_{bucket}.{output_format}"
+    fname = output_aggregate(dbfile, output_path, nmi, bucket, start, end)
+    typer.echo(f"Created {fname}")
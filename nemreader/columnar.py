@@ -0,0 +1,263 @@
+from datetime import datetime
+from typing import NamedTuple
+
+import numpy as np
+
+from .nem_objects import Reading
+
+TEXT_FIELDS = (
+    "uom",
+    "meter_serial_number",
+    "quality_method",
+    "event_code",
+    "event_desc",
+)
+ARRAY_FIELDS = (
+    "offsets",
+    "t_start",
+    "t_end",
+    "read_value",
+    "val_start",
+    "val_end",
+    *TEXT_FIELDS,
+)
+
+
+class ColumnarReadings(NamedTuple):
+    """Readings for every NMI channel in a file stored as parallel arrays
+
+    The readings of channel `i` are found between `offsets[i]` and
+    `offsets[i + 1]`. Text fields are stored as codes into `strings`.
+    """
+
+    channels: list[tuple[str, str]]
+    offsets: np.ndarray
+    t_start: np.ndarray
+    t_end: np.ndarray
+    read_value: np.ndarray
+    val_start: np.ndarray
+    val_end: np.ndarray
+    uom: np.ndarray
+    meter_serial_number: np.ndarray
+    quality_method: np.ndarray
+    event_code: np.ndarray
+    event_desc: np.ndarray
+    strings: list[str | None]
+
+    def __len__(self) -> int:
+        return len(self.t_start)
+
+    def channel_slice(self, nmi: str, suffix: str) -> slice:
+        """Position of a channels readings within the arrays"""
+        i = self.channels.index((nmi, suffix))
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def to_readings(self) -> dict[str, dict[str, list[Reading]]]:
+        """Convert back to readings nested by NMI then channel"""
+        t_start = self.t_start.astype(object).tolist()
+        t_end = self.t_end.astype(object).tolist()
+        values = [_none_if_nan(x) for x in self.read_value.tolist()]
+        val_start = [_none_if_nan(x) for x in self.val_start.tolist()]
+        val_end = [_none_if_nan(x) for x in self.val_end.tolist()]
+        text = [[self.strings[c] for c in getattr(self, f)] for f in TEXT_FIELDS]
+        reads = [
+            Reading(ts, te, v, u, sn, q, ec, ed, vs, ve)
+            for ts, te, v, u, sn, q, ec, ed, vs, ve in zip(
+                t_start, t_end, values, *text, val_start, val_end, strict=True
+            )
+        ]
+
+        readings: dict[str, dict[str, list[Reading]]] = {}
+        for i, (nmi, suffix) in enumerate(self.channels):
+            start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+            readings.setdefault(nmi, {})[suffix] = reads[start:end]
+        return readings
+
+
+def _none_if_nan(value: float) -> float | None:
+    return None if value != value else value
+
+
+def readings_to_columnar(
+    readings: dict[str, dict[str, list[Reading]]],
+) -> ColumnarReadings:
+    """Convert readings nested by NMI then channel into parallel arrays"""
+    channels = []
+    offsets = [0]
+    reads: list[Reading] = []
+    for nmi in readings:
+        for suffix in readings[nmi]:
+            channels.append((nmi, suffix))
+            reads.extend(readings[nmi][suffix])
+            offsets.append(len(reads))
+
+    strings: list[str | None] = []
+    codes: dict[str | None, int] = {}
+
+    def encode(values) -> np.ndarray:
+        arr = np.empty(len(reads), dtype=np.int32)
+        for i, val in enumerate(values):
+            if val not in codes:
+                codes[val] = len(strings)
+                strings.append(val)
+            arr[i] = codes[val]
+        return arr
+
+    def floats(values) -> np.ndarray:
+        return np.array([np.nan if x is None else x for x in values], dtype=np.float64)
+
+    return ColumnarReadings(
+        channels=channels,
+        offsets=np.array(offsets, dtype=np.int64),
+        t_start=np.array([x.t_start for x in reads], dtype="datetime64[s]"),
+        t_end=np.array([x.t_end for x in reads], dtype="datetime64[s]"),
+        read_value=floats(x.read_value for x in reads),
+        val_start=floats(x.val_start for x in reads),
+        val_end=floats(x.val_end for x in reads),
+        uom=encode(x.uom for x in reads),
+        meter_serial_number=encode(x.meter_serial_number for x in reads),
+        quality_method=encode(x.quality_method for x in reads),
+        event_code=encode(x.event_code for x in reads),
+        event_desc=encode(x.event_desc for x in reads),
+        strings=strings,
+    )
+
+
+class ColumnarRecord:
+    """Readings of one channel from a single data record, as arrays
+
+    Text fields hold one value for the whole record, or a list with
+    a value for each reading once they have been changed by 400 rows.
+    """
+
+    __slots__ = ("read_value", "t_end", "t_start", "val_end", "val_start", *TEXT_FIELDS)
+
+    def __init__(
+        self,
+        t_start: np.ndarray,
+        t_end: np.ndarray,
+        read_value: np.ndarray,
+        uom: str,
+        meter_serial_number: str,
+        quality_method: str | None,
+        event_code: str | None = "",
+        event_desc: str | None = "",
+        val_start: np.ndarray | None = None,
+        val_end: np.ndarray | None = None,
+    ) -> None:
+        self.t_start = t_start
+        self.t_end = t_end
+        self.read_value = read_value
+        self.uom = uom
+        self.meter_serial_number = meter_serial_number
+        self.quality_method = quality_method
+        self.event_code = event_code
+        self.event_desc = event_desc
+        self.val_start = val_start
+        self.val_end = val_end
+
+    def __len__(self) -> int:
+        return len(self.read_value)
+
+    def set_events(
+        self,
+        start: int,
+        end: int,
+        quality_method: str,
+        event_code: str,
+        event_desc: str,
+    ) -> None:
+        """Change the quality and event of the readings from `start` to `end`"""
+        for field, value in (
+            ("quality_method", quality_method),
+            ("event_code", event_code),
+            ("event_desc", event_desc),
+        ):
+            current = getattr(self, field)
+            if not isinstance(current, list):
+                current = [current] * len(self)
+                setattr(self, field, current)
+            current[start:end] = [value] * (end - start)
+
+
+def interval_record(
+    interval_date: datetime,
+    interval: int,
+    values: np.ndarray,
+    uom: str,
+    meter_serial_number: str,
+    quality_method: str,
+    event_code: str = "",
+    event_desc: str = "",
+) -> ColumnarRecord:
+    """Readings of consecutive intervals from an interval data record (300)
+
+    :param interval: The length of each interval in minutes
+    """
+    length = np.timedelta64(interval, "m")
+    t_start = np.datetime64(interval_date, "s") + np.arange(len(values)) * length
+    return ColumnarRecord(
+        t_start,
+        t_start + length,
+        values,
+        uom,
+        meter_serial_number,
+        quality_method,
+        event_code,
+        event_desc,
+    )
+
+
+def build_columnar(
+    records: dict[str, dict[str, list[ColumnarRecord]]],
+) -> ColumnarReadings:
+    """Combine the records of each channel, nested by NMI, into parallel arrays
+
+    Text fields are encoded in the same order as readings_to_columnar.
+    """
+    channels = []
+    offsets = [0]
+    parts: list[ColumnarRecord] = []
+    for nmi in records:
+        for suffix, channel_records in records[nmi].items():
+            channels.append((nmi, suffix))
+            parts.extend(channel_records)
+            offsets.append(offsets[-1] + sum(len(x) for x in channel_records))
+
+    strings: list[str | None] = []
+    codes: dict[str | None, int] = {}
+
+    def code(val: str | None) -> int:
+        if val not in codes:
+            codes[val] = len(strings)
+            strings.append(val)
+        return codes[val]
+
+    def encode(field: str) -> np.ndarray:
+        arrays = [np.empty(0, dtype=np.int32)]
+        for part in parts:
+            val = getattr(part, field)
+            if isinstance(val, list):
+                arrays.append(np.array([code(x) for x in val], dtype=np.int32))
+            else:
+                arrays.append(np.full(len(part), code(val), dtype=np.int32))
+        return np.concatenate(arrays)
+
+    def join(field: str, dtype) -> np.ndarray:
+        arrays = [np.empty(0, dtype=dtype)]
+        for part in parts:
+            val = getattr(part, field)
+            arrays.append(np.full(len(part), np.nan) if val is None else val)
+        return np.concatenate(arrays).astype(dtype, copy=False)
+
+    return ColumnarReadings(
+        channels=channels,
+        offsets=np.array(offsets, dtype=np.int64),
+        t_start=join("t_start", "datetime64[s]"),
+        t_end=join("t_end", "datetime64[s]"),
+        read_value=join("read_value", np.float64),
+        val_start=join("val_start", np.float64),
+        val_end=join("val_end", np.float64),
+        **{field: encode(field) for field in TEXT_FIELDS},
+        strings=strings,
+    )
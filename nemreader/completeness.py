@@ -0,0 +1,264 @@
+import logging
+from collections import Counter
+from collections.abc import Generator, Iterable
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+from sqlite_utils import Database
+
+from .columnar import ColumnarReadings
+from .nem_reader import NEMFile
+from .output_db import get_nmis, get_reader
+
+log = logging.getLogger(__name__)
+
+# Status of each interval, in the order of their codes
+STATUSES = ("actual", "zero", "not_actual", "missing")
+ACTUAL, ZERO, NOT_ACTUAL, MISSING = range(len(STATUSES))
+# Statuses of intervals without a usable reading
+INCOMPLETE = ("not_actual", "missing")
+
+
+def incomplete_statuses(include_zero: bool = False) -> tuple[str, ...]:
+    """The statuses flagged as incomplete, optionally with readings of zero
+
+    Zero can be an actual reading, such as export at night,
+    or be filled in by the meter for readings that were not received.
+    """
+    return (*INCOMPLETE, "zero") if include_zero else INCOMPLETE
+
+
+class CoverageRange(NamedTuple):
+    """A run of consecutive intervals with the same status"""
+
+    status: str
+    start: datetime
+    end: datetime
+    intervals: int
+
+
+class ChannelCoverage(NamedTuple):
+    """Completeness of the readings of a channel"""
+
+    nmi: str
+    channel: str
+    ranges: list[CoverageRange]
+    quality: dict[str, int]  # Number of readings of each quality method
+
+    @property
+    def complete(self) -> bool:
+        """Whether every interval has an actual reading, which may be zero"""
+        return self.is_complete()
+
+    def is_complete(self, include_zero: bool = False) -> bool:
+        """Whether every interval has an actual reading
+
+        :param include_zero: Also treat readings of zero as incomplete
+        """
+        flagged = incomplete_statuses(include_zero)
+        return not any(x.status in flagged for x in self.ranges)
+
+
+def channel_coverage(
+    nmi: str, channel: str, t_start, t_end, values, quality: Iterable[str | None]
+) -> ChannelCoverage:
+    """Run length encode the status of each interval of a channel
+
+    Intervals are expected for every whole day from the first
+    to the last reading. Readings without an actual ("A") quality method
+    are `not_actual`, and actual readings of zero are `zero`.
+    Gaps between readings are `missing`, counted in whole intervals of the
+    length of the reading before them. So the interval length can change,
+    and gaps shorter than a reading, such as between NEM13 register reads,
+    are ignored.
+    """
+    quality = list(quality)
+    t_start = np.asarray(t_start, dtype="datetime64[s]")
+    t_end = np.asarray(t_end, dtype="datetime64[s]")
+    values = np.asarray(values, dtype=np.float64)
+    if not len(t_start):
+        return ChannelCoverage(nmi, channel, [], {})
+
+    not_actual = np.array([not (x or "").startswith("A") for x in quality], bool)
+    reading_status = np.where(
+        not_actual, NOT_ACTUAL, np.where(values == 0, ZERO, ACTUAL)
+    )
+    reading_status[np.isnan(values)] = MISSING
+
+    order = np.argsort(t_start, kind="stable")
+    t_start, t_end, reading_status = t_start[order], t_end[order], reading_status[order]
+    first_day = t_start[0].astype("datetime64[D]").astype("datetime64[s]")
+    last_day = (t_end.max() - np.timedelta64(1, "s")).astype("datetime64[D]") + 1
+    lengths = np.maximum(t_end - t_start, np.timedelta64(1, "s"))
+
+    # The gap before each reading, and after the last one
+    gap_start = np.concatenate([[first_day], np.maximum.accumulate(t_end)])
+    gap_end = np.concatenate([t_start, [last_day.astype("datetime64[s]")]])
+    gap_length = np.concatenate([lengths[:1], lengths])
+    gap_intervals = (gap_end - gap_start) // gap_length
+
+    # Interleave the gaps and readings, then drop the empty gaps
+    num = len(t_start)
+    starts = np.empty(2 * num + 1, dtype="datetime64[s]")
+    ends = np.empty(2 * num + 1, dtype="datetime64[s]")
+    status = np.full(2 * num + 1, MISSING, dtype=np.int8)
+    intervals = np.ones(2 * num + 1, dtype=np.int64)
+    starts[0::2], ends[0::2], intervals[0::2] = gap_start, gap_end, gap_intervals
+    starts[1::2], ends[1::2], status[1::2] = t_start, t_end, reading_status
+    keep = intervals > 0
+    starts, ends, status, intervals = (
+        starts[keep],
+        ends[keep],
+        status[keep],
+        intervals[keep],
+    )
+
+    run_starts = np.concatenate([[0], np.flatnonzero(np.diff(status)) + 1])
+    run_ends = np.maximum.reduceat(ends.astype(np.int64), run_starts)
+    run_intervals = np.add.reduceat(intervals, run_starts)
+    ranges = [
+        CoverageRange(
+            STATUSES[status[i]],
+            starts[i].astype(datetime),
+            np.datetime64(end, "s").astype(datetime),
+            count,
+        )
+        for i, end, count in zip(
+            run_starts.tolist(),
+            run_ends.tolist(),
+            run_intervals.tolist(),
+            strict=True,
+        )
+    ]
+    return ChannelCoverage(nmi, channel, ranges, dict(Counter(quality)))
+
+
+def file_coverage(file_name) -> list[ChannelCoverage]:
+    """Completeness of each channel in a NEM file"""
+    columns: ColumnarReadings = NEMFile(file_name, strict=False).columnar_data()
+    results = []
+    for nmi, channel in columns.channels:
+        i = columns.channel_slice(nmi, channel)
+        quality = [columns.strings[x] for x in columns.quality_method[i]]
+        results.append(
+            channel_coverage(
+                nmi,
+                channel,
+                columns.t_start[i],
+                columns.t_end[i],
+                columns.read_value[i],
+                quality,
+            )
+        )
+    return results
+
+
+def db_coverage(db_path: Path, nmi: str) -> Generator[ChannelCoverage, None, None]:
+    """Completeness of each channel of a NMI in the sqlite export"""
+    rows = get_reader(db_path).db.execute(
+        """SELECT channel, t_start, t_end, value, quality_method
+        FROM readings WHERE nmi = ? ORDER BY channel, t_start""",
+        [nmi],
+    )
+    channel_rows: dict[str, list] = {}
+    for row in rows:
+        channel_rows.setdefault(row[0], []).append(row[1:])
+    for channel, reads in channel_rows.items():
+        t_start, t_end, values, quality = zip(*reads, strict=True)
+        yield channel_coverage(
+            nmi,
+            channel,
+            np.array(t_start, dtype="datetime64[s]"),
+            np.array(t_end, dtype="datetime64[s]"),
+            np.array(values, dtype=np.float64),
+            quality,
+        )
+
+
+def update_coverage(db_path: Path, nmis: Iterable[str] | None = None) -> None:
+    """Recalculate the `coverage` and `coverage_quality` tables
+
+    :param nmis: Only update these NMIs, defaults to all
+    """
+    db = Database(db_path)
+    db["coverage"].create(
+        {
+            "nmi": str,
+            "channel": str,
+            "status": str,
+            "start": datetime,
+            "end": datetime,
+            "intervals": int,
+        },
+        pk=("nmi", "channel", "start"),
+        if_not_exists=True,
+    )
+    db["coverage_quality"].create(
+        {"nmi": str, "channel": str, "quality_method": str, "count": int},
+        pk=("nmi", "channel", "quality_method"),
+        if_not_exists=True,
+    )
+    for nmi in nmis or get_nmis(db_path):
+        coverages = list(db_coverage(db_path, nmi))
+        ranges = [
+            (
+                nmi,
+                x.channel,
+                r.status,
+                r.start.isoformat(),
+                r.end.isoformat(),
+                r.intervals,
+            )
+            for x in coverages
+            for r in x.ranges
+        ]
+        quality = [
+            (nmi, x.channel, q, n) for x in coverages for q, n in x.quality.items()
+        ]
+        # Replace the rows of a NMI in one transaction, so readers never see it empty
+        with db.conn:
+            db.execute("DELETE FROM coverage WHERE nmi = ?", [nmi])
+            db.execute("DELETE FROM coverage_quality WHERE nmi = ?", [nmi])
+            db.conn.executemany(
+                """INSERT INTO coverage (nmi, channel, status, start, end, intervals)
+                VALUES (?, ?, ?, ?, ?, ?)""",
+                ranges,
+            )
+            db.conn.executemany(
+                """INSERT INTO coverage_quality (nmi, channel, quality_method, count)
+                VALUES (?, ?, ?, ?)""",
+                quality,
+            )
+    db["coverage"].create_index(["status", "nmi"], if_not_exists=True)
+    log.info("Updated coverage")
+
+
+def incomplete_days(
+    db_path: Path, nmis: Iterable[str] | None = None, include_zero: bool = False
+) -> dict[str, set[date]]:
+    """Days with missing or non actual intervals, using the coverage table
+
+    :param include_zero: Also include days with readings of zero
+    """
+    params = list(incomplete_statuses(include_zero))
+    sql = "SELECT nmi, start, end FROM coverage WHERE status IN ({})".format(
+        ", ".join("?" for _ in params)
+    )
+    if nmis is not None:
+        nmis = list(nmis)
+        sql += f" AND nmi IN ({', '.join('?' for _ in nmis)})"
+        params += nmis
+    days: dict[str, set[date]] = {}
+    db = Database(db_path)
+    if not db["coverage"].exists():
+        return days
+    for nmi, start, end in db.execute(sql, params):
+        first = datetime.fromisoformat(start).date()
+        last = (datetime.fromisoformat(end) - timedelta(seconds=1)).date()
+        nmi_days = days.setdefault(nmi, set())
+        nmi_days.update(
+            first + timedelta(days=i) for i in range((last - first).days + 1)
+        )
+    return days
@@ -0,0 +1,133 @@
+import logging
+from datetime import datetime
+from typing import NamedTuple
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+class MonthlyDemand(NamedTuple):
+    """Maximum demand and load factor for a month"""
+
+    month: str
+    max_demand: float  # kW
+    peak_start: datetime | None
+    energy: float  # kWh
+    load_factor: float
+
+
+class CoincidentPeak(NamedTuple):
+    """The combined peak of several NMIs and each NMIs demand at that time"""
+
+    peak_start: datetime | None
+    demand: float  # kW
+    contributions: dict[str, float]
+
+
+def _sorted_arrays(t_start, values) -> tuple[np.ndarray, np.ndarray]:
+    t_start = np.asarray(t_start, dtype="datetime64[m]")
+    values = np.asarray(values, dtype=np.float64)
+    order = np.argsort(t_start, kind="stable")
+    return t_start[order], values[order]
+
+
+def rolling_demand(
+    t_start, values, interval: int, window: int = 30
+) -> tuple[np.ndarray, np.ndarray]:
+    """Average demand in kW over each rolling window of readings
+
+    Window totals are taken as differences of a cumulative sum,
+    so the cost does not depend on the window length.
+
+    :param t_start: Start time of each reading, in order
+    :param values: Energy of each reading in kWh
+    :param interval: The length of each reading in minutes
+    :param window: The demand window in minutes, a multiple of `interval`
+    :returns: The start of each window and its demand,
+        which is NaN for windows with missing readings
+    """
+    if window < interval or window % interval:
+        raise ValueError(f"Window of {window} is not a multiple of {interval} min")
+    t_start = np.asarray(t_start, dtype="datetime64[m]")
+    values = np.asarray(values, dtype=np.float64)
+    num = window // interval
+    if len(values) < num:
+        return t_start[:0], values[:0]
+    totals = np.concatenate([[0.0], np.cumsum(np.nan_to_num(values))])
+    window_energy = totals[num:] - totals[:-num]
+    missing = np.concatenate([[0], np.cumsum(np.isnan(values))])
+    starts = t_start[: len(t_start) - num + 1]
+    span = t_start[num - 1 :] - starts
+    complete = span == np.timedelta64((num - 1) * interval, "m")
+    complete &= missing[num:] == missing[:-num]
+    return starts, np.where(complete, window_energy * 60 / window, np.nan)
+
+
+def monthly_demand(
+    t_start, values, interval: int, window: int = 30
+) -> list[MonthlyDemand]:
+    """Maximum demand, time of peak and load factor for each month
+
+    The load factor is the average demand of the readings in the month
+    divided by the maximum demand.
+    """
+    t_start, values = _sorted_arrays(t_start, values)
+    starts, demand = rolling_demand(t_start, values, interval, window)
+
+    months, month_index = np.unique(
+        t_start.astype("datetime64[M]"), return_inverse=True
+    )
+    energy = np.bincount(month_index, np.nan_to_num(values), len(months))
+    hours = np.bincount(month_index, ~np.isnan(values), len(months)) * interval / 60
+    window_month = np.searchsorted(months, starts.astype("datetime64[M]"))
+
+    results = []
+    for i, month in enumerate(months):
+        in_month = np.flatnonzero((window_month == i) & ~np.isnan(demand))
+        if not len(in_month):
+            max_demand, peak_start, load_factor = np.nan, None, np.nan
+        else:
+            peak = in_month[np.argmax(demand[in_month])]
+            max_demand = float(demand[peak])
+            peak_start = starts[peak].astype(datetime)
+            average = energy[i] / hours[i] if hours[i] else np.nan
+            load_factor = average / max_demand if max_demand > 0 else np.nan
+        results.append(
+            MonthlyDemand(
+                str(month), max_demand, peak_start, float(energy[i]), float(load_factor)
+            )
+        )
+    return results
+
+
+def coincident_peak(
+    series: dict[str, tuple[np.ndarray, np.ndarray]], interval: int, window: int = 30
+) -> CoincidentPeak:
+    """Find the peak of the combined demand of several NMIs
+
+    :param series: The start times and values of each NMI
+    :returns: The peak window and the demand of each NMI during it
+    """
+    if not series:
+        return CoincidentPeak(None, np.nan, {})
+    all_starts = np.concatenate(
+        [np.asarray(t, dtype="datetime64[m]") for t, _ in series.values()]
+    )
+    all_values = np.concatenate([np.asarray(v, float) for _, v in series.values()])
+    times, index = np.unique(all_starts, return_inverse=True)
+    total = np.bincount(index, np.nan_to_num(all_values), len(times))
+    starts, demand = rolling_demand(times, total, interval, window)
+    if not len(demand) or np.isnan(demand).all():
+        return CoincidentPeak(None, np.nan, {})
+
+    peak = int(np.nanargmax(demand))
+    first = starts[peak]
+    last = first + np.timedelta64(window, "m")
+    contributions = {}
+    for nmi, (t, v) in series.items():
+        t = np.asarray(t, dtype="datetime64[m]")
+        in_window = (t >= first) & (t < last)
+        energy = np.nansum(np.asarray(v, float)[in_window])
+        contributions[nmi] = float(energy * 60 / window)
+    return CoincidentPeak(first.astype(datetime), float(demand[peak]), contributions)
@@ -93,6 +93,26 @@ class EventRecord(NamedTuple):
     reason_description: str
 
 
+class ReadingBlock(NamedTuple):
+    """Readings for one channel from a single data record (300 or 250)"""
+
+    nmi: str
+    suffix: str
+    interval_date: datetime | None
+    update_datetime: datetime | None
+    readings: list[Reading]
+
+
+class FileValidation(NamedTuple):
+    """Whether a NEM file is structurally valid"""
+
+    file_name: str
+    valid: bool
+    version: str | None  # NEM12 or NEM13, if the header could be read
+    error: str | None  # Why the file could not be parsed
+    warnings: list[str]  # Problems that were skipped over
+
+
 class B2BDetails12(NamedTuple):
     """B2B details record (500)"""
 
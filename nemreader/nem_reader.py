@@ -1,27 +1,42 @@
 import csv
 import io
 import logging
+import os
 import zipfile
-from collections.abc import Generator, Iterable
-from datetime import datetime, timedelta
+from collections.abc import Callable, Generator, Iterable, Iterator
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 from itertools import chain, islice
 from typing import Any
 
+import numpy as np
 import pandas as pd
 
+from .block_index import BlockIndex
+from .cache import ParseCache
+from .columnar import (
+    ColumnarReadings,
+    ColumnarRecord,
+    build_columnar,
+    interval_record,
+    readings_to_columnar,
+)
 from .nem_objects import (
     B2BDetails12,
     B2BDetails13,
     BasicMeterData,
     EventRecord,
+    FileValidation,
     HeaderRecord,
     IntervalRecord,
     NEMData,
     NEMReadings,
     NmiDetails,
     Reading,
+    ReadingBlock,
 )
 from .split_days import make_set_interval, split_multiday_reads
+from .stats import ChannelStats
 
 log = logging.getLogger(__name__)
 
@@ -31,12 +46,27 @@ minutes_per_day = 24 * 60
 class NEMFile:
     """An NEM file object"""
 
-    def __init__(self, file_path, fileobj=None, strict: bool = False) -> None:
+    def __init__(
+        self,
+        file_path,
+        fileobj=None,
+        strict: bool = False,
+        cache: ParseCache | str | os.PathLike | None = None,
+        tokenizer: Callable[[Iterable[str]], Iterator[list[str]]] | None = None,
+        dedup: bool = False,
+    ) -> None:
         self.file_path = file_path
         self.fileobj = fileobj
         self.strict = strict
+        self.dedup = dedup
+        self.tokenizer = tokenizer or fast_tokenizer
+        if cache is not None and not isinstance(cache, ParseCache):
+            cache = ParseCache(cache)
+        self.cache = cache
         self._nmis: set = set()
         self._nmi_channels: dict = {}
+        self._block_index: BlockIndex | None = None
+        self._index_saved = False  # whether the block index matches its sidecar
 
     def __repr__(self):
         return f"<NEMFile {self.file_path}>"
@@ -57,79 +87,275 @@ class NEMFile:
         self.nem_data()  # Need to process file first
         return self._nmi_channels
 
-    def parse_nem_file(self, nem_file, file_name="") -> NEMReadings:
-        """Parse NEM file and return meter readings named tuple"""
-        reader = csv.reader(nem_file, delimiter=",")
+    @contextmanager
+    def _open_lines(self) -> Generator[tuple[Iterable[str], str], None, None]:
+        """Open the (possibly zipped) NEM file and yield its lines and name"""
+        source = self.fileobj if isinstance(self.fileobj, io.IOBase) else self.file_path
+        if isinstance(source, io.TextIOBase):
+            yield source, self.file_path
+            return
+        try:
+            datafile = zipfile.ZipFile(source)
+        except zipfile.BadZipFile:
+            """Not a zip"""
+            if not isinstance(source, io.IOBase):
+                with open(source) as text:
+                    yield text, self.file_path
+                return
+            """If we've been given a binary IO stream change it"""
+            source.seek(0)
+            text = io.TextIOWrapper(source, encoding="utf-8")
+            try:
+                yield text, self.file_path
+            finally:
+                text.detach()  # Leave the callers stream open
+            return
+
+        with datafile:
+            files = datafile.namelist()
+            if len(files) > 1:
+                raise ValueError("Only zip files with one file are supported")
+            csv_file = files[0]
+            # Zip file is open in binary mode so decode as it is read
+            with (
+                datafile.open(csv_file) as csv_bytes,
+                io.TextIOWrapper(csv_bytes, encoding="utf-8") as csv_text,
+            ):
+                yield csv_text, csv_file
+
+    def _read_header(self, reader: Iterator, file_name="") -> Iterator:
+        """Parse the header (100) row and return the remaining rows"""
         first_row = next(reader, None)
 
         # Some Powercor/Citipower files have empty line at start, skip if so.
         if not first_row:
             first_row = next(reader, None)
 
-        try:
-            record_indicator = int(first_row[0])
-        except Exception:
-            record_indicator = 0
+        header = parse_header_row(first_row, file_name, self.strict)
+        self.header = header
+        if header.assumed and first_row:
+            # We have to parse the first row again so we don't miss any data.
+            return chain([first_row], reader)
+        return reader
 
-        if not first_row or record_indicator != 100:
-            if self.strict:
-                raise ValueError("NEM Files must start with a 100 row")
-            else:
-                log.warning("Missing header (100) row, assuming NEM12.")
-                header = HeaderRecord("NEM12", None, "", "", file_name, assumed=True)
+    def parse_nem_file(self, nem_file, file_name="") -> NEMReadings:
+        """Parse NEM file and return meter readings named tuple"""
+        reader = self._read_header(self.tokenizer(nem_file), file_name)
+        if self.header.version_header == "NEM12":
+            return parse_nem12_rows(reader, file_name=file_name, dedup=self.dedup)
         else:
-            header = parse_100_row(first_row, file_name)
-            if header.version_header not in ["NEM12", "NEM13"]:
-                raise ValueError(f"Invalid NEM version {header.version_header}")
+            return parse_nem13_rows(reader)
 
+    def _cache_key(self) -> str | None:
+        """Cache key for the file, if caching is enabled and possible"""
+        if self.cache is None:
+            return None
+        if self.fileobj is not None or not isinstance(
+            self.file_path, str | os.PathLike
+        ):
+            log.debug("Parse cache is only supported for file paths")
+            return None
+        key = self.cache.file_key(self.file_path)
+        return f"{key}-dedup" if self.dedup else key
+
+    def _load_cached(
+        self, key: str | None
+    ) -> tuple[ColumnarReadings, dict[str, dict[str, list]]] | None:
+        """Load previously parsed data from the cache"""
+        cached = self.cache.load(key) if key else None
+        if not cached:
+            return None
+        header, columns, transactions = cached
+        if not zipfile.is_zipfile(self.file_path):
+            header = header._replace(file_name=self.file_path)
         self.header = header
-        if header.assumed:
-            # We have to parse the first row again so we don't miss any data.
-            reader = chain([first_row], reader)
-            return parse_nem12_rows(reader, file_name=nem_file)
-        if header.version_header == "NEM12":
-            return parse_nem12_rows(reader, file_name=nem_file)
+        return columns, transactions
+
+    def columnar_data(self) -> ColumnarReadings:
+        """Return readings for all channels as parallel numpy arrays"""
+        return self.columnar_with_transactions()[0]
+
+    def columnar_with_transactions(
+        self,
+    ) -> tuple[ColumnarReadings, dict[str, dict[str, list]]]:
+        """Return the columnar readings and the transactions of each NMI channel"""
+        key = self._cache_key()
+        cached = self._load_cached(key)
+        if cached:
+            columns, transactions = cached
         else:
-            return parse_nem13_rows(reader)
+            columns, transactions = self._parse_columnar()
+            if key:
+                self.cache.save(key, self.header, columns, transactions)
+        self._set_channels(transactions)
+        return columns, transactions
+
+    def _parse_columnar(
+        self,
+    ) -> tuple[ColumnarReadings, dict[str, dict[str, list]]]:
+        with self._open_lines() as (lines, file_name):
+            reader = self._read_header(self.tokenizer(lines), file_name)
+            if self.header.version_header == "NEM12":
+                return parse_nem12_columnar(reader, file_name, self.dedup)
+            reads = parse_nem13_rows(reader)
+        return readings_to_columnar(reads.readings), reads.transactions
+
+    def _parse(self) -> NEMReadings:
+        with self._open_lines() as (lines, file_name):
+            return self.parse_nem_file(lines, file_name=file_name)
+
+    def _set_channels(self, transactions: dict[str, dict[str, list]]) -> None:
+        for nmi in transactions:
+            self._nmis.add(nmi)
+            suffixes = list(transactions[nmi].keys())
+            self._nmi_channels[nmi] = suffixes
 
     def nem_data(self) -> NEMData:
         """Return data in legacy data format"""
+        key = self._cache_key()
+        cached = self._load_cached(key)
+        if cached:
+            columns, transactions = cached
+            reads = NEMReadings(columns.to_readings(), transactions)
+        else:
+            reads = self._parse()
+            if key:
+                columns = readings_to_columnar(reads.readings)
+                self.cache.save(key, self.header, columns, reads.transactions)
+
+        self._set_channels(reads.transactions)
+        return NEMData(
+            header=self.header,
+            readings=reads.readings,
+            transactions=reads.transactions,
+        )
+
+    def validate(self) -> FileValidation:
+        """Check the structure of the file without building its readings
+
+        The rows are checked the same way as when they are parsed,
+        so a file is valid if its readings could be read.
+        Both NEM12 and NEM13 files are streamed a row at a time.
+        """
+        version = None
+        warnings: list[str] = []
         try:
-            if not isinstance(self.fileobj, io.IOBase):
-                datafile = zipfile.ZipFile(self.file_path)
-            else:
-                datafile = zipfile.ZipFile(self.fileobj)
-            files = datafile.namelist()
-            if len(files) > 1:
-                raise ValueError("Only zip files with one file are supported")
-            csv_file = files[0]
-            with datafile.open(csv_file) as csv_text:
-                # Zip file is open in binary mode
-                # So decode then convert back to list
-                nmi_file = csv_text.read().decode("utf-8").splitlines()
-            reads = self.parse_nem_file(nmi_file, file_name=csv_file)
-        except zipfile.BadZipFile:
-            """Not a zip"""
-            if not isinstance(self.fileobj, io.IOBase):
-                datafile = open(self.file_path)  # noqa: SIM115
-            else:
-                """If we've been given a binary IO stream change it"""
-                if not isinstance(self.fileobj, io.TextIOBase):
-                    datafile = self.fileobj.read().decode("utf-8")
+            with self._open_lines() as (lines, file_name):
+                reader = self._read_header(self.tokenizer(lines), file_name)
+                version = self.header.version_header
+                if self.header.assumed:
+                    warnings.append("Missing header (100) row, assuming NEM12.")
+                if version == "NEM12":
+                    parser = NEM12RecordParser(file_name, validate_only=True)
+                    for row in reader:
+                        parser.push(row)
+                    parser.finish()
+                    warnings += parser.warnings
                 else:
-                    datafile = self.fileobj
-            reads = self.parse_nem_file(datafile, file_name=self.file_path)
-
-        for nmi in reads.transactions:
-            self._nmis.add(nmi)
-            suffixes = list(reads.transactions[nmi].keys())
-            self._nmi_channels[nmi] = suffixes
+                    for _ in iter_nem13_records(reader, readings=False):
+                        pass
+        except Exception as e:  # Any failure to parse makes the file invalid
+            error = f"{e}: {e.__cause__}" if e.__cause__ else str(e)
+            return FileValidation(
+                str(self.file_path), False, version, error or repr(e), warnings
+            )
+        return FileValidation(str(self.file_path), True, version, None, warnings)
+
+    def channel_stats(self) -> dict[tuple[str, str], ChannelStats]:
+        """Statistics of each NMI channel, read in a single pass of the file
+
+        NEM12 interval values are summed as they are read
+        without building any readings.
+        """
+        with self._open_lines() as (lines, file_name):
+            reader = self._read_header(self.tokenizer(lines), file_name)
+            if self.header.version_header == "NEM12":
+                return nem12_stats(reader, file_name=file_name)
+            results: dict[tuple[str, str], ChannelStats] = {}
+            for nmi_d, record in iter_nem13_records(reader):
+                key = (nmi_d.nmi, nmi_d.nmi_suffix)
+                if key not in results:
+                    results[key] = ChannelStats(*key, nmi_d.uom)
+                if isinstance(record, Reading):
+                    results[key].add_reading(record)
+            return results
+
+    def block_index(self, save: bool = False) -> BlockIndex:
+        """Return the byte offset index of an uncompressed NEM12 file
+
+        The index is kept for later calls while the file is unchanged.
+        Otherwise a saved sidecar index is used if it is still current,
+        or the file is scanned (and optionally saved).
+        """
+        if self.fileobj is not None or zipfile.is_zipfile(self.file_path):
+            raise ValueError("Block index requires an uncompressed file path")
+        index = self._block_index
+        if index is None or not index.is_current():
+            index = BlockIndex.load(self.file_path)
+            self._index_saved = index is not None
+            if index is None:
+                index = BlockIndex.build(self.file_path)
+            self._block_index = index
+        if save and not self._index_saved:
+            index.save()
+            self._index_saved = True
+        return index
+
+    def indexed_data(
+        self,
+        nmi: str,
+        suffixes: list[str] | None = None,
+        start: date | None = None,
+        end: date | None = None,
+        save_index: bool = False,
+    ) -> NEMData:
+        """Return data for a single NMI by only parsing its part of the file
+
+        :param nmi: The NMI to read
+        :param suffixes: Limit to these channels
+        :param start: First interval date to include
+        :param end: Last interval date to include
+        :param save_index: Save the block index as a sidecar file for next time
+        """
+        index = self.block_index(save=save_index)
+        header_row = index.header_row()
+        header_rows = [header_row.decode("utf-8")] if header_row else []
+        self._read_header(self.tokenizer(header_rows), self.file_path)
+        if self.header.version_header != "NEM12":
+            raise ValueError("Block index only supports NEM12 files")
+        lines = (x.decode("utf-8") for x in index.rows(nmi, suffixes, start, end))
+        lines = chain(lines, ["900"])  # The end of data row is not part of a block
+        reads = parse_nem12_rows(
+            self.tokenizer(lines), file_name=self.file_path, dedup=self.dedup
+        )
         return NEMData(
             header=self.header,
             readings=reads.readings,
             transactions=reads.transactions,
         )
 
+    def iter_blocks(self) -> Generator[ReadingBlock, None, None]:
+        """Yield readings one data record (300 or 250 row) at a time
+
+        Unlike nem_data() only the current record is held in memory,
+        so this suits very large files. Blocks are not deduplicated,
+        see `latest_blocks`.
+        """
+        with self._open_lines() as (lines, file_name):
+            reader = self._read_header(self.tokenizer(lines), file_name)
+            if self.header.version_header == "NEM12":
+                records = iter_nem12_records(reader, file_name=file_name)
+            else:
+                records = iter_nem13_records(reader)
+            for nmi_d, record in records:
+                if block := record_to_block(nmi_d, record):
+                    yield block
+                elif record is nmi_d:
+                    self._nmis.add(nmi_d.nmi)
+                    suffixes = self._nmi_channels.setdefault(nmi_d.nmi, [])
+                    if nmi_d.nmi_suffix not in suffixes:
+                        suffixes.append(nmi_d.nmi_suffix)
+
     def get_data_frame(
         self, split_days: bool = False, set_interval: int = 0
     ) -> pd.DataFrame | None:
@@ -235,6 +461,45 @@ class NEMFile:
             yield nmi, nmi_df
 
 
+def csv_tokenizer(lines: Iterable[str]) -> Iterator[list[str]]:
+    """Split lines into fields using the csv module"""
+    return csv.reader(lines, delimiter=",")
+
+
+def fast_tokenizer(lines: Iterable[str]) -> Generator[list[str], None, None]:
+    """Split lines into fields, only using the csv module for quoted lines
+
+    NEM rows very rarely contain quotes, so splitting on commas gives
+    the same result as csv_tokenizer() much faster. Tokenizing is only a
+    small part of parsing a file though (see benchmarks/bench_tokenizer.py).
+    """
+    lines = iter(lines)
+    for line in lines:
+        if '"' not in line:
+            line = line.rstrip("\r\n")
+            yield line.split(",") if line else []
+            continue
+        # Quoted fields may contain commas or even span several lines
+        quoted = [line]
+        while sum(x.count('"') for x in quoted) % 2:
+            next_line = next(lines, None)
+            if next_line is None:
+                break
+            quoted.append(next_line)
+        yield from csv.reader(quoted, delimiter=",")
+
+
+RECORD_INDICATORS = {str(x): x for x in (100, 200, 250, 300, 400, 500, 550, 900)}
+
+
+def parse_record_indicator(field: str) -> int:
+    """Convert the first field of a row to a record indicator"""
+    try:
+        return RECORD_INDICATORS[field]
+    except KeyError:
+        return int(field)
+
+
 def flatten_list(items: list[list]) -> list:
     """takes a list of lists, l and returns a flat list"""
     return [v for inner_l in items for v in inner_l]
@@ -253,6 +518,65 @@ def read_nem_file(file_path: str, ignore_missing_header=False) -> NEMData:
     return nf.nem_data()
 
 
+def validate_file(file_path, strict: bool = False) -> FileValidation:
+    """Check whether a NEM file is structurally valid
+
+    :param strict: Whether a missing header (100) row is an error
+    """
+    return NEMFile(file_path, strict=strict).validate()
+
+
+def file_stats(file_path, strict: bool = False) -> dict[tuple[str, str], ChannelStats]:
+    """Statistics of each NMI channel in a NEM file"""
+    return NEMFile(file_path, strict=strict).channel_stats()
+
+
+def parse_header_row(
+    first_row: list[str] | None, file_name: str, strict: bool = False
+) -> HeaderRecord:
+    """Parse the first row of a file, which should be a header (100) row
+
+    If it is missing (and not strict) the file is assumed to be NEM12.
+    """
+    try:
+        record_indicator = int(first_row[0])
+    except Exception:
+        record_indicator = 0
+
+    if not first_row or record_indicator != 100:
+        if strict:
+            raise ValueError("NEM Files must start with a 100 row")
+        else:
+            log.warning("Missing header (100) row, assuming NEM12.")
+            return HeaderRecord("NEM12", None, "", "", file_name, assumed=True)
+
+    header = parse_100_row(first_row, file_name)
+    if header.version_header not in ["NEM12", "NEM13"]:
+        raise ValueError(f"Invalid NEM version {header.version_header}")
+    return header
+
+
+def record_to_block(nmi_d, record) -> ReadingBlock | None:
+    """Convert a parsed 300 record or NEM13 reading into a reading block"""
+    if isinstance(record, IntervalRecord):
+        return ReadingBlock(
+            nmi_d.nmi,
+            nmi_d.nmi_suffix,
+            record.interval_date,
+            record.update_datetime,
+            record.interval_values,
+        )
+    if isinstance(record, Reading):
+        return ReadingBlock(
+            nmi_d.nmi,
+            nmi_d.nmi_suffix,
+            record.t_start,
+            nmi_d.update_datetime,
+            [record],
+        )
+    return None
+
+
 def parse_100_row(row: list[Any], file_name: str) -> HeaderRecord:
     """Parse header record (100)
 
@@ -264,35 +588,290 @@ def parse_100_row(row: list[Any], file_name: str) -> HeaderRecord:
     )
 
 
-def parse_nem12_rows(nem_list: Iterable, file_name=None) -> NEMReadings:
-    """Parse NEM row iterator and return meter readings named tuple"""
+def supersedes(update: datetime | None, existing: datetime | None) -> bool:
+    """Whether a record replaces an existing version of the same day
+
+    Records without an UpdateDateTime are treated as the oldest,
+    and ties go to the record read last.
+    """
+    if existing is None:
+        return True
+    if update is None:
+        return False
+    return update >= existing
+
+
+def latest_blocks(blocks: Iterable[ReadingBlock]) -> list[ReadingBlock]:
+    """Keep the most recent block for each NMI, channel and interval date"""
+    latest: dict[tuple[str, str, datetime | None], ReadingBlock] = {}
+    for block in blocks:
+        key = (block.nmi, block.suffix, block.interval_date)
+        existing = latest.get(key)
+        if existing is None or supersedes(
+            block.update_datetime, existing.update_datetime
+        ):
+            latest[key] = block
+    return list(latest.values())
+
+
+def parse_nem12_rows(
+    nem_list: Iterable, file_name=None, dedup: bool = False
+) -> NEMReadings:
+    """Parse NEM row iterator and return meter readings named tuple
+
+    :param dedup: Only keep the most recent 300 record (by UpdateDateTime)
+        for each NMI, channel and interval date
+    """
     # readings nested by NMI then channel
     readings: dict[str, dict[str, list[Reading]]] = {}
     # transactions nested by NMI then channel
     trans: dict[str, dict[str, list]] = {}
-    nmi_d = None  # current NMI details block that readings apply to
+    # position and update time of each interval date when deduplicating
+    latest: dict[tuple[str, str, datetime], tuple[int, datetime | None]] = {}
+
+    for nmi_d, record in iter_nem12_records(nem_list, file_name=file_name):
+        if isinstance(record, IntervalRecord):
+            # don't flatten the list of interval readings at this stage
+            days = readings[nmi_d.nmi][nmi_d.nmi_suffix]
+            if dedup:
+                key = (nmi_d.nmi, nmi_d.nmi_suffix, record.interval_date)
+                if key in latest:
+                    i, updated = latest[key]
+                    if supersedes(record.update_datetime, updated):
+                        days[i] = record.interval_values
+                        latest[key] = (i, record.update_datetime)
+                    continue
+                latest[key] = (len(days), record.update_datetime)
+            days.append(record.interval_values)
+        elif isinstance(record, B2BDetails12):
+            trans[nmi_d.nmi][nmi_d.nmi_suffix].append(record)
+        else:
+            readings.setdefault(nmi_d.nmi, {}).setdefault(nmi_d.nmi_suffix, [])
+            trans.setdefault(nmi_d.nmi, {}).setdefault(nmi_d.nmi_suffix, [])
+
+    for nmi in readings:
+        for suffix in readings[nmi]:
+            readings[nmi][suffix] = flatten_list(readings[nmi][suffix])
 
-    observed_900_records = []
+    return NEMReadings(readings=readings, transactions=trans)
+
+
+def iter_nem12_rows(
+    nem_list: Iterable, file_name=None
+) -> Generator[tuple[NmiDetails, int, list[str]], None, None]:
+    """Check NEM12 rows and yield the NMI details, record indicator and row
+
+    Rows are checked by a validating NEM12RecordParser, so only the 200, 300,
+    400 and 500 rows that would be parsed are yielded. Each 400 row applies
+    to the 300 row before it.
+    """
+    parser = NEM12RecordParser(file_name=file_name, validate_only=True)
+    for row in nem_list:
+        parser.push(row)
+        if not row:
+            continue
+        record_indicator = parse_record_indicator(row[0])
+        # 300 rows that were skipped (and their 400 rows) leave nothing pending
+        checked = record_indicator in (200, 500) or (
+            record_indicator in (300, 400) and parser.pending
+        )
+        if checked:
+            yield parser.nmi_d, record_indicator, row
+    parser.finish()
+
+
+def parse_nem12_columnar(
+    nem_list: Iterable, file_name=None, dedup: bool = False
+) -> tuple[ColumnarReadings, dict[str, dict[str, list]]]:
+    """Parse NEM12 rows straight into arrays, without building readings
+
+    Gives the same readings and transactions as parse_nem12_rows.
+    """
+    records: dict[str, dict[str, list[ColumnarRecord]]] = {}
+    trans: dict[str, dict[str, list]] = {}
+    # position and update time of each interval date when deduplicating
+    latest: dict[tuple[str, str, datetime], tuple[int, datetime | None]] = {}
+    record = None
+
+    for nmi_d, record_indicator, row in iter_nem12_rows(nem_list, file_name):
+        if record_indicator == 200:
+            records.setdefault(nmi_d.nmi, {}).setdefault(nmi_d.nmi_suffix, [])
+            trans.setdefault(nmi_d.nmi, {}).setdefault(nmi_d.nmi_suffix, [])
+
+        elif record_indicator == 300:
+            last_interval = 2 + int(minutes_per_day / nmi_d.interval_length)
+            interval_date = parse_datetime(row[1])
+            record = interval_record(
+                interval_date,
+                nmi_d.interval_length,
+                parse_values(row[2:last_interval]),
+                nmi_d.uom,
+                nmi_d.meter_serial_number,
+                row[last_interval],
+                nth(row, last_interval + 1, ""),
+                nth(row, last_interval + 2, ""),
+            )
+            days = records[nmi_d.nmi][nmi_d.nmi_suffix]
+            if dedup:
+                update = parse_datetime(nth(row, last_interval + 3, None))
+                key = (nmi_d.nmi, nmi_d.nmi_suffix, interval_date)
+                if key in latest:
+                    i, updated = latest[key]
+                    if supersedes(update, updated):
+                        days[i] = record
+                        latest[key] = (i, update)
+                    continue
+                latest[key] = (len(days), update)
+            days.append(record)
+
+        elif record_indicator == 400:
+            # event intervals are 1-indexed
+            record.set_events(int(row[1]) - 1, int(row[2]), row[3], row[4], row[5])
+
+        elif record_indicator == 500:
+            trans[nmi_d.nmi][nmi_d.nmi_suffix].append(parse_500_row(row))
+
+    return build_columnar(records), trans
+
+
+def nem12_stats(
+    nem_list: Iterable, file_name=None
+) -> dict[tuple[str, str], ChannelStats]:
+    """Summarise NEM12 rows for each channel without building readings
+
+    See iter_nem12_rows for the rows that are included.
+    """
+    results: dict[tuple[str, str], ChannelStats] = {}
+    # stats, quality method and reason code of the last 300 row,
+    # with the ranges of any 400 rows that apply to it
+    pending: tuple[ChannelStats, str, str, int, list] | None = None
+
+    for nmi_d, record_indicator, row in iter_nem12_rows(nem_list, file_name):
+        if record_indicator != 400 and pending:
+            add_interval_events(*pending)
+            pending = None
+
+        if record_indicator == 200:
+            key = (nmi_d.nmi, nmi_d.nmi_suffix)
+            if key not in results:
+                results[key] = ChannelStats(*key, nmi_d.uom)
+
+        elif record_indicator == 300:
+            stats = results[(nmi_d.nmi, nmi_d.nmi_suffix)]
+            num_intervals = int(minutes_per_day / nmi_d.interval_length)
+            last_interval = 2 + num_intervals
+            values = row[2:last_interval]
+            try:
+                floats = [float(x) for x in values if x]
+            except ValueError:
+                floats = [x for x in map(parse_reading, values) if x is not None]
+            stats.add_values(floats, num_intervals)
+            interval_date = parse_datetime(row[1])
+            stats.add_span(interval_date, interval_date + timedelta(days=1))
+            reason_code = nth(row, last_interval + 1, "")
+            pending = (stats, row[last_interval], reason_code, num_intervals, [])
+
+        elif record_indicator == 400 and pending:
+            pending[4].append((int(row[1]), int(row[2]), row[3], row[4]))
+
+    if pending:
+        add_interval_events(*pending)
+    return results
+
+
+def add_interval_events(
+    stats: ChannelStats,
+    quality_method: str,
+    reason_code: str,
+    num_intervals: int,
+    events: list[tuple[int, int, str, str]],
+) -> None:
+    """Count the quality methods and reason codes of a 300 row's intervals
+
+    :param events: The intervals, quality method and reason code of any 400 rows
+    """
+    if not events:
+        stats.quality[quality_method] += num_intervals
+        if reason_code:
+            stats.events[reason_code] += num_intervals
+        return
+    quality = [quality_method] * num_intervals
+    reasons = [reason_code] * num_intervals
+    # event intervals are 1-indexed
+    for start, end, event_quality, event_reason in events:
+        quality[start - 1 : end] = [event_quality] * (end - start + 1)
+        reasons[start - 1 : end] = [event_reason] * (end - start + 1)
+    stats.quality.update(quality)
+    stats.events.update(x for x in reasons if x)
 
-    for row_num, row in enumerate(nem_list, start=1):
+
+def iter_nem12_records(
+    nem_list: Iterable, file_name=None
+) -> Generator[tuple[NmiDetails, Any], None, None]:
+    """Parse NEM12 row iterator and yield records with their NMI details
+
+    See NEM12RecordParser for the records that are yielded.
+    """
+    parser = NEM12RecordParser(file_name=file_name)
+    for row in nem_list:
+        yield from parser.push(row)
+    yield from parser.finish()
+
+
+class NEM12RecordParser:
+    """Parse NEM12 rows one at a time, keeping state between rows
+
+    Each 200 row is returned as (nmi_details, nmi_details), followed by its
+    300 rows as (nmi_details, IntervalRecord) and 500 rows as
+    (nmi_details, B2BDetails12). Interval records are held back until any
+    400 rows that follow have been applied to them.
+
+    With `validate_only` the rows are checked the same way,
+    but no readings are built and no interval records are returned.
+    """
+
+    def __init__(self, file_name=None, validate_only: bool = False) -> None:
+        self.file_name = file_name
+        self.validate_only = validate_only
+        self.warnings: list[str] = []  # problems that did not stop parsing
+        self.row_num = 0
+        self.nmi_d = None  # current NMI details block that readings apply to
+        self.pending = None  # interval record that may still be updated by 400 rows
+        self.skipped_300 = False  # whether the last 300 row was skipped
+        self.channels_with_data: set[tuple[str, str]] = set()
+        self.observed_900_records: list[int] = []
+
+    def push(self, row: list[str]) -> list[tuple[NmiDetails, Any]]:
+        """Parse the next row and return any records that are now complete"""
+        self.row_num += 1
+        row_num = self.row_num
+        completed = []
         try:
             if not row:
                 log.debug(f"Skipping empty row at line {row_num}.")
-                continue
+                return completed
+
+            record_indicator = parse_record_indicator(row[0])
 
-            record_indicator = int(row[0])
+            if record_indicator != 400:
+                if self.pending and not self.validate_only:
+                    completed.append((self.nmi_d, self.pending))
+                self.pending = None
+                if record_indicator in (200, 300):
+                    self.skipped_300 = False
 
+            nmi_d = self.nmi_d
             if record_indicator == 900:
                 # Powercor NEM12 files can concatenate multiple files together
                 # try to keep parsing anyway.
-                if observed_900_records:
-                    log.warning(
+                if self.observed_900_records:
+                    self._warn(
+                        logging.WARNING,
                         "Found multiple end of data (900) rows on lines %s",
-                        observed_900_records,
+                        self.observed_900_records,
                     )
 
-                observed_900_records.append(row_num)
-                pass
+                self.observed_900_records.append(row_num)
 
             elif record_indicator == 200:
                 try:
@@ -301,25 +880,20 @@ def parse_nem12_rows(nem_list: Iterable, file_name=None) -> NEMReadings:
                     log.error(f"Error passing 200 row at line {row_num}:")
                     log.error(row)
                     raise
-                nmi_d = nmi_details
-
-                if nmi_d.nmi not in readings:
-                    readings[nmi_d.nmi] = {}
-                if nmi_d.nmi_suffix not in readings[nmi_d.nmi]:
-                    readings[nmi_d.nmi][nmi_d.nmi_suffix] = []
-                if nmi_d.nmi not in trans:
-                    trans[nmi_d.nmi] = {}
-                if nmi_d.nmi_suffix not in trans[nmi_d.nmi]:
-                    trans[nmi_d.nmi][nmi_d.nmi_suffix] = []
+                self.nmi_d = nmi_details
+                completed.append((nmi_details, nmi_details))
 
             elif record_indicator == 300:
                 num_intervals = int(minutes_per_day / nmi_d.interval_length)
-                assert len(row) > 1, f"Invalid 300 Row in {file_name} on line {row_num}"
+                assert (
+                    len(row) > 1
+                ), f"Invalid 300 Row in {self.file_name} on line {row_num}"
                 if len(row) < num_intervals + 2:
                     record_date = row[1]
                     msg = "Skipping 300 record for %s %s %s on row %d. "
                     msg += "It does not have the expected %s intervals"
-                    log.error(
+                    self._warn(
+                        logging.ERROR,
                         msg,
                         nmi_d.nmi,
                         nmi_d.nmi_suffix,
@@ -327,43 +901,62 @@ def parse_nem12_rows(nem_list: Iterable, file_name=None) -> NEMReadings:
                         row_num,
                         num_intervals,
                     )
-                    continue
-                interval_record = parse_300_row(
-                    row, nmi_d.interval_length, nmi_d.uom, nmi_d.meter_serial_number
-                )
-                # don't flatten the list of interval readings at this stage,
-                # as they may need to be adjusted by a 400 row
-                readings[nmi_d.nmi][nmi_d.nmi_suffix].append(
-                    interval_record.interval_values
-                )
+                    self.skipped_300 = True
+                    return completed
+                if self.validate_only:
+                    check_300_row(row, nmi_d.interval_length)
+                    self.pending = True  # 400 rows have a record to apply to
+                else:
+                    self.pending = parse_300_row(
+                        row,
+                        nmi_d.interval_length,
+                        nmi_d.uom,
+                        nmi_d.meter_serial_number,
+                    )
+                self.channels_with_data.add((nmi_d.nmi, nmi_d.nmi_suffix))
 
             elif record_indicator == 400:
                 event_record = parse_400_row(row, nmi_d.interval_length)
-                readings[nmi_d.nmi][nmi_d.nmi_suffix][-1] = update_reading_events(
-                    readings[nmi_d.nmi][nmi_d.nmi_suffix][-1], event_record
-                )
+                if not self.pending:
+                    channel = (nmi_d.nmi, nmi_d.nmi_suffix)
+                    if self.skipped_300 and channel in self.channels_with_data:
+                        self._warn(
+                            logging.WARNING, "Skipping 400 record on row %d", row_num
+                        )
+                        return completed
+                    raise ValueError("400 row does not follow a valid 300 row")
+                if not self.validate_only:
+                    update_reading_events(self.pending.interval_values, event_record)
 
             elif record_indicator == 500:
-                b2b_details = parse_500_row(row)
-                trans[nmi_d.nmi][nmi_d.nmi_suffix].append(b2b_details)
+                completed.append((nmi_d, parse_500_row(row)))
 
             else:
-                log.warning(
+                self._warn(
+                    logging.WARNING,
                     "Record indicator %s on line %d not supported and was skipped",
                     record_indicator,
                     row_num,
                 )
         except (KeyError, ValueError, AssertionError, IndexError, TypeError) as e:
             raise ValueError(f"Unable to parse line {row_num}") from e
+        return completed
 
-    for nmi in readings:
-        for suffix in readings[nmi]:
-            readings[nmi][suffix] = flatten_list(readings[nmi][suffix])
+    def finish(self) -> list[tuple[NmiDetails, Any]]:
+        """Return the last record once there are no more rows"""
+        completed = []
+        if self.pending and not self.validate_only:
+            completed.append((self.nmi_d, self.pending))
+        self.pending = None
 
-    if not observed_900_records:
-        log.warning("Missing end of data (900) row.")
+        if not self.observed_900_records:
+            self._warn(logging.WARNING, "Missing end of data (900) row.")
+        return completed
 
-    return NEMReadings(readings=readings, transactions=trans)
+    def _warn(self, level: int, msg: str, *args) -> None:
+        """Log a problem with the file and keep it for validation"""
+        log.log(level, msg, *args)
+        self.warnings.append(msg % args)
 
 
 def parse_nem13_rows(nem_list: Iterable) -> NEMReadings:
@@ -372,43 +965,49 @@ def parse_nem13_rows(nem_list: Iterable) -> NEMReadings:
     readings: dict[str, dict[str, list[Reading]]] = {}
     # transactions nested by NMI then channel
     trans: dict[str, dict[str, list]] = {}
+
+    for nmi_d, record in iter_nem13_records(nem_list):
+        if isinstance(record, Reading):
+            readings[nmi_d.nmi][nmi_d.nmi_suffix].append(record)
+        elif isinstance(record, B2BDetails13):
+            trans[nmi_d.nmi][nmi_d.nmi_suffix].append(record)
+        else:
+            readings.setdefault(nmi_d.nmi, {}).setdefault(nmi_d.nmi_suffix, [])
+            trans.setdefault(nmi_d.nmi, {}).setdefault(nmi_d.nmi_suffix, [])
+    return NEMReadings(readings=readings, transactions=trans)
+
+
+def iter_nem13_records(
+    nem_list: Iterable, readings: bool = True
+) -> Generator[tuple[BasicMeterData, Any], None, None]:
+    """Parse NEM13 row iterator and yield records with their meter data
+
+    Each 250 row is yielded as (basic_data, basic_data) followed by
+    (basic_data, Reading), and 550 rows as (basic_data, B2BDetails13).
+
+    :param readings: Whether to calculate the Reading of each 250 row
+    """
     nmi_d = None  # current NMI details block that readings apply to
 
     for row in nem_list:
-        record_indicator = int(row[0])
+        record_indicator = parse_record_indicator(row[0])
 
         if record_indicator == 900:
-            for nmi in readings:
-                for suffix in readings[nmi]:
-                    readings[nmi][suffix] = flatten_list(readings[nmi][suffix])
             break  # End of file
 
         elif record_indicator == 550:
-            b2b_details = parse_550_row(row)
-            trans[nmi_d.nmi][nmi_d.nmi_suffix].append(b2b_details)
+            yield nmi_d, parse_550_row(row)
 
         elif record_indicator == 250:
-            basic_data = parse_250_row(row)
-            reading = calculate_manual_reading(basic_data)
-
-            nmi_d = basic_data
-
-            if basic_data.nmi not in readings:
-                readings[nmi_d.nmi] = {}
-            if nmi_d.nmi_suffix not in readings[nmi_d.nmi]:
-                readings[nmi_d.nmi][nmi_d.nmi_suffix] = []
-            if nmi_d.nmi not in trans:
-                trans[nmi_d.nmi] = {}
-            if nmi_d.nmi_suffix not in trans[nmi_d.nmi]:
-                trans[nmi_d.nmi][nmi_d.nmi_suffix] = []
-
-            readings[nmi_d.nmi][nmi_d.nmi_suffix].append([reading])
+            nmi_d = parse_250_row(row)
+            yield nmi_d, nmi_d
+            if readings:
+                yield nmi_d, calculate_manual_reading(nmi_d)
 
         else:
             log.warning(
                 "Record indicator %s not supported and was skipped", record_indicator
             )
-    return NEMReadings(readings=readings, transactions=trans)
 
 
 def calculate_manual_reading(basic_data: BasicMeterData) -> Reading:
@@ -506,20 +1105,8 @@ def parse_300_row(
     Example: 300,20030501,50.1, . . . ,21.5,V,,,20030101153445,20030102023012
     """
 
-    # count of fields except IntervalValue1 . . . IntervalValueN
-    # excluding MSATSLoadDateTime which is only required if present
-    num_required_non_reading_fields = 6
-
-    num_intervals = int(minutes_per_day / interval)
-
     interval_date = parse_datetime(row[1])
-    last_interval = 2 + num_intervals
-    if len(row) < num_intervals + num_required_non_reading_fields:
-        num_rows = len(row) - num_required_non_reading_fields
-        raise ValueError(
-            "Unexpected number of values in 300 row: "
-            + f"{num_rows} readings for {interval}min intervals"
-        )
+    last_interval = check_300_row(row, interval)
     quality_method = row[last_interval]
 
     # Optional fields
@@ -550,6 +1137,27 @@ def parse_300_row(
     )
 
 
+def check_300_row(row: list, interval: int) -> int:
+    """Check an interval data record (300) has the expected fields
+
+    :returns: The position of the QualityMethod field
+    """
+    # count of fields except IntervalValue1 . . . IntervalValueN
+    # excluding MSATSLoadDateTime which is only required if present
+    num_required_non_reading_fields = 6
+
+    num_intervals = int(minutes_per_day / interval)
+    if len(row) < num_intervals + num_required_non_reading_fields:
+        num_rows = len(row) - num_required_non_reading_fields
+        raise ValueError(
+            "Unexpected number of values in 300 row: "
+            + f"{num_rows} readings for {interval}min intervals"
+        )
+    if parse_datetime(row[1]) is None:
+        raise ValueError(f"Invalid interval date {row[1]!r} in 300 row")
+    return 2 + num_intervals
+
+
 def parse_interval_records(
     interval_record,
     interval_date,
@@ -562,23 +1170,36 @@ def parse_interval_records(
 ) -> list[Reading]:
     """Convert interval values into tuples with datetime"""
     interval_delta = timedelta(minutes=interval)
+    times = [
+        interval_date + i * interval_delta for i in range(len(interval_record) + 1)
+    ]
+    # Positional arguments as this is the hot path for 5 minute data
     return [
         Reading(
-            t_start=interval_date + (i * interval_delta),
-            t_end=interval_date + (i * interval_delta) + interval_delta,
-            read_value=parse_reading(val),
-            uom=uom,
-            quality_method=quality_method,
-            meter_serial_number=meter_serial_number,
-            event_code=event_code,  # This may get changed later by a 400 row
-            event_desc=event_desc,  # This may get changed later by a 400 row
-            val_start=None,
-            val_end=None,  # No before and after readings for intervals
+            times[i],  # t_start
+            times[i + 1],  # t_end
+            parse_reading(val),
+            uom,
+            meter_serial_number,
+            quality_method,
+            event_code,  # This may get changed later by a 400 row
+            event_desc,  # This may get changed later by a 400 row
+            None,
+            None,  # No before and after readings for intervals
         )
         for i, val in enumerate(interval_record)
     ]
 
 
+def parse_values(values: list[str]) -> np.ndarray:
+    """Convert interval values to floats, with NaN if missing or not a number"""
+    try:
+        return np.array(values, dtype=np.float64)
+    except ValueError:
+        reads = (parse_reading(x) for x in values)
+        return np.array([np.nan if x is None else x for x in reads], np.float64)
+
+
 def parse_reading(val: str) -> float | None:
     """Convert reading value to float (if possible)"""
     if val == "":
@@ -607,11 +1228,11 @@ def parse_400_row(row: list, interval_length: int) -> tuple:
         raise ValueError(msg)
     if not (0 < start_interval <= num_intervals):
         msg = f"Invalid start interval {start_interval} in 400 row."
-        msg += " Expecting {num_intervals} intervals."
+        msg += f" Expecting {num_intervals} intervals."
         raise ValueError(msg)
     if not (0 < end_interval <= num_intervals):
         msg = f"Invalid end interval {end_interval} in 400 row."
-        msg += f"Expecting {num_intervals} intervals."
+        msg += f" Expecting {num_intervals} intervals."
         raise ValueError(msg)
 
     return EventRecord(int(row[1]), int(row[2]), row[3], row[4], row[5])
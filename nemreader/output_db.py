@@ -1,18 +1,46 @@
+import hashlib
 import logging
 import os
-from collections import defaultdict
-from datetime import datetime
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Generator, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from itertools import repeat
+from multiprocessing import get_context
 from pathlib import Path
-from typing import NamedTuple
+from typing import Any, Literal, NamedTuple
 
+import numpy as np
+import pandas as pd
 from dateutil.parser import isoparse
 from sqlite_utils import Database
 
-from .nem_reader import NEMFile
+from .demand import CoincidentPeak, coincident_peak, monthly_demand
+from .nem_objects import Reading, ReadingBlock
+from .nem_reader import NEMFile, supersedes
+from .shards import (
+    create_catalog,
+    remove_sqlite,
+    shard_number,
+    shard_paths,
+)
+from .shards import open_readers as _readers
+from .shards import readers_lock as _readers_lock
 from .split_days import make_set_interval, split_multiday_reads
+from .tariffs import DEFAULT_SCHEDULE, TariffSchedule, daily_band_totals
+from .views import SUMMARY_VIEWS
 
 log = logging.getLogger(__name__)
 
+FETCH_SIZE = 64 * 1024
+BATCH_SIZE = 10_000
+SUMMARY_CHUNK = 50  # NMIs summarised at a time by extend_sqlite
+ROW_DTYPE = np.dtype(
+    [("channel", object), ("t_start", np.int64), ("t_end", np.int64), ("value", float)]
+)
+
 
 def output_as_sqlite(
     file_name: Path,
@@ -21,52 +49,380 @@ def output_as_sqlite(
     split_days: bool = False,
     set_interval: int | None = None,
     replace: bool = False,
+    net_readings: bool = False,
+    dedup: bool = False,
+    changed_only: bool = False,
+    batch_size: int = BATCH_SIZE,
+    shards: int | None = None,
+    shard_by: str = "nmi",
 ) -> Path:
-    """Export all channels to sqlite file"""
+    """Export all channels to sqlite file
+
+    Readings are streamed from the file one data record at a time
+    and written in batches, so memory use does not depend on the file size.
+
+    :param net_readings: Also keep a `net_readings` table up to date,
+        which once created is updated on every later write
+    :param dedup: Only write the most recent version (by UpdateDateTime) of each
+        day, skipping days that are older than the version already saved
+    :param changed_only: Only write days whose readings differ from those
+        already saved, using the checksums in the `day_checksums` table
+    :param batch_size: The number of readings to write at a time
+    :param shards: Split the readings across this many databases,
+        with `output_file` a catalog of them (see `nemreader.shards`)
+    :param shard_by: Route readings to a shard by `nmi` or `month`
+    """
 
     output_dir = Path(output_dir)
     os.makedirs(output_dir, exist_ok=True)
     output_path = output_dir / output_file
     if replace and output_path.exists():
-        os.remove(output_path)  # Clear existing database file
-
-    db = Database(output_path)
+        remove_sqlite(output_path)  # Clear existing database file
+
+    paths = create_catalog(output_path, shards, shard_by) if shards else [output_path]
+    databases = [Database(x) for x in paths]
+    for db in databases:
+        if shards:
+            create_readings_table(db)
+        if net_readings:
+            create_net_readings_table(db)
+        if changed_only:
+            create_day_checksums_table(db)
 
     nf = NEMFile(file_name, strict=False)
-    m = nf.nem_data()
-    nmis = m.readings.keys()
-    for nmi in nmis:
-        channels = list(m.transactions[nmi].keys())
-        nmi_readings = m.readings[nmi]
+    blocks = newer_blocks(nf, databases, shard_by) if dedup else nf.iter_blocks()
+    batches = [ReadingsBatch(db, batch_size) for db in databases]
+    for block in blocks:
+        shard = shard_number(block, len(databases), shard_by)
+        batch = batches[shard]
+        items = reading_items(
+            block.nmi,
+            block.suffix,
+            block.readings,
+            split_days=split_days,
+            set_interval=set_interval,
+        )
+        if changed_only:
+            saved = batch.saved_checksums(block.nmi)
+            items, checksums = changed_days(saved, block.nmi, block.suffix, items)
+            batch.checksums += checksums
+        if dedup:
+            batch.versions.append(record_version(block, file_name))
+        batch.add(items)
+    for batch in batches:
+        batch.flush()
+
+    for db in databases:
+        create_nmi_summary_view(db)
+    return output_path
 
-        for ch in channels:
-            if split_days or set_interval:
-                nmi_readings[ch] = list(split_multiday_reads(nmi_readings[ch]))
 
-            if set_interval:
-                nmi_readings[ch] = list(
-                    make_set_interval(nmi_readings[ch], set_interval)
-                )
+class ReadingsBatch:
+    """Buffers rows for the readings table and writes them in batches
 
-            items = []
-            for x in nmi_readings[ch]:
-                item = {
-                    "nmi": nmi,
-                    "channel": ch,
-                    "t_start": x.t_start,
-                    "t_end": x.t_end,
-                    "value": x.read_value,
-                    "quality_method": x.quality_method,
-                    "event_code": x.event_code,
-                    "event_desc": x.event_desc,
-                }
-                items.append(item)
-            db["readings"].upsert_all(
-                items,
-                pk=("nmi", "channel", "t_start"),
-                column_order=("nmi", "channel", "t_start"),
+    Checksums and record versions added alongside the readings
+    are saved when the batch is written.
+    """
+
+    def __init__(self, db: Database, batch_size: int = BATCH_SIZE) -> None:
+        self.db = db
+        self.batch_size = batch_size
+        self.items: list[dict] = []
+        self.checksums: list[dict] = []
+        self.versions: list[dict] = []
+        self._saved_nmi: str | None = None
+        self._saved: dict[tuple[str, str], str] = {}
+
+    def saved_checksums(self, nmi: str) -> dict[tuple[str, str], str]:
+        """Saved checksum of each channel and day of a NMI
+
+        They are loaded in one query when the NMI changes, as its blocks
+        are usually together in the file.
+        """
+        if nmi != self._saved_nmi:
+            sql = "SELECT channel, day, checksum FROM day_checksums WHERE nmi = ?"
+            rows = self.db.execute(sql, [nmi])
+            self._saved = {(channel, day): x for channel, day, x in rows}
+            self._saved_nmi = nmi
+        return self._saved
+
+    def add(self, items: list[dict]) -> None:
+        """Add rows, writing the batch once it is full"""
+        self.items += items
+        if len(self.items) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write any buffered rows"""
+        if self.items:
+            save_readings(self.db, self.items)
+        if self.checksums:
+            save_day_checksums(self.db, self.checksums)
+        if self.versions:
+            save_record_versions(self.db, self.versions)
+        self.items, self.checksums, self.versions = [], [], []
+
+
+def reading_items(
+    nmi: str,
+    channel: str,
+    readings: Iterable[Reading],
+    split_days: bool = False,
+    set_interval: int | None = None,
+) -> list[dict]:
+    """Convert readings for a channel into rows for the readings table"""
+    if split_days or set_interval:
+        readings = split_multiday_reads(readings)
+
+    if set_interval:
+        readings = make_set_interval(readings, set_interval)
+
+    return [
+        {
+            "nmi": nmi,
+            "channel": channel,
+            "t_start": x.t_start,
+            "t_end": x.t_end,
+            "value": x.read_value,
+            "quality_method": x.quality_method,
+            "event_code": x.event_code,
+            "event_desc": x.event_desc,
+        }
+        for x in readings
+    ]
+
+
+def create_readings_table(db: Database) -> None:
+    """Create the readings table, with the columns that are otherwise inferred"""
+    db["readings"].create(
+        {
+            "nmi": str,
+            "channel": str,
+            "t_start": datetime,
+            "t_end": datetime,
+            "value": float,
+            "quality_method": str,
+            "event_code": str,
+            "event_desc": str,
+        },
+        pk=("nmi", "channel", "t_start"),
+        if_not_exists=True,
+    )
+
+
+def save_readings(db: Database, items: list[dict]) -> None:
+    """Upsert rows into the readings table
+
+    Any saved checksums of the days written are removed, as they may
+    no longer match. `changed_only` exports save new ones afterwards.
+    """
+    db["readings"].upsert_all(
+        items,
+        pk=("nmi", "channel", "t_start"),
+        column_order=("nmi", "channel", "t_start"),
+    )
+    if db["day_checksums"].exists():
+        days = {
+            (x["nmi"], x["channel"], x["t_start"].date().isoformat()) for x in items
+        }
+        sql = "DELETE FROM day_checksums WHERE nmi = ? AND channel = ? AND day = ?"
+        with db.conn:
+            db.conn.executemany(sql, days)
+
+
+def create_day_checksums_table(db: Database) -> None:
+    """Create the table of the checksum of the readings of each NMI channel day"""
+    db["day_checksums"].create(
+        {"nmi": str, "channel": str, "day": str, "checksum": str},
+        pk=("nmi", "channel", "day"),
+        if_not_exists=True,
+    )
+
+
+def day_checksum(items: Iterable[dict]) -> str:
+    """Checksum of the readings table rows for a day"""
+    fields = ("t_start", "t_end", "value", "quality_method", "event_code", "event_desc")
+    digest = hashlib.blake2b(digest_size=16)
+    for item in items:
+        row = "|".join(str(item[x]) for x in fields)
+        digest.update(row.encode() + b"\n")
+    return digest.hexdigest()
+
+
+def changed_days(
+    saved: dict[tuple[str, str], str], nmi: str, channel: str, items: list[dict]
+) -> tuple[list[dict], list[dict]]:
+    """Rows for the days of a channel that differ from the saved checksums
+
+    :param saved: The saved checksum of each channel and day of the NMI,
+        which is updated with the new checksums
+    :returns: The rows to write, and the new checksum of each changed day
+    """
+    days: dict[str, list[dict]] = {}
+    for item in items:
+        days.setdefault(item["t_start"].date().isoformat(), []).append(item)
+
+    changed: list[dict] = []
+    checksums = []
+    for day, day_items in days.items():
+        checksum = day_checksum(day_items)
+        if saved.get((channel, day)) == checksum:
+            continue
+        saved[(channel, day)] = checksum
+        changed += day_items
+        checksums.append(
+            {"nmi": nmi, "channel": channel, "day": day, "checksum": checksum}
+        )
+    log.debug("%s %s has %s changed days", nmi, channel, len(checksums))
+    return changed, checksums
+
+
+def save_day_checksums(db: Database, checksums: list[dict]) -> None:
+    """Upsert rows into the day_checksums table"""
+    db["day_checksums"].upsert_all(checksums, pk=("nmi", "channel", "day"))
+
+
+def create_record_versions_table(db: Database) -> None:
+    """Create the table of the UpdateDateTime saved for each NMI channel day"""
+    db["record_versions"].create(
+        {
+            "nmi": str,
+            "channel": str,
+            "interval_date": str,
+            "update_datetime": str,
+            "file_name": str,
+        },
+        pk=("nmi", "channel", "interval_date"),
+        if_not_exists=True,
+    )
+
+
+def saved_versions(db: Database, nmi: str) -> dict[tuple[str, str], datetime | None]:
+    """The UpdateDateTime saved for each channel and interval date of a NMI"""
+    rows = db.execute(
+        """SELECT channel, interval_date, update_datetime
+        FROM record_versions WHERE nmi = ?""",
+        [nmi],
+    )
+    return {
+        (channel, day): isoparse(updated) if updated else None
+        for channel, day, updated in rows
+    }
+
+
+def newer_blocks(
+    nf: NEMFile, databases: list[Database], shard_by: str = "nmi"
+) -> Generator[ReadingBlock, None, None]:
+    """The most recent block of each day that is not older than the saved version
+
+    The file is read twice, first to find the latest version of each day
+    and then to yield those blocks, so only the versions are held in memory.
+
+    :param databases: The database, or shards, the blocks are written to
+    """
+    for db in databases:
+        create_record_versions_table(db)
+    latest: dict[tuple[str, str, str], tuple[int, datetime | None, int]] = {}
+    for i, block in enumerate(nf.iter_blocks()):
+        key = (block.nmi, block.suffix, version_day(block))
+        if key not in latest or supersedes(block.update_datetime, latest[key][1]):
+            shard = shard_number(block, len(databases), shard_by)
+            latest[key] = (i, block.update_datetime, shard)
+
+    saved: dict[tuple[int, str], dict[tuple[str, str], datetime | None]] = {}
+    keep = set()
+    for (nmi, suffix, day), (i, updated, shard) in latest.items():
+        if (shard, nmi) not in saved:
+            saved[shard, nmi] = saved_versions(databases[shard], nmi)
+        if supersedes(updated, saved[shard, nmi].get((suffix, day))):
+            keep.add(i)
+        else:
+            log.debug("Skipping stale %s %s %s", nmi, suffix, day)
+
+    for i, block in enumerate(nf.iter_blocks()):
+        if i in keep:
+            yield block
+
+
+def version_day(block: ReadingBlock) -> str:
+    """The interval date of a block as saved in the record_versions table"""
+    return block.interval_date.isoformat() if block.interval_date else ""
+
+
+def record_version(block: ReadingBlock, file_name: Path) -> dict:
+    """Row for the record_versions table"""
+    updated = block.update_datetime
+    return {
+        "nmi": block.nmi,
+        "channel": block.suffix,
+        "interval_date": version_day(block),
+        "update_datetime": updated.isoformat() if updated else None,
+        "file_name": str(file_name),
+    }
+
+
+def save_record_versions(db: Database, versions: list[dict]) -> None:
+    """Upsert rows into the record_versions table"""
+    db["record_versions"].upsert_all(versions, pk=("nmi", "channel", "interval_date"))
+
+
+# Net value of the intervals of the readings table matching a condition,
+# the same as the `combined_readings` view with B channels negated
+NET_READINGS_SQL = """
+    INSERT OR REPLACE INTO net_readings (nmi, t_start, t_end, value)
+    SELECT nmi, t_start, MAX(t_end),
+    SUM(CASE WHEN substr(channel,1,1) = 'B' THEN -1 * value ELSE value END)
+    FROM readings
+    WHERE {where}
+    GROUP BY nmi, t_start
+"""
+
+
+def create_net_readings_table(db: Database) -> None:
+    """Create the table of net values for each NMI interval
+
+    Triggers on the readings table recalculate the net value of an interval
+    whenever one of its readings changes, in the same transaction,
+    so the table stays up to date however the readings are written.
+    Each written reading recalculates its interval once, and rewriting
+    unchanged readings does not recalculate it.
+    """
+    create_readings_table(db)
+    db["readings"].create_index(["nmi", "t_start"], if_not_exists=True)
+    interval = NET_READINGS_SQL.format(where="nmi = {0}.nmi AND t_start = {0}.t_start")
+    with db.conn:
+        if not db["net_readings"].exists():
+            db["net_readings"].create(
+                {"nmi": str, "t_start": str, "t_end": str, "value": float},
+                pk=("nmi", "t_start"),
+            )
+            db.execute(NET_READINGS_SQL.format(where="1"))  # Existing readings
+        # An upsert first inserts just the primary key, then updates the row,
+        # so the interval is recalculated once the update sets its values
+        triggers = {
+            "INSERT": ("WHEN NEW.t_end IS NOT NULL", interval.format("NEW")),
+            "UPDATE": (
+                "WHEN OLD.t_end IS NULL OR NEW.t_end IS NOT OLD.t_end"
+                " OR NEW.value IS NOT OLD.value",
+                interval.format("NEW"),
+            ),
+            "DELETE": (
+                "",
+                "DELETE FROM net_readings WHERE nmi = OLD.nmi"
+                " AND t_start = OLD.t_start;" + interval.format("OLD"),
+            ),
+        }
+        for event, (when, statements) in triggers.items():
+            name = f"net_readings_{event.lower()}"
+            db.execute(f"DROP TRIGGER IF EXISTS {name}")
+            db.execute(
+                f"""CREATE TRIGGER {name} AFTER {event} ON readings {when}
+                BEGIN {statements}; END"""
             )
 
+
+def create_nmi_summary_view(db: Database) -> None:
+    """Create view of the channels and date range for each NMI"""
     db.create_view(
         "nmi_summary",
         """
@@ -76,7 +432,6 @@ def output_as_sqlite(
     """,
         replace=True,
     )
-    return output_path
 
 
 def output_folder_as_sqlite(
@@ -87,8 +442,19 @@ def output_folder_as_sqlite(
     set_interval: int | None = None,
     replace: bool = False,
     skip_errors: bool = False,
+    net_readings: bool = False,
+    dedup: bool = False,
+    changed_only: bool = False,
+    shards: int | None = None,
+    shard_by: str = "nmi",
 ) -> Path:
-    """Export all channels to sqlite file"""
+    """Export all channels to sqlite file
+
+    :param dedup: Keep only the most recent version of each day across all files
+    :param changed_only: Only write days whose readings have changed
+    :param shards: Split the readings across this many databases
+    :param shard_by: Route readings to a shard by `nmi` or `month`
+    """
 
     if isinstance(file_dir, str):
         file_dir = Path(file_dir)
@@ -97,7 +463,7 @@ def output_folder_as_sqlite(
     os.makedirs(output_dir, exist_ok=True)
     output_path = output_dir / output_file
     if replace and output_path.exists():
-        os.remove(output_path)  # Clear existing database file
+        remove_sqlite(output_path)  # Clear existing database file
 
     nem_files = [x for x in file_dir.glob("*.csv")]
     nem_files += [x for x in file_dir.glob("*.zip")]
@@ -110,6 +476,11 @@ def output_folder_as_sqlite(
                 split_days=split_days,
                 set_interval=set_interval,
                 replace=False,
+                net_readings=net_readings,
+                dedup=dedup,
+                changed_only=changed_only,
+                shards=shards,
+                shard_by=shard_by,
             )
         except Exception:  # noqa: PERF203
             log.error("Unable to process %s", file_name)
@@ -132,177 +503,515 @@ def time_of_day(start: datetime) -> str:
     return "Night"
 
 
+class EnergyReading(NamedTuple):
+    start: datetime
+    value: float
+
+
+class ReadingArrays(NamedTuple):
+    """Readings for one channel as numpy arrays"""
+
+    t_start: np.ndarray
+    t_end: np.ndarray
+    value: np.ndarray
+
+
+class DBReader:
+    """Read only access to a sqlite export that can be shared between threads
+
+    Each thread reuses its own read only connection, and metadata queries
+    are cached until the database file changes.
+    """
+
+    def __init__(self, db_path: Path, cache_size: int = 256) -> None:
+        self.db_path = Path(db_path)
+        self.cache_size = cache_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[tuple, Any] = OrderedDict()
+        self._signature: tuple | None = None
+        self._generation = 0  # Incremented when connections should be reopened
+        self._connections: list[sqlite3.Connection] = []
+
+    def __repr__(self):
+        return f"<DBReader {self.db_path}>"
+
+    def _file_signature(self) -> tuple:
+        signature = []
+        for fp in (self.db_path, Path(f"{self.db_path}-wal")):
+            try:
+                stat = os.stat(fp)
+            except FileNotFoundError:
+                continue
+            signature.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        return tuple(signature)
+
+    def _check_file(self) -> tuple:
+        """Clear the cache and reconnect if the file has changed"""
+        signature = self._file_signature()
+        with self._lock:
+            if signature != self._signature:
+                # The file may have been replaced, so new connections are needed
+                self._signature = signature
+                self._generation += 1
+                self._cache.clear()
+        return signature
+
+    @property
+    def db(self) -> Database:
+        """Read only connection for the current thread"""
+        self._check_file()
+        local = self._local
+        if getattr(local, "generation", None) == self._generation:
+            return local.db
+        if getattr(local, "db", None):
+            self._close(local.db.conn)
+        uri = f"{self.db_path.resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        with self._lock:
+            self._connections.append(conn)
+        local.db = Database(conn)
+        local.generation = self._generation
+        return local.db
+
+    def _close(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+
+    def close(self) -> None:
+        """Close the connections of all threads"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+        for conn in connections:
+            conn.close()
+
+    def _cached(self, key: tuple, query: Callable[[], Any]) -> Any:
+        signature = self._check_file()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        value = query()
+        with self._lock:
+            if signature == self._signature:
+                self._cache[key] = value
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return value
+
+    def nmis(self) -> set[str]:
+        """NMIs in the database"""
+
+        def query() -> frozenset[str]:
+            rows = self.db.query("select distinct nmi from nmi_summary")
+            return frozenset(row["nmi"] for row in rows)
+
+        return set(self._cached(("nmis",), query))
+
+    def nmi_channels(self, nmi: str) -> set[str]:
+        """Channels of a NMI"""
+
+        def query() -> frozenset[str]:
+            sql = "select channel from nmi_summary where nmi = :nmi"
+            return frozenset(row["channel"] for row in self.db.query(sql, {"nmi": nmi}))
+
+        return set(self._cached(("channels", nmi), query))
+
+    def nmi_date_range(self, nmi: str) -> tuple[datetime, datetime]:
+        """First and last interval of a NMI"""
+
+        def query() -> tuple[datetime, datetime]:
+            sql = """select MIN(first_interval) start, MAX(last_interval) end
+                    from nmi_summary where nmi = :nmi
+                    """
+            row = next(self.db.query(sql, {"nmi": nmi}))
+            return isoparse(row["start"]), isoparse(row["end"])
+
+        return self._cached(("date_range", nmi), query)
+
+    def readings(
+        self, nmi: str, channels: list[str] | None = None
+    ) -> dict[str, ReadingArrays]:
+        """Readings of a NMI as numpy arrays for each channel"""
+        return split_channels(fetch_readings(self.db, nmi, channels))
+
+    def nmi_readings(self, nmi: str, channel: str) -> list[EnergyReading]:
+        """Start time and value of each reading for a channel"""
+        rows = self.db.execute(
+            "select t_start, value from readings where nmi = ? and channel = ?",
+            (nmi, channel),
+        )
+        return [
+            EnergyReading(start=isoparse(start), value=float(value))
+            for start, value in rows
+        ]
+
+
+MAX_READERS = 16  # Databases with open readers, the least recently used is closed
+
+
+def get_reader(db_path: Path) -> DBReader:
+    """Shared reader for a database, created on first use"""
+    key = Path(db_path).resolve()
+    with _readers_lock:
+        if key in _readers:
+            _readers.move_to_end(key)
+            return _readers[key]
+        reader = _readers[key] = DBReader(key)
+        while len(_readers) > MAX_READERS:
+            _readers.popitem(last=False)[1].close()
+        return reader
+
+
+def close_readers() -> None:
+    """Close the connections of all shared readers"""
+    with _readers_lock:
+        readers = list(_readers.values())
+        _readers.clear()
+    for reader in readers:
+        reader.close()
+
+
 def get_nmis(db_path: Path) -> set[str]:
-    db = Database(db_path)
-    rows = db.query("select distinct nmi from nmi_summary")
-    return {row["nmi"] for row in rows}
+    return get_reader(db_path).nmis()
 
 
 def get_nmi_channels(db_path: Path, nmi: str) -> set[str]:
-    db = Database(db_path)
-    rows = db.query("select * from nmi_summary where nmi = :nmi", {"nmi": nmi})
-    return {row["channel"] for row in rows}
+    return get_reader(db_path).nmi_channels(nmi)
 
 
 def get_nmi_date_range(db_path: Path, nmi: str) -> tuple[datetime, datetime]:
-    db = Database(db_path)
-    sql = """select MIN(first_interval) start, MAX(last_interval) end
-            from nmi_summary where nmi = :nmi
-            """
-    rows = list(db.query(sql, {"nmi": nmi}))
-    row = rows[0]
-    start = isoparse(row["start"])
-    end = isoparse(row["end"])
-    return start, end
-
-
-class EnergyReading(NamedTuple):
-    start: datetime
-    value: float
+    return get_reader(db_path).nmi_date_range(nmi)
 
 
 def get_nmi_readings(db_path: Path, nmi: str, channel: str) -> list[EnergyReading]:
-    reads = []
-    db = Database(db_path)
-    for r in db.query(
-        "select * from readings where nmi = :nmi and channel = :ch",
-        {"nmi": nmi, "ch": channel},
+    return get_reader(db_path).nmi_readings(nmi, channel)
+
+
+def read_readings(
+    db_path: Path,
+    nmi: str,
+    channels: list[str] | None = None,
+    start: date | datetime | None = None,
+    end: date | datetime | None = None,
+    as_: Literal["numpy", "pandas"] = "numpy",
+) -> dict[str, ReadingArrays] | pd.DataFrame:
+    """Read the readings of a NMI from the sqlite export
+
+    Only readings with `start <= t_start < end` are read, using the
+    (nmi, channel, t_start) primary key. The database is opened read only.
+
+    :param channels: Limit to these channels, defaults to all
+    :param as_: Return a dict of `ReadingArrays` by channel with "numpy",
+        or a DataFrame with "pandas"
+    """
+    if as_ not in ("numpy", "pandas"):
+        raise ValueError(f"Unknown output type {as_!r}")
+    data = fetch_readings(get_reader(db_path).db, nmi, channels, start, end)
+    if as_ == "pandas":
+        return pd.DataFrame(
+            {
+                "channel": data["channel"],
+                "t_start": data["t_start"].astype("datetime64[s]"),
+                "t_end": data["t_end"].astype("datetime64[s]"),
+                "value": data["value"],
+            }
+        )
+    return split_channels(data)
+
+
+def fetch_readings(
+    db: Database,
+    nmi: str,
+    channels: list[str] | None = None,
+    start: date | datetime | None = None,
+    end: date | datetime | None = None,
+) -> np.ndarray:
+    """Query readings into a structured array sorted by channel and time
+
+    The channels are always listed, so that the time range
+    is searched within the index of each channel.
+    """
+    if not channels:
+        channels = readings_channels(db, nmi)
+    sql = f"""SELECT channel,
+        CAST(strftime('%s', t_start) AS INTEGER),
+        CAST(strftime('%s', t_end) AS INTEGER),
+        value
+        FROM readings
+        WHERE nmi = ? AND channel IN ({", ".join("?" for _ in channels)})"""
+    params: list = [nmi, *channels]
+    # Stored as ISO 8601 text so the range can be compared as strings
+    if start:
+        sql += " AND t_start >= ?"
+        params.append(start.isoformat())
+    if end:
+        sql += " AND t_start < ?"
+        params.append(end.isoformat())
+    sql += " ORDER BY channel, t_start"
+
+    cursor = db.execute(sql, params)
+    blocks = [np.empty(0, dtype=ROW_DTYPE)]
+    while rows := cursor.fetchmany(FETCH_SIZE):
+        blocks.append(np.array(rows, dtype=ROW_DTYPE))
+    return np.concatenate(blocks)
+
+
+def readings_nmis(db: Database) -> list[str]:
+    """NMIs in the readings table, each found with a seek of the primary key"""
+    sql = "SELECT MIN(nmi) FROM readings WHERE nmi > ?"
+    nmis: list[str] = []
+    nmi = db.execute(sql, [""]).fetchone()[0]
+    while nmi is not None:
+        nmis.append(nmi)
+        nmi = db.execute(sql, [nmi]).fetchone()[0]
+    return nmis
+
+
+def readings_channels(db: Database, nmi: str) -> list[str]:
+    """Channels of a NMI in the readings table
+
+    Each channel is found with a single seek of the primary key,
+    rather than scanning all of the NMIs readings.
+    """
+    sql = "SELECT MIN(channel) FROM readings WHERE nmi = ? AND channel > ?"
+    channels: list[str] = []
+    channel = db.execute(sql, [nmi, ""]).fetchone()[0]
+    while channel is not None:
+        channels.append(channel)
+        channel = db.execute(sql, [nmi, channel]).fetchone()[0]
+    return channels
+
+
+def split_channels(data: np.ndarray) -> dict[str, ReadingArrays]:
+    """Split fetched readings into arrays for each channel"""
+    t_start = data["t_start"].astype("datetime64[s]")
+    t_end = data["t_end"].astype("datetime64[s]")
+    value = np.ascontiguousarray(data["value"])
+    readings = {}
+    bounds = [0, *(np.flatnonzero(data["channel"][1:] != data["channel"][:-1]) + 1)]
+    for i, j in zip(bounds, [*bounds[1:], len(data)], strict=True):
+        if i < j:
+            readings[data["channel"][i]] = ReadingArrays(
+                t_start[i:j], t_end[i:j], value[i:j]
+            )
+    return readings
+
+
+def _import_export_arrays(
+    db_path: Path, nmi: str
+) -> tuple[ReadingArrays | None, ReadingArrays | None]:
+    """Readings of all E (import) and all B (export) channels of a NMI"""
+    reader = get_reader(db_path)
+    channels = sorted(x for x in reader.nmi_channels(nmi) if x[0] in ("B", "E"))
+    readings = reader.readings(nmi, channels)
+    result = []
+    for prefix in ("E", "B"):
+        arrays = [v for k, v in readings.items() if k[0] == prefix]
+        if not arrays:
+            result.append(None)
+            continue
+        result.append(
+            ReadingArrays(*(np.concatenate(x) for x in zip(*arrays, strict=True)))
+        )
+    return result[0], result[1]
+
+
+def calc_nmi_daily_summary(
+    db_path: Path, nmi: str, schedule: TariffSchedule = DEFAULT_SCHEDULE
+):
+    """Daily import and export, with import split into time of day bands"""
+    imports, exports = _import_export_arrays(db_path, nmi)
+    if imports is None:
+        return
+    days, band_totals = daily_band_totals(imports.t_start, imports.value, schedule)
+
+    exp_values = np.zeros(len(days))
+    if exports is not None:
+        exp_days = exports.t_start.astype("datetime64[D]")
+        idx = np.searchsorted(days, exp_days)
+        found = idx < len(days)
+        found[found] &= days[idx[found]] == exp_days[found]
+        exp_values = np.bincount(
+            idx[found], weights=exports.value[found], minlength=len(days)
+        )
+
+    columns = [f"imp_{x.lower().replace(' ', '_')}" for x in schedule.bands]
+    for day, totals, exp in zip(
+        days.astype(str).tolist(),
+        band_totals.tolist(),
+        exp_values.tolist(),
+        strict=True,
     ):
-        start = isoparse(r["t_start"])
-        value = float(r["value"])
-        read = EnergyReading(start=start, value=value)
-        reads.append(read)
-    return reads
-
-
-def calc_nmi_daily_summary(db_path: Path, nmi: str):
-    channels = get_nmi_channels(db_path, nmi)
-
-    imp_values = defaultdict(lambda: defaultdict(int))
-    exp_values = defaultdict(int)
-    for ch in channels:
-        if ch[0] not in ["B", "E"]:
-            continue  # Skip other channels
-        feed_in = ch[0] == "B"
-        for read in get_nmi_readings(db_path, nmi, ch):
-            day = read.start.strftime("%Y-%m-%d")
-            if feed_in:
-                exp_values[day] += read.value
-            else:
-                tod = time_of_day(read.start)
-                imp_values[day][tod] += read.value
-
-    for day in imp_values:
-        imp1 = round(imp_values[day]["Morning"], 3)
-        imp2 = round(imp_values[day]["Day"], 3)
-        imp3 = round(imp_values[day]["Evening"], 3)
-        imp4 = round(imp_values[day]["Night"], 3)
-        imp = imp1 + imp2 + imp3 + imp4
-        exp = round(exp_values[day], 3)
+        imp_bands = [round(x, 3) for x in totals]
         item = {
             "nmi": nmi,
             "day": day,
-            "imp": imp,
-            "exp": exp,
-            "imp_morning": imp1,
-            "imp_day": imp2,
-            "imp_evening": imp3,
-            "imp_night": imp4,
+            "imp": sum(imp_bands),
+            "exp": round(exp, 3),
         }
+        item.update(zip(columns, imp_bands, strict=True))
         yield item
 
 
-def extend_sqlite(db_path: Path) -> None:
-    """Add summary tables to SQLite DB export"""
-    db = Database(db_path)
-    nmis = get_nmis(db_path)
-    for nmi in nmis:
-        items = calc_nmi_daily_summary(db_path, nmi)
-        db["daily_reads"].upsert_all(
-            items, pk=("nmi", "day"), column_order=("nmi", "day")
-        )
-    logging.info("Updated day data")
+def nmi_import_arrays(db_path: Path, nmi: str) -> tuple[np.ndarray, np.ndarray, int]:
+    """Total of the import (E) channels of a NMI for each interval
+
+    :returns: The interval start times and values, and the interval length
+    """
+    imports, _ = _import_export_arrays(db_path, nmi)
+    if imports is None:
+        return np.empty(0, dtype="datetime64[s]"), np.empty(0), 0
+    durations = np.unique(imports.t_end - imports.t_start)
+    if len(durations) != 1:
+        raise ValueError(f"{nmi} has readings with different interval lengths")
+    interval = int(durations[0] // np.timedelta64(1, "m"))
+    times, index = np.unique(imports.t_start, return_inverse=True)
+    return times, np.bincount(index, imports.value, len(times)), interval
+
+
+def calc_nmi_monthly_demand(db_path: Path, nmi: str, window: int = 30):
+    """Monthly maximum demand of the import channels of a NMI"""
+    t_start, values, interval = nmi_import_arrays(db_path, nmi)
+    if not interval:
+        return
+    for month in monthly_demand(t_start, values, interval, window):
+        yield {
+            "nmi": nmi,
+            "month": month.month,
+            "window": window,
+            "max_demand": round(month.max_demand, 3),
+            "peak_start": month.peak_start,
+            "energy": round(month.energy, 3),
+            "load_factor": round(month.load_factor, 3),
+        }
 
-    db.create_view(
-        "combined_readings",
-        """
-    SELECT nmi, t_start, t_end, 
-    SUM(CASE WHEN substr(channel,1,1) = 'B' THEN -1 * value ELSE value END) as value
-    FROM readings
-    GROUP BY nmi, t_start, t_end
-    ORDER BY 1, 2
-    """,
-        replace=True,
-    )
-    log.info("Created combined readings view")
 
-    db.create_view(
-        "monthly_reads",
-        """
-    SELECT nmi, substr(day,1,7) as month,
-    count(day) as num_days, sum(imp) as imp, sum(exp) as exp,
-    sum(imp_morning) as imp_morning, sum(imp_day) as imp_day,
-    sum(imp_evening) as imp_evening, sum(imp_night) as imp_night
-    FROM daily_reads
-    GROUP BY nmi, substr(day,1,7)
-    ORDER BY 1, 2
-    """,
-        replace=True,
-    )
-    log.info("Created monthly view")
+def calc_coincident_peak(
+    db_path: Path, nmis: Iterable[str] | None = None, window: int = 30
+) -> CoincidentPeak:
+    """Peak of the combined import of several NMIs, defaults to all NMIs"""
+    series = {}
+    intervals = set()
+    for nmi in sorted(nmis or get_nmis(db_path)):
+        t_start, values, interval = nmi_import_arrays(db_path, nmi)
+        if interval:
+            series[nmi] = (t_start, values)
+            intervals.add(interval)
+    if len(intervals) > 1:
+        raise ValueError("NMIs have readings with different interval lengths")
+    return coincident_peak(series, intervals.pop() if intervals else window, window)
+
+
+def calc_nmi_tariff_summary(
+    db_path: Path, nmi: str, tariffs: dict[str, TariffSchedule]
+):
+    """Daily import in each band of each tariff"""
+    imports, _ = _import_export_arrays(db_path, nmi)
+    if imports is None:
+        return
+    for tariff, schedule in tariffs.items():
+        days, band_totals = daily_band_totals(imports.t_start, imports.value, schedule)
+        for day, totals in zip(
+            days.astype(str).tolist(), band_totals.tolist(), strict=True
+        ):
+            for band, imp in zip(schedule.bands, totals, strict=True):
+                yield {
+                    "nmi": nmi,
+                    "day": day,
+                    "tariff": tariff,
+                    "band": band,
+                    "imp": round(imp, 3),
+                }
 
-    db.create_view(
-        "latest_year",
-        """
-    SELECT dr.nmi,
-    MIN(dr.day) as first_day,
-    MAX(dr.day) as last_day,
-    count(dr.day) as num_days,
-    sum(dr.imp) as imp,
-    sum(dr.exp) as exp,
-    sum(dr.imp_morning) as imp_morning,
-    sum(dr.imp_day) as imp_day,
-    sum(dr.imp_evening) as imp_evening,
-    sum(dr.imp_night) as imp_night
-    FROM daily_reads dr
-    LEFT JOIN (SELECT NMI, MAX(last_interval) as last_interval FROM nmi_summary
-       GROUP BY NMI) li ON li.nmi = dr.nmi
-    WHERE dr.day >= DATETIME(li.last_interval, '-366 days')
-    GROUP BY dr.nmi
-    """,
-        replace=True,
-    )
-    log.info("Created latest year view")
 
-    db.create_view(
-        "latest_year_seasons",
-        """
-    SELECT dr.nmi,
-    (CASE WHEN CAST(strftime('%m', dr.day) AS INTEGER) < 3 THEN 'SUMMER'
-        ELSE (CASE WHEN CAST(strftime('%m', dr.day) AS INTEGER) < 6 THEN 'AUTUMN'
-        ELSE (CASE WHEN CAST(strftime('%m', dr.day) AS INTEGER) < 9 THEN 'WINTER'
-        ELSE (CASE WHEN CAST(strftime('%m', dr.day) AS INTEGER) < 12 THEN 'SPRING'
-        ELSE 'SUMMER' END) END) END) END) Season,
-    MIN(dr.day) as first_day,
-    MAX(dr.day) as last_day,
-    count(dr.day) as num_days,
-    sum(dr.imp) as imp,
-    sum(dr.exp) as exp,
-    sum(dr.imp_morning) as imp_morning,
-    sum(dr.imp_day) as imp_day,
-    sum(dr.imp_evening) as imp_evening,
-    sum(dr.imp_night) as imp_night
-    FROM daily_reads dr
-    LEFT JOIN (SELECT NMI, MAX(last_interval) as last_interval FROM nmi_summary
-      GROUP BY NMI) li ON li.nmi = dr.nmi
-    WHERE dr.day >= DATETIME(li.last_interval, '-366 days')
-    GROUP BY dr.nmi,
-        (CASE WHEN CAST(strftime('%m', dr.day) AS INTEGER) < 3 THEN 'SUMMER'
-        ELSE (CASE WHEN CAST(strftime('%m', dr.day) AS INTEGER) < 6 THEN 'AUTUMN'
-        ELSE (CASE WHEN CAST(strftime('%m', dr.day) AS INTEGER) < 9 THEN 'WINTER'
-        ELSE (CASE WHEN CAST(strftime('%m', dr.day) AS INTEGER) < 12 THEN 'SPRING'
-        ELSE 'SUMMER' END) END) END) END)
-    """,
-        replace=True,
-    )
-    log.info("Created latest year season view")
+# Primary keys of the summary tables written by extend_sqlite
+SUMMARY_TABLES = {
+    "daily_reads": ("nmi", "day"),
+    "daily_tariff_reads": ("nmi", "day", "tariff", "band"),
+    "monthly_demand": ("nmi", "month"),
+}
+
+
+def nmi_summaries(
+    db_path: Path,
+    nmis: Iterable[str],
+    tariffs: dict[str, TariffSchedule] | None = None,
+    demand_window: int | None = None,
+) -> dict[str, list[dict]]:
+    """Summary rows for some NMIs, for each of the `SUMMARY_TABLES`"""
+    rows: dict[str, list[dict]] = {x: [] for x in SUMMARY_TABLES}
+    for nmi in nmis:
+        rows["daily_reads"] += calc_nmi_daily_summary(db_path, nmi)
+        if tariffs:
+            rows["daily_tariff_reads"] += calc_nmi_tariff_summary(db_path, nmi, tariffs)
+        if demand_window:
+            try:
+                demand = list(calc_nmi_monthly_demand(db_path, nmi, demand_window))
+            except ValueError as e:
+                log.warning("Unable to calculate demand: %s", e)
+                continue
+            rows["monthly_demand"] += demand
+    return rows
+
+
+def save_summaries(db: Database, rows: dict[str, list[dict]]) -> None:
+    """Upsert rows into each of the `SUMMARY_TABLES`"""
+    for table, pk in SUMMARY_TABLES.items():
+        db[table].upsert_all(rows[table], pk=pk, column_order=pk)
+
+
+def extend_sqlite(
+    db_path: Path,
+    tariffs: dict[str, TariffSchedule] | None = None,
+    demand_window: int | None = None,
+    workers: int | None = None,
+) -> None:
+    """Add summary tables to SQLite DB export
+
+    :param tariffs: Also sum daily import into the bands of these
+        tariffs, saved to the `daily_tariff_reads` table
+    :param demand_window: Also save the monthly maximum demand over windows
+        of this many minutes to the `monthly_demand` table
+    :param workers: Calculate the summaries of NMIs in this many processes,
+        which read the database while this process writes the results
+
+    For a sharded export (see `nemreader.shards`) each shard is extended
+    in a separate process. The summary views are saved in each shard,
+    and `open_catalog` creates them over all of the shards.
+    """
+    # Open connections can not be shared with forked processes
+    context = get_context("spawn")
+    if paths := [x for x in shard_paths(db_path) if x.exists()]:
+        with ProcessPoolExecutor(workers or len(paths), mp_context=context) as executor:
+            futures = [
+                executor.submit(extend_sqlite, x, tariffs, demand_window) for x in paths
+            ]
+            for future in futures:
+                future.result()
+        return
+
+    db = Database(db_path)
+    nmis = sorted(get_nmis(db_path))
+    chunks = [nmis[i : i + SUMMARY_CHUNK] for i in range(0, len(nmis), SUMMARY_CHUNK)]
+    if workers and workers > 1:
+        with ProcessPoolExecutor(workers, mp_context=context) as executor:
+            for rows in executor.map(
+                nmi_summaries,
+                repeat(db_path),
+                chunks,
+                repeat(tariffs),
+                repeat(demand_window),
+            ):
+                save_summaries(db, rows)
+    else:
+        for chunk in chunks:
+            save_summaries(db, nmi_summaries(db_path, chunk, tariffs, demand_window))
+    logging.info("Updated day data")
+
+    for name, sql in SUMMARY_VIEWS.items():
+        db.create_view(name, sql, replace=True)
+        log.info("Created %s view", name)
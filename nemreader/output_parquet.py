@@ -0,0 +1,142 @@
+import logging
+import os
+from collections import Counter
+from pathlib import Path
+
+from .nem_reader import NEMFile
+from .split_days import make_set_interval, split_multiday_reads
+
+log = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = None
+    pq = None
+
+
+def parquet_schema() -> "pa.Schema":
+    """Column types of the readings written to each parquet file"""
+    text = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema(
+        [
+            ("suffix", text),
+            ("serno", text),
+            ("t_start", pa.timestamp("ms")),
+            ("t_end", pa.timestamp("ms")),
+            ("value", pa.float64()),
+            ("uom", text),
+            ("quality_method", text),
+            ("event_code", text),
+            ("event_desc", text),
+        ]
+    )
+
+
+def output_as_parquet(
+    file_name,
+    output_dir=".",
+    split_days: bool = False,
+    set_interval: int | None = None,
+    row_group_size: int = 100_000,
+    strict: bool = False,
+    max_open_partitions: int = 24,
+) -> Path:
+    """Export all channels to a hive partitioned parquet dataset
+
+    Files are written to `nmi=<NMI>/month=<YYYY-MM>/<file stem>.parquet`
+    so that readers can skip partitions they do not need.
+    Readings are streamed from the parser and flushed as row groups,
+    so the whole NEM file is never held in memory.
+    The partitions of an NMI are closed once the next NMI starts,
+    and the oldest partition is closed if too many are open.
+    A partition that is opened again is written to a numbered part file.
+
+    :param file_name: The NEM file to process
+    :param output_dir: The root directory of the dataset
+    :param row_group_size: Number of readings buffered per partition
+    :param max_open_partitions: Number of partition files kept open
+    :returns: The dataset directory
+    """
+    if pa is None:
+        raise ImportError(
+            "Parquet output requires pyarrow: pip install nemreader[parquet]"
+        )
+
+    output_dir = Path(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    stem = Path(str(file_name)).stem
+    schema = parquet_schema()
+
+    writers: dict[tuple[str, str], pq.ParquetWriter] = {}
+    buffers: dict[tuple[str, str], dict[str, list]] = {}
+    part_files: Counter[tuple[str, str]] = Counter()  # files written per partition
+
+    def flush(partition: tuple[str, str]) -> None:
+        columns = buffers.pop(partition)
+        if partition not in writers:
+            nmi, month = partition
+            part_dir = output_dir / f"nmi={nmi}" / f"month={month}"
+            os.makedirs(part_dir, exist_ok=True)
+            num = part_files[partition]
+            part_name = f"{stem}-{num}.parquet" if num else f"{stem}.parquet"
+            part_files[partition] += 1
+            writers[partition] = pq.ParquetWriter(part_dir / part_name, schema)
+        table = pa.Table.from_pydict(columns, schema=schema)
+        writers[partition].write_table(table)
+
+    def close(partition: tuple[str, str]) -> None:
+        if partition in buffers:
+            flush(partition)
+        writers.pop(partition).close()
+
+    def close_all() -> None:
+        for partition in list(buffers):
+            flush(partition)
+        for partition in list(writers):
+            close(partition)
+
+    nf = NEMFile(file_name, strict=strict)
+    nmi = None
+    try:
+        for block in nf.iter_blocks():
+            if block.nmi != nmi:
+                close_all()
+                nmi = block.nmi
+            reads = block.readings
+            if split_days or set_interval:
+                reads = split_multiday_reads(reads)
+            if set_interval:
+                reads = make_set_interval(reads, set_interval)
+
+            for x in reads:
+                partition = (block.nmi, x.t_start.strftime("%Y-%m"))
+                if partition not in buffers:
+                    opened = partition in writers
+                    if (
+                        not opened
+                        and len(writers) + len(buffers) >= max_open_partitions
+                    ):
+                        close(next(iter(writers), None) or next(iter(buffers)))
+                    buffers[partition] = {name: [] for name in schema.names}
+                columns = buffers[partition]
+                columns["suffix"].append(block.suffix)
+                columns["serno"].append(x.meter_serial_number)
+                columns["t_start"].append(x.t_start)
+                columns["t_end"].append(x.t_end)
+                columns["value"].append(x.read_value)
+                columns["uom"].append(x.uom)
+                columns["quality_method"].append(x.quality_method)
+                columns["event_code"].append(x.event_code)
+                columns["event_desc"].append(x.event_desc)
+                if len(columns["t_start"]) >= row_group_size:
+                    flush(partition)
+
+        close_all()
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    log.debug("Created %s partition files in %s", part_files.total(), output_dir)
+    return output_dir
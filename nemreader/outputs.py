@@ -1,18 +1,79 @@
+import bz2
 import csv
+import gzip
 import logging
+import lzma
 import os
-from collections.abc import Generator
+import warnings
+from collections import deque
+from collections.abc import Generator, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import IO
 
+import numpy as np
 import pandas as pd
 
-from .nem_objects import Reading
+from .columnar import ColumnarReadings, readings_to_columnar
+from .nem_objects import Reading, ReadingBlock
 from .nem_reader import NEMFile
-from .split_days import split_multiday_reads
+from .split_days import make_set_interval, split_multiday_reads
 
 log = logging.getLogger(__name__)
 
+# Columns of the transposed csv taken from a single channel
+TRANSPOSED_FIELDS = (
+    ("quality", "quality_method"),
+    ("evt_code", "event_code"),
+    ("evt_desc", "event_desc"),
+)
+
+# File name suffix and opener of each compression
+COMPRESSIONS = {
+    "gzip": (".gz", gzip.open),
+    "bz2": (".bz2", bz2.open),
+    "xz": (".xz", lzma.open),
+}
+
+
+def bytes_written(paths: Iterable[Path]) -> list[int]:
+    """The size on disk of each created file"""
+    return [os.path.getsize(x) for x in paths]
+
+
+def output_path_for(
+    output_path: str | os.PathLike, compression: str | None = None
+) -> Path:
+    """Add the suffix of the compression to a file name"""
+    output_path = Path(output_path)
+    if compression is None:
+        return output_path
+    if compression not in COMPRESSIONS:
+        raise ValueError(
+            f"Compression must be one of {tuple(COMPRESSIONS)}, not {compression!r}"
+        )
+    suffix = COMPRESSIONS[compression][0]
+    return output_path.with_name(output_path.name + suffix)
+
+
+def open_output(
+    output_path: Path, compression: str | None = None, level: int | None = None
+) -> IO[str]:
+    """Open a text file for writing, through a compressor if requested
+
+    :param compression: One of `COMPRESSIONS`, or None to write plain text
+    :param level: The compression level, defaults to that of the compressor
+    """
+    if compression is None:
+        return open(output_path, "w", newline="")  # noqa: SIM115
+    opener = COMPRESSIONS[compression][1]
+    if level is None:
+        return opener(output_path, "wt", newline="")
+    if compression == "xz":
+        return opener(output_path, "wt", preset=level, newline="")
+    return opener(output_path, "wt", compresslevel=level, newline="")
+
 
 def nmis_in_file(file_name) -> Generator[tuple[str, list[str]], None, None]:
     """Return list of NMIs in file"""
@@ -38,104 +99,294 @@ def output_as_data_frames(
     return data_frames
 
 
-def output_as_csv(file_name, output_dir=".", set_interval: int = 0):
+def output_as_csv(
+    file_name,
+    output_dir=".",
+    set_interval: int = 0,
+    compression: str | None = None,
+    level: int | None = None,
+    workers: int | None = None,
+) -> list[Path]:
     """
     Transpose all channels and output a csv that is easier
     to read and do charting on
 
+    The file is streamed and each NMI is written as soon as its readings
+    have been read, so only one NMI is held in memory at a time.
+
     :param file_name: The NEM file to process
     :param output_dir: Specify different output location
-    :returns: The file that was created
+    :param compression: Compress the files with gzip, bz2 or xz
+    :param level: The compression level
+    :param workers: Write NMIs in a pool of this many threads (default serial)
+    :returns: The files that were created
     """
 
     output_dir = Path(output_dir)
-    output_paths = []
     os.makedirs(output_dir, exist_ok=True)
     nf = NEMFile(file_name, strict=False)
-    df = nf.get_pivot_data_frame(set_interval=set_interval)
-    for nmi in nf.nmis:
-        nmi_df = df[(df["nmi"] == nmi)]
-        del nmi_df["nmi"]
-        last_date = nmi_df.iloc[-1][1].strftime("%Y%m%d")
-        output_file = f"{nmi}_{last_date}_transposed.csv"
-        output_path = output_dir / output_file
-        nmi_df.to_csv(output_path, index=False)
-        output_paths.append(output_path)
-    return output_paths
-
-
-def save_to_csv(headings: list[str], rows: list[list], output_path):
-    """save data to csv file"""
-    with open(output_path, "w", newline="") as csvfile:
+
+    written: dict[str, Path | None] = {}
+    repeated: set[str] = set()  # NMIs split across parts of the file
+    if workers and workers > 1:
+        # Formatting the rows holds the GIL, so threads mostly overlap the
+        # compression and disk writes
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending: deque[tuple[str, Future]] = deque()
+            for nmi, blocks in nmi_runs(nf.iter_blocks()):
+                if nmi in written or any(nmi == x for x, _ in pending):
+                    repeated.add(nmi)
+                    continue
+                if len(pending) >= 2 * workers:
+                    done_nmi, future = pending.popleft()
+                    written[done_nmi] = future.result()
+                future = executor.submit(
+                    write_transposed_csv,
+                    nmi,
+                    blocks,
+                    output_dir,
+                    set_interval,
+                    compression,
+                    level,
+                )
+                pending.append((nmi, future))
+            for done_nmi, future in pending:
+                written[done_nmi] = future.result()
+    else:
+        for nmi, blocks in nmi_runs(nf.iter_blocks()):
+            if nmi in written:
+                repeated.add(nmi)
+                continue
+            written[nmi] = write_transposed_csv(
+                nmi, blocks, output_dir, set_interval, compression, level
+            )
+
+    if repeated:
+        # Read the file again to combine the parts of these NMIs
+        log.warning("Readings for %s are not together in the file", repeated)
+        nmi_blocks: dict[str, list[ReadingBlock]] = {}
+        for block in nf.iter_blocks():
+            if block.nmi in repeated:
+                nmi_blocks.setdefault(block.nmi, []).append(block)
+        for nmi, blocks in nmi_blocks.items():
+            output_file = write_transposed_csv(
+                nmi, blocks, output_dir, set_interval, compression, level
+            )
+            previous = written[nmi]
+            if previous and previous != output_file:
+                os.remove(previous)
+            written[nmi] = output_file
+    return [x for x in written.values() if x]
+
+
+def nmi_runs(
+    blocks: Iterable[ReadingBlock],
+) -> Generator[tuple[str, list[ReadingBlock]], None, None]:
+    """Group consecutive blocks of readings for the same NMI"""
+    nmi = None
+    run: list[ReadingBlock] = []
+    for block in blocks:
+        if block.nmi != nmi and run:
+            yield nmi, run
+            run = []
+        nmi = block.nmi
+        run.append(block)
+    if run:
+        yield nmi, run
+
+
+def transposed_rows(
+    blocks: Iterable[ReadingBlock], set_interval: int = 0
+) -> tuple[list[str], list[list]]:
+    """Align the readings of each channel of a NMI on its intervals
+
+    A single quality, event code and event description column is kept,
+    taken from the first channel that has them for at least half the intervals.
+
+    :returns: The column headings and a row for each interval
+    """
+    channels: dict[str, list[Reading]] = {}
+    for block in blocks:
+        channels.setdefault(block.suffix, []).extend(block.readings)
+    suffixes = sorted(channels)
+
+    grid: dict[tuple[datetime, datetime], dict[str, Reading]] = {}
+    for suffix in suffixes:
+        reads: Iterable[Reading] = channels[suffix]
+        if set_interval:
+            reads = make_set_interval(split_multiday_reads(reads), set_interval)
+        for read in reads:
+            grid.setdefault((read.t_start, read.t_end), {})[suffix] = read
+    times = sorted(grid)
+    if not times:
+        return [], []
+
+    fields = []
+    for heading, attr in TRANSPOSED_FIELDS:
+        for suffix in suffixes:
+            missing = sum(
+                getattr(grid[x].get(suffix), attr, None) is None for x in times
+            )
+            if missing / len(times) < 0.5:
+                fields.append((heading, suffix, attr))
+                break
+
+    start_format = datetime_format(x[0] for x in times)
+    end_format = datetime_format(x[1] for x in times)
+    rows = []
+    for t_start, t_end in times:
+        reads = grid[t_start, t_end]
+        row = [t_start.strftime(start_format), t_end.strftime(end_format)]
+        for suffix in suffixes:
+            read = reads.get(suffix)
+            value = read.read_value if read else None
+            row.append("" if value is None or value != value else repr(value))
+        for _, suffix, attr in fields:
+            row.append(getattr(reads.get(suffix), attr, None))
+        rows.append(row)
+    headings = ["t_start", "t_end", *suffixes, *(x[0] for x in fields)]
+    return headings, rows
+
+
+def datetime_format(times: Iterable[datetime]) -> str:
+    """Format for a column of times, which leaves out the time if it is midnight"""
+    times = list(times)
+    if any(x.microsecond for x in times):
+        return "%Y-%m-%d %H:%M:%S.%f"
+    if any(x.hour or x.minute or x.second for x in times):
+        return "%Y-%m-%d %H:%M:%S"
+    return "%Y-%m-%d"
+
+
+def write_transposed_csv(
+    nmi: str,
+    blocks: Iterable[ReadingBlock],
+    output_dir: Path,
+    set_interval: int = 0,
+    compression: str | None = None,
+    level: int | None = None,
+) -> Path | None:
+    """Write the transposed csv of a NMI, named with the date of its last reading"""
+    headings, rows = transposed_rows(blocks, set_interval)
+    if not rows:
+        log.warning("No readings for %s", nmi)
+        return None
+    last_date = rows[-1][1][:10].replace("-", "")
+    output_path = output_path_for(
+        Path(output_dir) / f"{nmi}_{last_date}_transposed.csv", compression
+    )
+    with open_output(output_path, compression, level) as csvfile:
+        cwriter = csv.writer(csvfile, lineterminator=os.linesep)
+        cwriter.writerow(headings)
+        cwriter.writerows(rows)
+    log.debug("Created %s (%s bytes)", output_path, os.path.getsize(output_path))
+    return output_path
+
+
+def save_to_csv(
+    headings: list[str],
+    rows: Iterable[Iterable],
+    output_path,
+    compression: str | None = None,
+    level: int | None = None,
+) -> Path:
+    """save data to csv file
+
+    Rows are written as they are produced,
+    through a compressor if `compression` is given.
+    The suffix of the compression is added to `output_path`.
+    """
+    output_path = output_path_for(output_path, compression)
+    with open_output(output_path, compression, level) as csvfile:
         cwriter = csv.writer(
             csvfile, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL
         )
         cwriter.writerow(headings)
         for row in rows:
             cwriter.writerow(row)
-    log.debug("Created %s", output_path)
+    log.debug("Created %s (%s bytes)", output_path, os.path.getsize(output_path))
     return output_path
 
 
+def day_qualities(
+    day_index: np.ndarray, codes: np.ndarray, strings: list[str | None], num_days: int
+) -> list[str]:
+    """Quality method of each day, or V if there is more than one"""
+    pairs = np.unique(day_index.astype(np.int64) * len(strings) + codes)
+    joined = [""] * num_days
+    for day, code in zip(*np.divmod(pairs, len(strings)), strict=True):
+        joined[day] += strings[code] or ""
+    return [x if len(x) <= 1 else "V" for x in joined]
+
+
+def daily_rows(
+    columns: ColumnarReadings, date_format: str = "%Y%m%d"
+) -> Generator[tuple, None, None]:
+    """Daily total of each NMI channel, with days in the order they first appear
+
+    Works on the arrays of each channel without building any readings.
+    """
+    for i, (nmi, ch) in enumerate(columns.channels):
+        start, end = int(columns.offsets[i]), int(columns.offsets[i + 1])
+        if start == end:
+            continue
+        days, first, day_index = np.unique(
+            columns.t_start[start:end].astype("datetime64[D]"),
+            return_index=True,
+            return_inverse=True,
+        )
+        totals = np.bincount(day_index, columns.read_value[start:end], len(days))
+        qualities = day_qualities(
+            day_index, columns.quality_method[start:end], columns.strings, len(days)
+        )
+        uom = columns.strings[columns.uom[end - 1]]
+        sn = columns.strings[columns.meter_serial_number[end - 1]]
+        labels = [x.strftime(date_format) for x in days.astype(object)]
+        totals = totals.tolist()
+        for j in np.argsort(first, kind="stable").tolist():
+            yield (nmi, sn, labels[j], ch, totals[j], uom, qualities[j])
+
+
 def flatten_and_group_rows(
     nmi: str,
     nmi_transactions: dict[str, list],
     nmi_readings: dict[str, list[Reading]],
     date_format: str = "%Y%m%d",
 ) -> list[tuple]:
-    """Create flattened list of NMI reading data"""
+    """Create flattened list of NMI reading data
 
+    Deprecated, use daily_rows with the columnar data of the file instead.
+    """
+    warnings.warn(
+        "flatten_and_group_rows is deprecated, use daily_rows instead",
+        DeprecationWarning,
+        stacklevel=2,
+    )
     channels = list(nmi_transactions.keys())
-
     # Datastream suffix starting with a number are Accumulated Metering Data (NEM13)
     # Ensure no reading exceeds 24 hours
-    split_required = False
-    for ch in channels:
-        if ch[0].isdigit():
-            split_required = True
-    if split_required:
-        nmi_readings = split_multiday_reads(nmi_readings)
+    if any(ch[0].isdigit() for ch in channels):
+        readings = {ch: list(split_multiday_reads(nmi_readings[ch])) for ch in channels}
+    else:
+        readings = {ch: nmi_readings[ch] for ch in channels}
+    columns = readings_to_columnar({nmi: readings})
+    return list(daily_rows(columns, date_format))
 
-    rows = []
-    for ch in channels:
-        date_totals = {}
-        date_qualities = {}
-        uom = ""
-        sn = ""
-        for read in nmi_readings[ch]:
-            t_end = read.t_start
-            val = read.read_value
-            uom = read.uom  # Only last value will be saved
-            sn = read.meter_serial_number
-            quality = read.quality_method
-            t_group = t_end.strftime(date_format)
-            try:
-                date_totals[t_group] += val
-            except KeyError:
-                date_totals[t_group] = val
-
-            if t_group not in date_qualities:
-                date_qualities[t_group] = set()
-            date_qualities[t_group].add(quality)
-
-        for day in date_totals:
-            day_total = date_totals[day]
-            qualities = list(date_qualities[day])
-            day_quality = "".join(qualities)
-            if len(day_quality) > 1:
-                day_quality = "V"  # Multiple quality methods
-            row: tuple[Any] = (nmi, sn, day, ch, day_total, uom, day_quality)
-            rows.append(row)
-    return rows
-
-
-def output_as_daily_csv(file_name, output_dir="."):
+
+def output_as_daily_csv(
+    file_name,
+    output_dir=".",
+    compression: str | None = None,
+    level: int | None = None,
+) -> Path:
     """
     Transpose all channels and output a daily csv that is easier
     to read and do charting on
 
     :param file_name: The NEM file to process
     :param output_dir: Specify different output location
+    :param compression: Compress the file with gzip, bz2 or xz
+    :param level: The compression level
     :returns: The file that was created
     """
 
@@ -147,9 +398,17 @@ def output_as_daily_csv(file_name, output_dir="."):
     output_path = output_dir / output_file
 
     nf = NEMFile(file_name, strict=False)
-    m = nf.nem_data()
-    nmis = m.readings.keys()
-    all_rows = []
+    columns = nf.columnar_data()
+    # Datastream suffix starting with a number are Accumulated Metering Data (NEM13)
+    # Ensure no reading exceeds 24 hours
+    if any(ch[0].isdigit() for _, ch in columns.channels):
+        readings = columns.to_readings()
+        columns = readings_to_columnar(
+            {
+                nmi: {ch: list(split_multiday_reads(reads)) for ch, reads in x.items()}
+                for nmi, x in readings.items()
+            }
+        )
     headings = [
         "nmi",
         "meter_sn",
@@ -159,10 +418,4 @@ def output_as_daily_csv(file_name, output_dir="."):
         "uom",
         "quality_method",
     ]
-    for nmi in nmis:
-        rows = flatten_and_group_rows(nmi, m.transactions[nmi], m.readings[nmi])
-        all_rows += rows
-
-    save_to_csv(headings, all_rows, output_path)
-
-    return output_path
+    return save_to_csv(headings, daily_rows(columns), output_path, compression, level)
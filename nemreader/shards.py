@@ -0,0 +1,162 @@
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from sqlite_utils import Database
+
+from .nem_objects import ReadingBlock
+from .views import SUMMARY_VIEWS
+
+log = logging.getLogger(__name__)
+
+SHARD_BY = ("nmi", "month")
+# Tables and views of the shards that are combined in the catalog
+UNION_VIEWS = ("readings", "daily_reads")
+
+# Shared readers of each database file, see `output_db.get_reader`
+open_readers: OrderedDict[Path, Any] = OrderedDict()
+readers_lock = threading.Lock()
+
+
+def shard_path(catalog_path: Path, shard: int) -> Path:
+    """The file name of a shard, alongside the catalog"""
+    catalog_path = Path(catalog_path)
+    return catalog_path.with_name(
+        f"{catalog_path.stem}_{shard:02d}{catalog_path.suffix}"
+    )
+
+
+def shard_number(block: ReadingBlock, shards: int, shard_by: str = "nmi") -> int:
+    """The shard that a block of readings is written to
+
+    Blocks are routed by a hash of the NMI, or by the month of the interval date
+    """
+    if shard_by == "nmi":
+        return zlib.crc32(block.nmi.encode()) % shards
+    if shard_by == "month":
+        day = block.interval_date
+        return (day.year * 12 + day.month - 1) % shards if day else 0
+    raise ValueError(f"Shard by must be one of {SHARD_BY}, not {shard_by!r}")
+
+
+def create_catalog(
+    catalog_path: Path, shards: int, shard_by: str = "nmi"
+) -> list[Path]:
+    """Create the catalog of shard databases, or check it matches an existing one
+
+    :returns: The path of each shard
+    """
+    if shard_by not in SHARD_BY:
+        raise ValueError(f"Shard by must be one of {SHARD_BY}, not {shard_by!r}")
+    if shards < 1:
+        raise ValueError("There must be at least one shard")
+    db = Database(catalog_path)
+    try:
+        if db["shards"].exists():
+            existing = {x["shard_by"] for x in db["shards"].rows}
+            if existing != {shard_by} or db["shards"].count != shards:
+                raise ValueError(
+                    f"{catalog_path} is not split into {shards} by {shard_by}"
+                )
+        db["shards"].upsert_all(
+            (
+                {
+                    "shard": i,
+                    "file_name": shard_path(catalog_path, i).name,
+                    "shard_by": shard_by,
+                }
+                for i in range(shards)
+            ),
+            pk="shard",
+        )
+    finally:
+        db.conn.close()
+    return [shard_path(catalog_path, i) for i in range(shards)]
+
+
+def shard_paths(catalog_path: Path) -> list[Path]:
+    """The shards of a catalog, or an empty list if it is not sharded"""
+    if not os.path.exists(catalog_path):
+        return []
+    db = Database(catalog_path)
+    try:
+        if not db["shards"].exists():
+            return []
+        rows = db.execute("SELECT file_name FROM shards ORDER BY shard").fetchall()
+    finally:
+        db.conn.close()
+    return [Path(catalog_path).with_name(x[0]) for x in rows]
+
+
+def close_reader(db_path: Path) -> None:
+    """Close the shared reader of a database, if it has one"""
+    with readers_lock:
+        reader = open_readers.pop(Path(db_path).resolve(), None)
+    if reader is not None:
+        reader.close()
+
+
+def remove_sqlite(output_path: Path) -> None:
+    """Delete a database file, along with its shards if it is a catalog
+
+    Shared readers of the files are closed first, so that none of them
+    keep reading the deleted files.
+    """
+    close_reader(output_path)
+    for path in shard_paths(output_path):
+        close_reader(path)
+        if path.exists():
+            os.remove(path)
+    os.remove(output_path)
+
+
+def open_catalog(catalog_path: Path) -> Database:
+    """Open a catalog with its shards attached, and views combining them
+
+    The `readings`, `nmi_summary` and `daily_reads` views,
+    and the summary views of `extend_sqlite`, are TEMP views,
+    as a saved view can not use an attached database,
+    so they only exist on the returned connection.
+    """
+    paths = shard_paths(catalog_path)
+    conn = sqlite3.connect(catalog_path)
+    limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    if len(paths) > limit:
+        conn.close()
+        raise ValueError(f"SQLite can only attach {limit} shards, not {len(paths)}")
+    db = Database(conn)
+    for i, path in enumerate(paths):
+        db.attach(f"shard{i}", path)
+
+    views = []
+    for name in UNION_VIEWS:
+        selects = [
+            f"SELECT * FROM shard{i}.{name}"
+            for i in range(len(paths))
+            if db.execute(
+                f"SELECT 1 FROM shard{i}.sqlite_master WHERE name = ?", [name]
+            ).fetchone()
+        ]
+        if selects:
+            db.execute(f"CREATE TEMP VIEW {name} AS {' UNION ALL '.join(selects)}")
+            views.append(name)
+    if "readings" in views:
+        # A NMI can span several shards when sharded by month
+        db.execute(
+            """CREATE TEMP VIEW nmi_summary AS
+            SELECT nmi, channel, MIN(t_start) as first_interval,
+            MAX(t_end) as last_interval
+            FROM readings
+            GROUP BY nmi, channel"""
+        )
+    # The summary views of `extend_sqlite`, over all of the shards
+    for name, sql in SUMMARY_VIEWS.items():
+        source = "readings" if name == "combined_readings" else "daily_reads"
+        if source in views:
+            db.execute(f"CREATE TEMP VIEW {name} AS {sql}")
+    return db
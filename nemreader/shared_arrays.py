@@ -0,0 +1,209 @@
+import logging
+from collections import deque
+from collections.abc import Generator, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from .columnar import ARRAY_FIELDS, ColumnarReadings
+from .nem_objects import HeaderRecord
+from .nem_reader import NEMFile
+
+log = logging.getLogger(__name__)
+
+# Offsets are small so travel with the handle, everything else is shared
+SHARED_FIELDS = tuple(x for x in ARRAY_FIELDS if x != "offsets")
+FIELD_DTYPES = {
+    "t_start": np.dtype("datetime64[s]"),
+    "t_end": np.dtype("datetime64[s]"),
+    "read_value": np.dtype(np.float64),
+    "val_start": np.dtype(np.float64),
+    "val_end": np.dtype(np.float64),
+}
+CODE_DTYPE = np.dtype(np.int32)
+
+
+class SharedReadingsHandle(NamedTuple):
+    """Small, picklable reference to readings held in shared memory"""
+
+    shm_name: str
+    length: int
+    channels: list[tuple[str, str]]
+    offsets: list[int]
+    strings: list[str | None]
+    header: HeaderRecord
+    transactions: dict[str, dict[str, list]]
+
+
+def _layout(length: int) -> dict[str, tuple[np.dtype, int]]:
+    """Position of each array within the shared memory block"""
+    layout = {}
+    position = 0
+    for field in SHARED_FIELDS:
+        dtype = FIELD_DTYPES.get(field, CODE_DTYPE)
+        layout[field] = (dtype, position)
+        position += -(-dtype.itemsize * length // 8) * 8  # Keep 8 byte alignment
+    layout["_size"] = (CODE_DTYPE, position)
+    return layout
+
+
+def parse_to_shared_memory(file_name, strict: bool = False) -> SharedReadingsHandle:
+    """Parse a file and copy its columnar readings into shared memory
+
+    Intended to run in a worker process. The parent opens the result with
+    `SharedReadings(handle)` and must unlink it once finished.
+    """
+    nf = NEMFile(file_name, strict=strict)
+    columns, transactions = nf.columnar_with_transactions()
+    length = len(columns)
+    layout = _layout(length)
+    shm = SharedMemory(create=True, size=max(layout["_size"][1], 1))
+    try:
+        for field in SHARED_FIELDS:
+            dtype, position = layout[field]
+            target = np.frombuffer(shm.buf, dtype, count=length, offset=position)
+            target[:] = getattr(columns, field)
+            del target  # Release the buffer before closing
+    finally:
+        shm.close()
+    return SharedReadingsHandle(
+        shm.name,
+        length,
+        columns.channels,
+        columns.offsets.tolist(),
+        columns.strings,
+        nf.header,
+        transactions,
+    )
+
+
+class SharedReadings:
+    """Readings from a worker process, viewed in place in shared memory
+
+    Use as a context manager so the memory is released afterwards:
+
+        with SharedReadings(handle) as shared:
+            total = shared.data_frame()["value"].sum()
+    """
+
+    def __init__(self, handle: SharedReadingsHandle) -> None:
+        self.handle = handle
+        self.header = handle.header
+        self.transactions = handle.transactions
+        self._shm = SharedMemory(name=handle.shm_name)
+        layout = _layout(handle.length)
+        # Arrays from frombuffer hold the buffer open while they exist,
+        # so closing early raises an error rather than leaving them dangling
+        arrays = {
+            field: np.frombuffer(
+                self._shm.buf, dtype, count=handle.length, offset=position
+            )
+            for field, (dtype, position) in layout.items()
+            if field in SHARED_FIELDS
+        }
+        self.columns = ColumnarReadings(
+            channels=handle.channels,
+            offsets=np.array(handle.offsets, dtype=np.int64),
+            strings=handle.strings,
+            **arrays,
+        )
+
+    def __repr__(self):
+        return f"<SharedReadings {self.header.file_name}>"
+
+    def __enter__(self) -> "SharedReadings":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.unlink()
+        self.close()
+
+    def data_frame(self) -> pd.DataFrame:
+        """Return the readings as a DataFrame
+
+        Numeric columns are views of the shared memory and text columns
+        are categoricals over the shared codes.
+        """
+        cols = self.columns
+        sizes = np.diff(cols.offsets)
+        nmis = list(dict.fromkeys(nmi for nmi, _ in cols.channels))
+        nmi_codes = [nmis.index(nmi) for nmi, _ in cols.channels]
+        suffixes = list(dict.fromkeys(suffix for _, suffix in cols.channels))
+        suffix_codes = [suffixes.index(suffix) for _, suffix in cols.channels]
+        data = {
+            "nmi": pd.Categorical.from_codes(np.repeat(nmi_codes, sizes), nmis),
+            "suffix": pd.Categorical.from_codes(
+                np.repeat(suffix_codes, sizes), suffixes
+            ),
+            "serno": _categorical(cols.meter_serial_number, cols.strings),
+            "t_start": cols.t_start,
+            "t_end": cols.t_end,
+            "value": cols.read_value,
+            "quality": _categorical(cols.quality_method, cols.strings),
+            "evt_code": _categorical(cols.event_code, cols.strings),
+            "evt_desc": _categorical(cols.event_desc, cols.strings),
+        }
+        return pd.DataFrame(data, copy=False)
+
+    def close(self) -> None:
+        """Stop using the shared memory in this process
+
+        Any arrays or DataFrames taken from it must be deleted first.
+        """
+        self.columns = None
+        self._shm.close()
+
+    def unlink(self) -> None:
+        """Free the shared memory block"""
+        self._shm.unlink()
+
+
+def _categorical(codes: np.ndarray, strings: list[str | None]) -> pd.Categorical:
+    """Wrap text codes as a categorical, with None as a missing value"""
+    if None not in strings:
+        return pd.Categorical.from_codes(codes, strings)
+    categories = [x for x in strings if x is not None]
+    remap = np.array([-1 if x is None else categories.index(x) for x in strings])
+    return pd.Categorical.from_codes(remap[codes], categories)
+
+
+def parse_files_shared(
+    file_names: Iterable, max_workers: int | None = None, strict: bool = False
+) -> Generator[SharedReadings, None, None]:
+    """Parse files in a process pool and yield results from shared memory
+
+    Each result should be closed and unlinked once used,
+    ideally by using it as a context manager.
+    Results that are never yielded, because a file fails or the
+    generator is closed early, are unlinked here.
+    """
+    # Workers must share the parents resource tracker,
+    # otherwise the blocks are removed when the workers exit
+    resource_tracker.ensure_running()
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        pending = deque(
+            pool.submit(parse_to_shared_memory, x, strict=strict) for x in file_names
+        )
+        try:
+            while pending:
+                yield SharedReadings(pending.popleft().result())
+        finally:
+            for future in pending:
+                future.cancel()
+            for future in pending:
+                if not future.cancelled() and future.exception() is None:
+                    unlink_handle(future.result())
+
+
+def unlink_handle(handle: SharedReadingsHandle) -> None:
+    """Free the shared memory of a result that will not be used"""
+    try:
+        shm = SharedMemory(name=handle.shm_name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
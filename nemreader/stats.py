@@ -0,0 +1,105 @@
+import logging
+from collections import Counter
+from collections.abc import Iterable
+from datetime import datetime
+
+from .nem_objects import Reading
+
+log = logging.getLogger(__name__)
+
+
+class ChannelStats:
+    """Running statistics of the readings of a channel
+
+    Statistics of parts of a file, or of several files,
+    can be combined with `merge`.
+    """
+
+    def __init__(self, nmi: str, channel: str, uom: str = "") -> None:
+        self.nmi = nmi
+        self.channel = channel
+        self.uom = uom
+        self.intervals = 0
+        self.missing = 0  # intervals without a value
+        self.total = 0.0
+        self.minimum: float | None = None
+        self.maximum: float | None = None
+        self.first: datetime | None = None  # start of the first reading
+        self.last: datetime | None = None  # end of the last reading
+        self.quality: Counter[str] = Counter()  # intervals of each quality method
+        self.events: Counter[str] = Counter()  # intervals with each reason code
+
+    def __repr__(self):
+        return f"<ChannelStats {self.nmi} {self.channel} {self.intervals}>"
+
+    def add_values(self, values: list[float], intervals: int) -> None:
+        """Add the values of some intervals, which may be missing values"""
+        self.intervals += intervals
+        self.missing += intervals - len(values)
+        if not values:
+            return
+        self.total += sum(values)
+        self._add_range(min(values), max(values))
+
+    def _add_range(self, low: float, high: float) -> None:
+        self.minimum = low if self.minimum is None else min(self.minimum, low)
+        self.maximum = high if self.maximum is None else max(self.maximum, high)
+
+    def add_span(self, t_start: datetime | None, t_end: datetime | None) -> None:
+        """Extend the first and last times to include a period"""
+        if t_start is not None and (self.first is None or t_start < self.first):
+            self.first = t_start
+        if t_end is not None and (self.last is None or t_end > self.last):
+            self.last = t_end
+
+    def add_reading(self, reading: Reading) -> None:
+        """Add a single reading"""
+        values = [] if reading.read_value is None else [reading.read_value]
+        self.add_values(values, 1)
+        self.add_span(reading.t_start, reading.t_end)
+        self.quality[reading.quality_method or ""] += 1
+        if reading.event_code:
+            self.events[reading.event_code] += 1
+
+    def merge(self, other: "ChannelStats") -> "ChannelStats":
+        """Combine the statistics of another part of the same channel"""
+        self.uom = self.uom or other.uom
+        self.intervals += other.intervals
+        self.missing += other.missing
+        self.total += other.total
+        if other.minimum is not None and other.maximum is not None:
+            self._add_range(other.minimum, other.maximum)
+        self.add_span(other.first, other.last)
+        self.quality.update(other.quality)
+        self.events.update(other.events)
+        return self
+
+    def as_dict(self) -> dict:
+        """The statistics as a dict that can be saved as JSON"""
+        return {
+            "nmi": self.nmi,
+            "channel": self.channel,
+            "uom": self.uom,
+            "intervals": self.intervals,
+            "missing": self.missing,
+            "total": self.total,
+            "minimum": self.minimum,
+            "maximum": self.maximum,
+            "first": self.first.isoformat() if self.first else None,
+            "last": self.last.isoformat() if self.last else None,
+            "quality": dict(self.quality),
+            "events": dict(self.events),
+        }
+
+
+def merge_stats(
+    results: Iterable[dict[tuple[str, str], ChannelStats]],
+) -> dict[tuple[str, str], ChannelStats]:
+    """Combine the statistics of each channel from several files"""
+    merged: dict[tuple[str, str], ChannelStats] = {}
+    for result in results:
+        for key, stats in result.items():
+            if key not in merged:
+                merged[key] = ChannelStats(*key)
+            merged[key].merge(stats)
+    return merged
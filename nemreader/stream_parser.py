@@ -0,0 +1,119 @@
+import codecs
+import logging
+from collections.abc import Callable, Iterable, Iterator
+
+from .nem_objects import B2BDetails12, HeaderRecord, ReadingBlock
+from .nem_reader import (
+    NEM12RecordParser,
+    fast_tokenizer,
+    parse_header_row,
+    record_to_block,
+)
+
+log = logging.getLogger(__name__)
+
+
+class NEM12StreamParser:
+    """Incremental NEM12 parser for data that arrives in chunks
+
+    Feed it bytes as they are received and it returns the reading blocks
+    that are complete so far. Partial lines and 300 rows that may still
+    be updated by a following 400 row are kept until the next chunk.
+
+        parser = NEM12StreamParser()
+        for chunk in upload:
+            for block in parser.feed(chunk):
+                ...
+        for block in parser.close():
+            ...
+    """
+
+    def __init__(
+        self,
+        file_name: str = "",
+        strict: bool = False,
+        encoding: str = "utf-8",
+        tokenizer: Callable[[Iterable[str]], Iterator[list[str]]] | None = None,
+    ) -> None:
+        self.file_name = file_name
+        self.strict = strict
+        self.tokenizer = tokenizer or fast_tokenizer
+        self.header: HeaderRecord | None = None
+        self.transactions: dict[str, dict[str, list]] = {}
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self._partial = ""  # text after the last complete line
+        self._records = NEM12RecordParser(file_name=file_name)
+        self._closed = False
+
+    def __repr__(self):
+        return f"<NEM12StreamParser {self.file_name}>"
+
+    @property
+    def nmis(self) -> list[str]:
+        """NMIs seen so far"""
+        return list(self.transactions.keys())
+
+    def feed(self, data: bytes | str) -> list[ReadingBlock]:
+        """Parse the next chunk and return the blocks completed by it"""
+        if self._closed:
+            raise ValueError("Cannot feed a closed parser")
+        if isinstance(data, bytes):
+            data = self._decoder.decode(data)
+        lines = (self._partial + data).split("\n")
+        self._partial = lines.pop()
+
+        # Don't split up quoted fields that span several lines
+        quotes = 0
+        complete = len(lines)
+        for i, line in enumerate(lines):
+            quotes += line.count('"')
+            if quotes % 2 == 0:
+                complete = i + 1
+        if complete < len(lines):
+            self._partial = "\n".join([*lines[complete:], self._partial])
+            lines = lines[:complete]
+        return self._parse_lines(lines)
+
+    def close(self) -> list[ReadingBlock]:
+        """Parse any remaining data and return the final blocks"""
+        if self._closed:
+            return []
+        remaining = self._partial + self._decoder.decode(b"", final=True)
+        lines = [remaining] if remaining else []
+        self._partial = ""
+        blocks = self._parse_lines(lines)
+        if self.header is None:
+            self._read_header([])
+        self._closed = True
+        blocks += self._records_to_blocks(self._records.finish())
+        return blocks
+
+    def _read_header(self, row: list[str]) -> bool:
+        """Set the header from the first row, returns whether it was used"""
+        self.header = parse_header_row(row, self.file_name, self.strict)
+        if self.header.version_header != "NEM12":
+            raise ValueError("NEM12StreamParser only supports NEM12 files")
+        return not self.header.assumed
+
+    def _parse_lines(self, lines: list[str]) -> list[ReadingBlock]:
+        blocks = []
+        for row in self.tokenizer(lines):
+            if self.header is None:
+                if not row:
+                    continue  # Skip empty lines at start of file
+                if self._read_header(row):
+                    continue
+            blocks += self._records_to_blocks(self._records.push(row))
+        return blocks
+
+    def _records_to_blocks(self, records: list) -> list[ReadingBlock]:
+        blocks = []
+        for nmi_d, record in records:
+            if block := record_to_block(nmi_d, record):
+                blocks.append(block)
+                continue
+            suffixes = self.transactions.setdefault(nmi_d.nmi, {})
+            trans = suffixes.setdefault(nmi_d.nmi_suffix, [])
+            if isinstance(record, B2BDetails12):
+                trans.append(record)
+        return blocks
@@ -0,0 +1,147 @@
+import logging
+from collections.abc import Iterable
+from datetime import date
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+DAY_TYPES = {"all": range(7), "weekday": range(5), "weekend": range(5, 7)}
+
+
+class TariffPeriod(NamedTuple):
+    """Times of the week (and year) that a tariff band applies
+
+    `start` and `end` are "HH:MM" times of day, with "24:00" for the end
+    of the day. A period that ends before it starts wraps past midnight.
+    """
+
+    band: str
+    start: str
+    end: str
+    days: str = "all"  # all, weekday or weekend
+    months: tuple[int, ...] | None = None  # Defaults to the whole year
+
+
+def minute_of_day(value: str) -> int:
+    """Convert a "HH:MM" time to minutes since midnight"""
+    hours, minutes = value.split(":")
+    result = int(hours) * 60 + int(minutes)
+    if not 0 <= result <= MINUTES_PER_DAY:
+        raise ValueError(f"Invalid time of day {value!r}")
+    return result
+
+
+class TariffSchedule:
+    """Assigns a tariff band to intervals based on their start time
+
+    The bands for each minute of the week in each month are worked out
+    once, so classifying readings is a single array lookup.
+    Later periods take precedence where they overlap,
+    and public holidays use the same bands as a Sunday.
+
+    :param default: The band for times not covered by any period
+    :param holidays: Dates of public holidays
+    :param bands: The order of the bands, defaults to the order they appear
+    """
+
+    def __init__(
+        self,
+        periods: Iterable[TariffPeriod],
+        default: str = "Other",
+        holidays: Iterable[date] = (),
+        bands: Iterable[str] = (),
+    ) -> None:
+        self.periods = list(periods)
+        self.default = default
+        bands = tuple(bands)
+        self.holidays = np.array(sorted(set(holidays)), dtype="datetime64[D]")
+        names = [*bands, *(x.band for x in self.periods), default]
+        self.bands: list[str] = list(dict.fromkeys(names))
+        self._table = self._build_table()
+
+        # Only keep the default band if there are times that use it
+        default_code = self.bands.index(default)
+        unused = not (self._table == default_code).any()
+        if unused and default not in bands and default_code == len(self.bands) - 1:
+            self.bands.pop()
+
+    def __repr__(self):
+        return f"<TariffSchedule {self.bands}>"
+
+    def _build_table(self) -> np.ndarray:
+        """Band code for each month and minute of the week"""
+        default_code = self.bands.index(self.default)
+        table = np.full((12, MINUTES_PER_WEEK), default_code, dtype=np.int16)
+        for period in self.periods:
+            if period.days not in DAY_TYPES:
+                raise ValueError(f"Invalid days {period.days!r} for {period.band}")
+            code = self.bands.index(period.band)
+            start = minute_of_day(period.start)
+            end = minute_of_day(period.end)
+            if start < end:
+                spans = [(start, end)]
+            else:
+                spans = [(start, MINUTES_PER_DAY), (0, end)]
+            months = [x - 1 for x in period.months] if period.months else slice(None)
+            for day in DAY_TYPES[period.days]:
+                offset = day * MINUTES_PER_DAY
+                for first, last in spans:
+                    table[months, offset + first : offset + last] = code
+        return table
+
+    def classify(self, t_start) -> np.ndarray:
+        """Band codes (indexes into `bands`) for an array of start times"""
+        t_start = np.asarray(t_start, dtype="datetime64[m]")
+        minutes = t_start.astype(np.int64)
+        days = minutes // MINUTES_PER_DAY
+        minute = minutes % MINUTES_PER_DAY
+        weekday = (days + 3) % 7  # 1970-01-01 was a Thursday
+        minute_of_week = weekday * MINUTES_PER_DAY + minute
+        if len(self.holidays):
+            holiday = np.isin(days, self.holidays.astype(np.int64))
+            sunday = 6 * MINUTES_PER_DAY + minute
+            minute_of_week = np.where(holiday, sunday, minute_of_week)
+        month = t_start.astype("datetime64[M]").astype(np.int64) % 12
+        return self._table[month, minute_of_week]
+
+    def label(self, t_start) -> pd.Categorical:
+        """Band names for an array (or DataFrame column) of start times"""
+        return pd.Categorical.from_codes(self.classify(t_start), self.bands)
+
+
+# The time of day periods used for the daily summary
+DEFAULT_SCHEDULE = TariffSchedule(
+    [
+        TariffPeriod("Night", "00:00", "04:00"),
+        TariffPeriod("Morning", "04:00", "09:00"),
+        TariffPeriod("Day", "09:00", "16:00"),
+        TariffPeriod("Evening", "16:00", "21:00"),
+        TariffPeriod("Night", "21:00", "24:00"),
+    ],
+    bands=("Morning", "Day", "Evening", "Night"),
+)
+
+
+def daily_band_totals(
+    t_start, values, schedule: TariffSchedule = DEFAULT_SCHEDULE
+) -> tuple[np.ndarray, np.ndarray]:
+    """Sum values for each day and tariff band
+
+    :returns: The days, and the totals with a row for each day
+        and a column for each band in `schedule.bands`
+    """
+    days, day_index = np.unique(
+        np.asarray(t_start, dtype="datetime64[D]"), return_inverse=True
+    )
+    num_bands = len(schedule.bands)
+    totals = np.bincount(
+        day_index * num_bands + schedule.classify(t_start),
+        weights=np.asarray(values, dtype=np.float64),
+        minlength=len(days) * num_bands,
+    )
+    return days, totals.reshape(len(days), num_bands)
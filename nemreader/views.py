@@ -0,0 +1,63 @@
+# Views created by extend_sqlite over the readings and daily_reads tables
+SUMMARY_VIEWS = {
+    "combined_readings": """
+    SELECT nmi, t_start, t_end, 
+    SUM(CASE WHEN substr(channel,1,1) = 'B' THEN -1 * value ELSE value END) as value
+    FROM readings
+    GROUP BY nmi, t_start, t_end
+    ORDER BY 1, 2
+    """,
+    "monthly_reads": """
+    SELECT nmi, substr(day,1,7) as month,
+    count(day) as num_days, sum(imp) as imp, sum(exp) as exp,
+    sum(imp_morning) as imp_morning, sum(imp_day) as imp_day,
+    sum(imp_evening) as imp_evening, sum(imp_night) as imp_night
+    FROM daily_reads
+    GROUP BY nmi, substr(day,1,7)
+    ORDER BY 1, 2
+    """,
+    "latest_year": """
+    SELECT dr.nmi,
+    MIN(dr.day) as first_day,
+    MAX(dr.day) as last_day,
+    count(dr.day) as num_days,
+    sum(dr.imp) as imp,
+    sum(dr.exp) as exp,
+    sum(dr.imp_morning) as imp_morning,
+    sum(dr.imp_day) as imp_day,
+    sum(dr.imp_evening) as imp_evening,
+    sum(dr.imp_night) as imp_night
+    FROM daily_reads dr
+    LEFT JOIN (SELECT NMI, MAX(last_interval) as last_interval FROM nmi_summary
+       GROUP BY NMI) li ON li.nmi = dr.nmi
+    WHERE dr.day >= DATETIME(li.last_interval, '-366 days')
+    GROUP BY dr.nmi
+    """,
+    "latest_year_seasons": """
+    SELECT dr.nmi,
+    (CASE WHEN CAST(strftime('%m', dr.day) AS INTEGER) < 3 THEN 'SUMMER'
+        ELSE (CASE WHEN CAST(strftime('%m', dr.day) AS INTEGER) < 6 THEN 'AUTUMN'
+        ELSE (CASE WHEN CAST(strftime('%m', dr.day) AS INTEGER) < 9 THEN 'WINTER'
+        ELSE (CASE WHEN CAST(strftime('%m', dr.day) AS INTEGER) < 12 THEN 'SPRING'
+        ELSE 'SUMMER' END) END) END) END) Season,
+    MIN(dr.day) as first_day,
+    MAX(dr.day) as last_day,
+    count(dr.day) as num_days,
+    sum(dr.imp) as imp,
+    sum(dr.exp) as exp,
+    sum(dr.imp_morning) as imp_morning,
+    sum(dr.imp_day) as imp_day,
+    sum(dr.imp_evening) as imp_evening,
+    sum(dr.imp_night) as imp_night
+    FROM daily_reads dr
+    LEFT JOIN (SELECT NMI, MAX(last_interval) as last_interval FROM nmi_summary
+      GROUP BY NMI) li ON li.nmi = dr.nmi
+    WHERE dr.day >= DATETIME(li.last_interval, '-366 days')
+    GROUP BY dr.nmi,
+        (CASE WHEN CAST(strftime('%m', dr.day) AS INTEGER) < 3 THEN 'SUMMER'
+        ELSE (CASE WHEN CAST(strftime('%m', dr.day) AS INTEGER) < 6 THEN 'AUTUMN'
+        ELSE (CASE WHEN CAST(strftime('%m', dr.day) AS INTEGER) < 9 THEN 'WINTER'
+        ELSE (CASE WHEN CAST(strftime('%m', dr.day) AS INTEGER) < 12 THEN 'SPRING'
+        ELSE 'SUMMER' END) END) END) END)
+    """,
+}
@@ -0,0 +1,93 @@
+import csv
+from datetime import datetime
+
+import pytest
+from sqlite_utils import Database
+
+from nemreader import output_as_sqlite, read_readings
+from nemreader.aggregate import (
+    aggregate_query,
+    aggregate_readings,
+    bucket_expression,
+    output_aggregate,
+)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    file_name = "examples/unzipped/Example_NEM12_actual_interval.csv"
+    return output_as_sqlite(file_name, output_dir=tmp_path)
+
+
+def test_hourly_buckets(db_path):
+    """Readings are summed into hourly buckets"""
+    rows = list(aggregate_readings(db_path, "VABD000163", bucket="1h"))
+    assert len(rows) == 24
+    assert rows[0]["bucket"] == "2004-02-01T00:00:00"
+    assert rows[0]["num_intervals"] == 2
+    assert rows[0]["total"] == pytest.approx(2 * 1.111)  # Q1 is excluded
+    assert rows[0]["maximum"] == pytest.approx(1.111)
+
+
+def test_export_is_negated(tmp_path):
+    """B channels are subtracted from the net value"""
+    file_name = "examples/unzipped/Example_NEM12_month_solar.csv"
+    db_path = output_as_sqlite(file_name, output_dir=tmp_path)
+    start = datetime(2023, 3, 5)
+    end = datetime(2023, 3, 6)
+    readings = read_readings(db_path, "NMI1234567", start=start, end=end)
+    expected = readings["E1"].value.sum() - readings["B1"].value.sum()
+
+    rows = list(aggregate_readings(db_path, bucket="1d", start=start, end=end))
+    assert len(rows) == 1
+    assert rows[0]["bucket"] == "2023-03-05T00:00:00"
+    assert rows[0]["num_intervals"] == 288
+    assert rows[0]["total"] == pytest.approx(expected)
+
+    rows = list(aggregate_readings(db_path, bucket="month", channels=["B1"]))
+    assert rows[0]["bucket"] == "2023-03-01T00:00:00"
+    assert rows[0]["maximum"] <= 0
+
+
+def test_aggregate_query_plan(db_path):
+    """The time range is searched within the primary key of each channel"""
+    start, end = datetime(2004, 2, 1, 12), datetime(2004, 2, 2)
+    db = Database(db_path)
+    sql, params = aggregate_query(db, "VABD000163", start=start, end=end)
+    assert params[:2] == ["VABD000163", "E1"]
+    plan = str(db.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall())
+    assert "nmi=? AND channel=? AND t_start>? AND t_start<?" in plan
+    assert [x.origin for x in db["readings"].indexes] == ["pk"]
+
+
+def test_all_nmis(db_path):
+    """Without a NMI each one is aggregated in turn, in order"""
+    output_as_sqlite(
+        "examples/unzipped/Example_NEM12_multiple_meters.csv",
+        output_dir=db_path.parent,
+    )
+    rows = list(aggregate_readings(db_path, bucket="1d"))
+    nmis = [x["nmi"] for x in rows]
+    assert nmis == sorted(nmis)
+    assert set(nmis) == {"NCDE001111", "NDDD001888", "VABD000163"}
+    for nmi in set(nmis):
+        expected = list(aggregate_readings(db_path, nmi, bucket="1d"))
+        assert [x for x in rows if x["nmi"] == nmi] == expected
+
+
+def test_invalid_bucket():
+    with pytest.raises(ValueError):
+        bucket_expression("1w")
+
+
+def test_output_aggregate(db_path, tmp_path):
+    fp = output_aggregate(db_path, tmp_path / "hourly.csv", bucket="30min")
+    with open(fp) as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 48
+
+    pq = pytest.importorskip("pyarrow.parquet")
+    fp = output_aggregate(db_path, tmp_path / "daily.parquet", bucket="1d")
+    table = pq.read_table(fp)
+    assert table.num_rows == 1
+    assert table.column("total")[0].as_py() == pytest.approx(48 * 1.111)
@@ -0,0 +1,68 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from sqlite_utils import Database
+
+from nemreader import NEMFile
+from nemreader.aio import aiter_blocks, ingest_many
+
+
+class ChunkedStream:
+    """Minimal async stream returning a file in small pieces"""
+
+    def __init__(self, file_name: str) -> None:
+        self.f = open(file_name, "rb")  # noqa: SIM115
+
+    async def read(self, n: int) -> bytes:
+        await asyncio.sleep(0)
+        data = self.f.read(n)
+        if not data:
+            self.f.close()
+        return data
+
+
+def test_aiter_blocks():
+    """Blocks can be parsed from an async stream"""
+    file_name = "examples/unzipped/Example_NEM12_multiple_meters.csv"
+
+    async def collect():
+        return [x async for x in aiter_blocks(ChunkedStream(file_name), 100)]
+
+    blocks = asyncio.run(collect())
+    assert blocks == list(NEMFile(file_name).iter_blocks())
+
+
+def test_ingest_many(tmp_path: Path):
+    """Files are ingested concurrently into a single DB"""
+    files = sorted(Path("examples/unzipped").glob("Example_NEM12_*.csv"))
+    files.append(Path("examples/invalid/Example_NEM12_30min_200_15min_400.csv"))
+    db_path = tmp_path / "nemdata.db"
+    counts = asyncio.run(ingest_many(files, db_path, concurrency=3, batch_size=500))
+    assert counts[files[-1]] == 0  # Invalid file is skipped
+    assert sum(counts.values()) > 0
+
+    db = Database(db_path)
+    nmis = {row["nmi"] for row in db.query("select nmi from nmi_summary")}
+    assert "NMI1234567" in nmis
+    assert "NCDE001111" in nmis
+
+
+def test_ingest_many_errors(tmp_path: Path):
+    files = [Path("examples/invalid/Example_NEM12_30min_200_15min_400.csv")]
+    with pytest.raises(ValueError):
+        asyncio.run(ingest_many(files, tmp_path / "nemdata.db", skip_errors=False))
+
+
+def test_ingest_many_partial(tmp_path: Path, caplog):
+    """A file that fails partway reports the readings that were committed"""
+    valid = Path("examples/unzipped/Example_NEM12_multiple_meters.csv").read_text()
+    invalid = Path("examples/invalid/Example_NEM12_30min_200_15min_400.csv")
+    lines = valid.strip().splitlines()[:-1] + invalid.read_text().splitlines()[1:]
+    bad_file = tmp_path / "partial.csv"
+    bad_file.write_text("\n".join(lines))
+    db_path = tmp_path / "nemdata.db"
+    counts = asyncio.run(ingest_many([bad_file], db_path, batch_size=10))
+    assert "Unable to process" in caplog.text
+    db = Database(db_path)
+    assert counts[bad_file] == db["readings"].count > 0
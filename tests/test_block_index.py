@@ -0,0 +1,84 @@
+import shutil
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+from nemreader import NEMFile
+from nemreader.block_index import BlockIndex
+
+
+def test_block_index():
+    """Index the channel blocks and interval dates of a file"""
+    file_name = "examples/unzipped/Example_NEM12_multiple_meters.csv"
+    index = BlockIndex.build(file_name)
+    assert index.nmis == ["NCDE001111", "NDDD001888"]
+    assert len(index.channels) == 6
+    dates = [x.interval_date for x in index.channels[0].records]
+    assert dates == ["20031204", "20031205"]
+
+
+def test_indexed_data_matches_full_parse():
+    """Reading a single NMI gives the same result as the full parse"""
+    file_name = "examples/unzipped/Example_NEM12_multiple_meters.csv"
+    full = NEMFile(file_name).nem_data()
+    for nmi in full.readings:
+        data = NEMFile(file_name).indexed_data(nmi)
+        assert data.readings == {nmi: full.readings[nmi]}
+        assert data.transactions == {nmi: full.transactions[nmi]}
+        assert data.header == full.header
+
+
+def test_indexed_data_date_range():
+    """Only the requested suffix and dates are parsed"""
+    file_name = "examples/unzipped/Example_NEM12_month_solar.csv"
+    nf = NEMFile(file_name)
+    data = nf.indexed_data(
+        "NMI1234567", suffixes=["E1"], start=date(2023, 3, 10), end=date(2023, 3, 11)
+    )
+    reads = data.readings["NMI1234567"]["E1"]
+    assert list(data.readings["NMI1234567"]) == ["E1"]
+    assert len(reads) == 2 * 288
+    assert reads[0].t_start.day == 10
+
+
+def test_saved_index(tmp_path: Path):
+    """A saved sidecar index is reused until the file changes"""
+    file_name = tmp_path / "nem12.csv"
+    shutil.copy("examples/unzipped/Example_NEM12_month_solar.csv", file_name)
+    nf = NEMFile(file_name)
+    nf.indexed_data("NMI1234567", save_index=True)
+    assert BlockIndex.sidecar_path(file_name).exists()
+    saved = BlockIndex.load(file_name)
+    assert saved.channels == nf.block_index().channels
+
+    with open(file_name, "a") as f:
+        f.write("\n")
+    assert BlockIndex.load(file_name) is None
+
+
+def test_zipped_file_not_indexed():
+    nf = NEMFile("examples/invalid/Example_NEM12_powercor.csv.zip")
+    with pytest.raises(ValueError):
+        nf.block_index()
+
+
+def test_block_index_reused(tmp_path: Path, monkeypatch, caplog):
+    """The index is built once and kept until the file changes"""
+    file_name = tmp_path / "nem12.csv"
+    shutil.copy("examples/unzipped/Example_NEM12_multiple_meters.csv", file_name)
+    builds = []
+    build = BlockIndex.build
+    monkeypatch.setattr(
+        BlockIndex, "build", lambda path: builds.append(path) or build(path)
+    )
+    nf = NEMFile(file_name)
+    for nmi in ("NCDE001111", "NDDD001888", "NCDE001111"):
+        assert nf.indexed_data(nmi).readings[nmi]
+    assert len(builds) == 1
+    assert "900" not in caplog.text
+
+    with open(file_name, "a") as f:
+        f.write("\n")
+    nf.indexed_data("NCDE001111")
+    assert len(builds) == 2
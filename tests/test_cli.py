@@ -1,3 +1,5 @@
+import json
+
 import pytest
 from typer.testing import CliRunner
 
@@ -36,6 +38,59 @@ def test_cli_csv_daily(runner):
     assert result.exit_code == 0
 
 
+def test_cli_csv_compressed(runner, tmp_path):
+    file_name = "examples/unzipped/Example_NEM12_actual_interval.csv"
+    args = ["--outdir", str(tmp_path), "--compress", "gzip", "--level", "6"]
+    result = runner.invoke(app, ["output-csv-daily", file_name, *args])
+    assert result.exit_code == 0
+    assert "_daily_totals.csv.gz" in result.stdout
+    assert "bytes" in result.stdout
+
+
+def test_cli_validate(runner):
+    files = ["examples/unzipped/*NEM13*.csv", "examples/invalid/*min*.csv"]
+    result = runner.invoke(app, ["validate", *files, "--jobs", "2"])
+    assert result.exit_code == 1
+    verdicts = [json.loads(x) for x in result.stdout.splitlines() if x.startswith("{")]
+    assert len(verdicts) > 3
+    assert all(x["valid"] for x in verdicts if "NEM13" in x["file_name"])
+    assert not all(x["valid"] for x in verdicts)
+
+    result = runner.invoke(app, ["validate", "examples/unzipped/*NEM13*.csv"])
+    assert result.exit_code == 0
+
+
+def test_cli_stats(runner):
+    file_name = "examples/unzipped/Example_NEM12_multiple_meters.csv"
+    result = runner.invoke(app, ["stats", file_name, file_name, "-j", "2"])
+    assert result.exit_code == 0
+    channels = json.loads(result.stdout)
+    assert {x["nmi"] for x in channels} == {"NCDE001111", "NDDD001888"}
+    assert all(x["intervals"] % 2 == 0 for x in channels)
+
+    result = runner.invoke(app, ["stats", file_name, "--per-file"])
+    assert json.loads(result.stdout)["file_name"] == file_name
+
+
+def test_cli_batch(runner, tmp_path):
+    files = ["examples/unzipped/Example_NEM12_*meters.csv", "examples/nem12/*S01*"]
+    result = runner.invoke(app, ["list-nmis", *files, "-j", "2"])
+    assert result.exit_code == 0
+    assert result.stdout.count("The following NMI[suffix] exist in this file:") == 2
+    assert "Processed 2 files" in result.stdout
+
+    args = ["--outdir", str(tmp_path), "--jobs", "2"]
+    result = runner.invoke(app, ["output-csv-daily", *files, *args])
+    assert result.exit_code == 0
+    assert result.stdout.count("Created") == 2
+    assert len(list(tmp_path.glob("*_daily_totals.csv"))) == 2
+
+    result = runner.invoke(app, ["output-csv", *files, "missing.csv", *args])
+    assert result.exit_code == 1
+    assert result.stdout.count("Created") == 3
+    assert "Unable to process missing.csv" in result.stdout
+
+
 def test_cli_sqlite(runner):
     file_name = "examples/unzipped/Example_NEM12_actual_interval.csv"
     result = runner.invoke(app, ["output-sqlite", file_name, "--verbose"])
@@ -48,3 +103,22 @@ def test_cli_sqlite_dir(runner):
     result = runner.invoke(app, ["output-sqlite", file_dir, "--verbose"])
     assert "Finished exporting to DB." in result.stdout
     assert result.exit_code == 0
+
+
+def test_cli_parquet(runner, tmp_path):
+    file_name = "examples/unzipped/Example_NEM12_actual_interval.csv"
+    result = runner.invoke(app, ["output-parquet", file_name, "--outdir", tmp_path])
+    assert "Created" in result.stdout
+    assert result.exit_code == 0
+
+
+def test_cli_aggregate(runner, tmp_path):
+    file_name = "examples/unzipped/Example_NEM12_actual_interval.csv"
+    runner.invoke(app, ["output-sqlite", file_name, "--outdir", str(tmp_path)])
+    db_file = str(tmp_path / "nemdata.db")
+    args = ["aggregate", db_file, "--nmi", "VABD000163", "--bucket", "1d"]
+    args += ["--from", "2004-02-01", "--outdir", str(tmp_path)]
+    result = runner.invoke(app, args)
+    assert "Created" in result.stdout
+    assert result.exit_code == 0
+    assert (tmp_path / "VABD000163_1d.csv").exists()
@@ -0,0 +1,117 @@
+import sqlite3
+from datetime import date, datetime
+
+import pytest
+from sqlite_utils import Database
+
+from nemreader import output_as_sqlite
+from nemreader.completeness import (
+    channel_coverage,
+    db_coverage,
+    file_coverage,
+    incomplete_days,
+    update_coverage,
+)
+
+
+def test_file_coverage():
+    """Runs of intervals are grouped by quality"""
+    file_name = "examples/unzipped/Example_NEM12_multiple_quality.csv"
+    (coverage,) = file_coverage(file_name)
+    assert not coverage.complete
+    assert coverage.quality == {"F14": 20, "A": 4, "S14": 24}
+    assert [(x.status, x.intervals) for x in coverage.ranges] == [
+        ("not_actual", 20),
+        ("actual", 4),
+        ("not_actual", 24),
+    ]
+    assert coverage.ranges[1].start == datetime(2004, 4, 17, 10)
+
+
+def test_missing_intervals():
+    t_start = ["2024-01-01T00:00", "2024-01-01T12:00", "2024-01-03T00:00"]
+    t_end = ["2024-01-01T12:00", "2024-01-02T00:00", "2024-01-03T12:00"]
+    coverage = channel_coverage(
+        "NMI", "E1", t_start, t_end, [1.0, 0.0, 2.0], ["A", "A", "A"]
+    )
+    assert [(x.status, x.intervals) for x in coverage.ranges] == [
+        ("actual", 1),
+        ("zero", 1),
+        ("missing", 2),
+        ("actual", 1),
+        ("missing", 1),
+    ]
+    assert coverage.ranges[2].start == datetime(2024, 1, 2)
+    assert not coverage.complete
+    coverage = channel_coverage(
+        "NMI", "E1", t_start[:2], t_end[:2], [1.0, 0.0], ["A", "A"]
+    )
+    assert coverage.complete
+    assert not coverage.is_complete(include_zero=True)
+
+
+def test_changing_interval_length():
+    """Intervals are counted at the length of each reading"""
+    file_name = "examples/nem12/NEM12#000000000000005#CNRGYMDP#NEMMCO.zip"
+    coverage = file_coverage(file_name)[0]
+    assert [(x.status, x.intervals) for x in coverage.ranges] == [("actual", 288)]
+    assert coverage.ranges[0].end == datetime(2005, 3, 24)
+
+
+def test_register_reads():
+    """Gaps shorter than a read between NEM13 register reads are ignored"""
+    file_name = "examples/nem13/nem13#12#INTEGM#NEMMCO.zip"
+    (coverage,) = file_coverage(file_name)
+    assert coverage.complete
+    assert [(x.status, x.intervals) for x in coverage.ranges] == [("actual", 12)]
+
+
+def test_coverage_table(tmp_path):
+    for file_name in (
+        "examples/unzipped/Example_NEM12_actual_interval.csv",
+        "examples/unzipped/Example_NEM12_multiple_quality.csv",
+    ):
+        fp = output_as_sqlite(file_name, output_dir=tmp_path)
+    update_coverage(fp)
+    update_coverage(fp, ["CCCC123456"])  # Replaces existing rows
+
+    db = Database(fp)
+    assert db["coverage"].count == 5
+    assert db["coverage_quality"].count == 5
+    assert incomplete_days(fp) == {"CCCC123456": {date(2004, 4, 17)}}
+    assert incomplete_days(fp, ["VABD000163"]) == {}
+
+
+def test_incomplete_zero_days(tmp_path):
+    """Days with readings of zero can be flagged as incomplete"""
+    values = ",".join(["1.5"] * 24 + ["0"] * 24)
+    lines = [
+        "100,NEM12,200405011135,MDA1,Ret1",
+        "200,NMI1,E1,1,E1,N1,METSER123,kWh,30,",
+        f"300,20040201,{values},A,,,20040203120000,",
+        f"300,20040202,{','.join(['1.5'] * 48)},A,,,20040203120000,",
+        "900",
+    ]
+    file_name = tmp_path / "zero.csv"
+    file_name.write_text("\n".join(lines))
+    fp = output_as_sqlite(file_name, output_dir=tmp_path)
+    update_coverage(fp)
+    assert incomplete_days(fp) == {}
+    assert incomplete_days(fp, include_zero=True) == {"NMI1": {date(2004, 2, 1)}}
+
+
+def test_coverage_rollback(tmp_path, monkeypatch):
+    """Existing rows of a NMI are kept if its update fails"""
+    file_name = "examples/unzipped/Example_NEM12_multiple_quality.csv"
+    fp = output_as_sqlite(file_name, output_dir=tmp_path)
+    update_coverage(fp)
+    rows = list(Database(fp)["coverage"].rows)
+
+    def duplicate_ranges(db_path, nmi):
+        for coverage in db_coverage(db_path, nmi):
+            yield coverage._replace(ranges=coverage.ranges * 2)
+
+    monkeypatch.setattr("nemreader.completeness.db_coverage", duplicate_ranges)
+    with pytest.raises(sqlite3.IntegrityError):
+        update_coverage(fp)
+    assert list(Database(fp)["coverage"].rows) == rows
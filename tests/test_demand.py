@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlite_utils import Database
+
+from nemreader import NEMFile, extend_sqlite, output_as_sqlite
+from nemreader.demand import coincident_peak, monthly_demand, rolling_demand
+from nemreader.output_db import calc_coincident_peak
+
+
+def test_rolling_demand():
+    """Windows over missing readings are skipped"""
+    t_start = np.arange("2024-01-01T00:00", "2024-01-01T02:00", 5, "datetime64[m]")
+    values = np.ones(len(t_start))
+    t_start = np.delete(t_start, 20)
+    values = np.delete(values, 20)
+    values[3] = 4.0
+    starts, demand = rolling_demand(t_start, values, interval=5, window=30)
+    assert len(starts) == len(values) - 5
+    assert demand[0] == pytest.approx(18.0)
+    assert demand[6] == pytest.approx(12.0)
+    assert np.isnan(demand[15:20]).all()
+    with pytest.raises(ValueError):
+        rolling_demand(t_start, values, interval=5, window=12)
+
+
+def test_monthly_demand():
+    """Matches a rolling sum in pandas"""
+    m = NEMFile("examples/unzipped/Example_NEM12_month_solar.csv")
+    df = m.get_data_frame()
+    df = df[df["suffix"] == "E1"].sort_values("t_start")
+    result = monthly_demand(df["t_start"], df["value"], interval=5, window=30)
+
+    march = df.set_index("t_start")["value"].rolling(6).sum() * 2
+    assert [x.month for x in result] == ["2023-03"]
+    assert result[0].max_demand == pytest.approx(march.max())
+    assert result[0].peak_start == march.idxmax() - pd.Timedelta(minutes=25)
+    average = df["value"].sum() / (len(df) / 12)
+    assert result[0].energy == pytest.approx(df["value"].sum())
+    assert result[0].load_factor == pytest.approx(average / march.max())
+
+
+def test_coincident_peak():
+    t_start = np.arange("2024-01-01T00:00", "2024-01-01T03:00", 30, "datetime64[m]")
+    series = {
+        "A": (t_start, np.array([1, 2, 3, 1, 1, 1])),
+        "B": (t_start, np.array([2, 1, 0, 5, 1, 1])),
+    }
+    peak = coincident_peak(series, interval=30, window=30)
+    assert peak.peak_start == datetime(2024, 1, 1, 1, 30)
+    assert peak.demand == 12
+    assert peak.contributions == {"A": 2, "B": 10}
+
+
+def test_monthly_demand_table(tmp_path):
+    file_name = "examples/unzipped/Example_NEM12_month_solar.csv"
+    fp = output_as_sqlite(file_name, output_dir=tmp_path)
+    extend_sqlite(fp, demand_window=30)
+    rows = list(Database(fp).query("select * from monthly_demand"))
+    assert rows[0]["nmi"] == "NMI1234567"
+    assert rows[0]["month"] == "2023-03"
+    assert rows[0]["max_demand"] > 0
+
+    peak = calc_coincident_peak(fp)
+    assert peak.demand == pytest.approx(rows[0]["max_demand"], abs=0.001)
@@ -1,11 +1,23 @@
+import bz2
+import gzip
+import lzma
 from pathlib import Path
 
+import pytest
+
 from nemreader import (
+    NEMFile,
     nmis_in_file,
     output_as_csv,
     output_as_daily_csv,
     output_as_data_frames,
 )
+from nemreader.outputs import (
+    COMPRESSIONS,
+    bytes_written,
+    daily_rows,
+    flatten_and_group_rows,
+)
 
 
 def test_nmi_output():
@@ -29,6 +41,50 @@ def test_csv_output(tmp_path: Path):
     assert len(output_files) == 1
 
 
+def test_csv_output_channels(tmp_path: Path):
+    """Each NMI only has columns for its own channels"""
+    file_name = "examples/unzipped/Example_NEM12_multiple_meters.csv"
+    output_files = output_as_csv(file_name, output_dir=tmp_path)
+    assert len(output_files) == 2
+    for output_file in output_files:
+        text = output_file.read_text()
+        headings = text.splitlines()[0]
+        if output_file.name.startswith("NDDD001888"):
+            assert headings == "t_start,t_end,B1,K2,quality,evt_code,evt_desc"
+        else:
+            assert headings == "t_start,t_end,B1,E1,E2,Q1,quality,evt_code,evt_desc"
+    first_row = output_files[0].read_text().splitlines()[1]
+    assert first_row.startswith("2003-12-04 00:00:00,2003-12-04 00:15:00,")
+
+
+def test_csv_output_split_nmi(tmp_path: Path):
+    """Readings for a NMI in different parts of the file are combined"""
+    values = ",".join(["1.5"] * 48)
+    lines = ["100,NEM12,200405011135,MDA1,Ret1"]
+    for nmi, day in (("NMI1", "20040201"), ("NMI2", "20040201"), ("NMI1", "20040202")):
+        lines.append(f"200,{nmi},E1,1,E1,N1,METSER123,kWh,30,")
+        lines.append(f"300,{day},{values},A,,,20040203120000,")
+    lines.append("900")
+    file_name = tmp_path / "split.csv"
+    file_name.write_text("\n".join(lines))
+    output_files = output_as_csv(file_name, output_dir=tmp_path)
+    names = sorted(x.name for x in output_files)
+    assert names == ["NMI1_20040203_transposed.csv", "NMI2_20040202_transposed.csv"]
+    assert not (tmp_path / "NMI1_20040202_transposed.csv").exists()
+    nmi1 = (tmp_path / names[0]).read_text().splitlines()
+    assert len(nmi1) == 1 + 96
+
+
+def test_csv_output_workers(tmp_path: Path):
+    """Writing NMIs in a thread pool gives the same files"""
+    file_name = "examples/unzipped/Example_NEM12_multiple_meters.csv"
+    serial = output_as_csv(file_name, output_dir=tmp_path / "serial")
+    pooled = output_as_csv(file_name, output_dir=tmp_path / "pool", workers=2)
+    assert [x.name for x in serial] == [x.name for x in pooled]
+    for x, y in zip(serial, pooled, strict=True):
+        assert x.read_text() == y.read_text()
+
+
 def test_daily_csv_output(tmp_path: Path):
     """Create a temporary csv output"""
     file_name = "examples/unzipped/Example_NEM12_actual_interval.csv"
@@ -36,6 +92,83 @@ def test_daily_csv_output(tmp_path: Path):
     assert "Example_NEM12_actual_interval_daily_totals.csv" in str(output_file)
 
 
+@pytest.mark.parametrize(
+    ("compression", "opener"),
+    [("gzip", gzip.open), ("bz2", bz2.open), ("xz", lzma.open)],
+)
+def test_compressed_csv_output(tmp_path: Path, compression, opener):
+    """Compressed outputs have the same contents as the plain csv"""
+    file_name = "examples/unzipped/Example_NEM12_multiple_meters.csv"
+    plain = output_as_csv(file_name, output_dir=tmp_path)
+    compressed = output_as_csv(
+        file_name, output_dir=tmp_path, compression=compression, level=1
+    )
+    suffix = COMPRESSIONS[compression][0]
+    for x, y in zip(plain, compressed, strict=True):
+        assert y.name == x.name + suffix
+        with opener(y, "rt", newline="") as f:
+            assert f.read() == x.read_text()
+
+    daily = output_as_daily_csv(file_name, output_dir=tmp_path)
+    daily_gz = output_as_daily_csv(file_name, output_dir=tmp_path, compression="gzip")
+    assert daily_gz.name.endswith("_daily_totals.csv.gz")
+    assert bytes_written([daily_gz]) < bytes_written([daily])
+    with gzip.open(daily_gz, "rt") as f:
+        assert f.read() == daily.read_text()
+
+    with pytest.raises(ValueError):
+        output_as_daily_csv(file_name, output_dir=tmp_path, compression="zip")
+
+
+@pytest.mark.parametrize(
+    "file_name",
+    [
+        "examples/unzipped/Example_NEM12_multiple_quality.csv",
+        "examples/unzipped/Example_NEM12_multiple_meters.csv",
+        "examples/unzipped/Example_NEM12_month_solar.csv",
+    ],
+)
+def test_daily_rows(file_name):
+    """The array based daily totals match totals of the readings"""
+    nf = NEMFile(file_name)
+    m = nf.nem_data()
+    expected = []
+    for nmi, channels in m.readings.items():
+        days: dict[str, list] = {}
+        for ch, reads in channels.items():
+            for read in reads:
+                day = read.t_start.strftime("%Y%m%d")
+                row = days.setdefault((day, ch), [nmi, "", day, ch, 0.0, "", set()])
+                row[1], row[5] = read.meter_serial_number, read.uom
+                row[4] += read.read_value
+                row[6].add(read.quality_method)
+        for row in days.values():
+            quality = "".join(row[6])
+            expected.append((*row[:6], quality if len(quality) <= 1 else "V"))
+    assert list(daily_rows(nf.columnar_data())) == expected
+
+
+def test_flatten_and_group_rows_deprecated():
+    """The old daily totals still work but warn"""
+    file_name = "examples/unzipped/Example_NEM12_multiple_meters.csv"
+    nf = NEMFile(file_name)
+    m = nf.nem_data()
+    rows = []
+    for nmi in m.readings:
+        with pytest.warns(DeprecationWarning):
+            rows += flatten_and_group_rows(nmi, m.transactions[nmi], m.readings[nmi])
+    assert rows == list(daily_rows(nf.columnar_data()))
+
+
+def test_daily_csv_nem13(tmp_path: Path):
+    """Accumulation meter readings are split into days"""
+    file_name = "examples/unzipped/Example_NEM13_consumption_data.csv"
+    output_file = output_as_daily_csv(file_name, output_dir=tmp_path)
+    lines = output_file.read_text().splitlines()
+    assert len(lines) > 2
+    assert lines[0] == "nmi,meter_sn,day,channel,day_total,uom,quality_method"
+
+
 def test_data_frame_output():
     """Create a pandas dataframe"""
     file_name = "examples/unzipped/Example_NEM12_actual_interval.csv"
@@ -41,6 +41,19 @@ def test_correct_records():
     assert readings["Q1"][-1].quality_method == "A"
 
 
+def test_dedup_records():
+    """Only the last version of a repeated interval date is kept"""
+    nf = NEMFile(
+        "examples/invalid/Example_NEM12_powercor.csv", strict=False, dedup=True
+    )
+    readings = nf.nem_data().readings["VABD000163"]
+
+    assert len(readings["E1"]) == 48
+    assert readings["E1"][10].read_value == pytest.approx(3.33, 0.1)
+    assert len(readings["Q1"]) == 48
+    assert readings["Q1"][0].read_value == pytest.approx(4.44, 0.1)
+
+
 def test_zipped_load():
     nf = NEMFile("examples/invalid/Example_NEM12_powercor.csv.zip", strict=False)
     assert "VABD000163" in nf.nmis
@@ -1,6 +1,27 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+import numpy as np
+import pytest
 from sqlite_utils import Database
 
-from nemreader import extend_sqlite, output_as_sqlite, output_folder_as_sqlite
+from nemreader import (
+    extend_sqlite,
+    output_as_sqlite,
+    output_folder_as_sqlite,
+    read_readings,
+)
+from nemreader.output_db import (
+    close_readers,
+    create_net_readings_table,
+    fetch_readings,
+    get_nmi_channels,
+    get_nmi_date_range,
+    get_nmi_readings,
+    get_reader,
+    save_readings,
+)
+from nemreader.shards import remove_sqlite, shard_paths
 
 
 def test_db_output():
@@ -28,3 +49,287 @@ def test_folder_to_db_output():
     fp = output_folder_as_sqlite(file_dir, replace=True)
     extend_sqlite(fp)
     assert fp.name == "nemdata.db"
+
+
+def test_read_readings(tmp_path):
+    """Read a date range of readings back as arrays"""
+    file_name = "examples/unzipped/Example_NEM12_actual_interval.csv"
+    fp = output_as_sqlite(file_name, output_dir=tmp_path)
+
+    readings = read_readings(fp, "VABD000163")
+    assert set(readings) == {"E1", "Q1"}
+    assert len(readings["E1"].value) == 48
+    assert readings["E1"].t_start[0] == np.datetime64("2004-02-01T00:00:00")
+    assert readings["E1"].t_end[-1] == np.datetime64("2004-02-02T00:00:00")
+    assert readings["Q1"].value.sum() == pytest.approx(48 * 2.222)
+
+    start = datetime(2004, 2, 1, 12)
+    end = datetime(2004, 2, 1, 13)
+    df = read_readings(fp, "VABD000163", ["E1"], start, end, as_="pandas")
+    assert list(df["channel"]) == ["E1", "E1"]
+    assert df["t_start"].iloc[0] == start
+
+    db = Database(fp)
+    assert not [x for x in db["readings"].indexes if x.origin != "pk"]
+    assert read_readings(fp, "VABD000163", end=date(2004, 2, 1)) == {}
+    assert read_readings(fp, "NOTANMI") == {}
+
+    # The time range is searched within each channel of the primary key
+    queries = []
+    db = Database(fp, tracer=lambda sql, params: queries.append((sql, params)))
+    fetch_readings(db, "VABD000163", start=start, end=end)
+    sql, params = queries[-1]
+    plan = db.conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    assert "nmi=? AND channel=? AND t_start>? AND t_start<?" in str(plan)
+
+
+def test_db_reader(tmp_path):
+    """Cached metadata is refreshed when the database changes"""
+    file_name = "examples/unzipped/Example_NEM12_actual_interval.csv"
+    fp = output_as_sqlite(file_name, output_dir=tmp_path)
+    reader = get_reader(fp)
+    assert get_reader(str(fp)) is reader
+    assert reader.nmis() == {"VABD000163"}
+    assert get_nmi_channels(fp, "VABD000163") == {"E1", "Q1"}
+
+    output_as_sqlite("examples/unzipped/Example_NEM12_month_solar.csv", tmp_path)
+    assert reader.nmis() == {"VABD000163", "NMI1234567"}
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        ranges = list(pool.map(get_nmi_date_range, [fp] * 8, ["NMI1234567"] * 8))
+    assert ranges[0] == (datetime(2023, 3, 1), datetime(2023, 4, 1))
+    assert len(set(ranges)) == 1
+    reader.close()
+    assert len(get_nmi_readings(fp, "VABD000163", "E1")) == 48
+
+
+def test_close_readers(tmp_path, monkeypatch):
+    """Shared readers are bounded and can be closed"""
+    monkeypatch.setattr("nemreader.output_db.MAX_READERS", 2)
+    file_name = "examples/unzipped/Example_NEM12_actual_interval.csv"
+    paths = [
+        output_as_sqlite(file_name, output_dir=tmp_path, output_file=f"{i}.db")
+        for i in range(3)
+    ]
+    readers = []
+    for path in paths:
+        readers.append(get_reader(path))
+        assert readers[-1].nmis() == {"VABD000163"}
+    assert readers[0]._connections == []  # Least recently used is closed
+    assert readers[2]._connections
+    assert get_reader(paths[0]) is not readers[0]
+    close_readers()
+    assert all(x._connections == [] for x in readers)
+    assert get_reader(paths[2]) is not readers[2]
+
+
+def test_replace_closes_reader(tmp_path):
+    """The shared reader of a database is closed before it is replaced"""
+    file_name = "examples/unzipped/Example_NEM12_actual_interval.csv"
+    path = output_as_sqlite(file_name, output_dir=tmp_path)
+    reader = get_reader(path)
+    assert reader.nmis() == {"VABD000163"}
+    output_as_sqlite(file_name, output_dir=tmp_path, replace=True)
+    assert reader._connections == []
+    assert get_reader(path) is not reader
+    assert get_reader(path).nmis() == {"VABD000163"}
+
+    catalog = output_as_sqlite(
+        file_name, output_dir=tmp_path, output_file="c.db", shards=2
+    )
+    readers = [get_reader(x) for x in shard_paths(catalog)]
+    assert sum(len(x.nmis()) for x in readers) == 1
+    remove_sqlite(catalog)
+    assert all(x._connections == [] for x in readers)
+    close_readers()
+
+
+def test_net_readings(tmp_path):
+    """The net readings table matches the combined readings view"""
+    for file_name in (
+        "examples/unzipped/Example_NEM12_actual_interval.csv",
+        "examples/unzipped/Example_NEM12_month_solar.csv",
+        "examples/unzipped/Example_NEM12_multiple_meters.csv",
+    ):
+        fp = output_as_sqlite(file_name, output_dir=tmp_path, net_readings=True)
+    extend_sqlite(fp)
+
+    db = Database(fp)
+    combined = list(db.query("select * from combined_readings"))
+    net = list(db.query("select * from net_readings order by nmi, t_start"))
+    assert len(net) == len(combined)
+    assert net == combined
+
+
+def test_net_readings_later_writes(tmp_path):
+    """The net readings table is kept up to date by writes without the option"""
+    fp = output_as_sqlite(
+        "examples/unzipped/Example_NEM12_actual_interval.csv",
+        output_dir=tmp_path,
+        net_readings=True,
+    )
+    first = next(Database(fp).query("select * from net_readings order by t_start"))
+    new_file = tmp_path / "day.csv"
+    write_day(new_file, "20040301000000", 5.0)
+    output_as_sqlite(new_file, output_dir=tmp_path)
+    output_as_sqlite(
+        "examples/unzipped/Example_NEM12_multiple_meters.csv", output_dir=tmp_path
+    )
+    db = Database(fp)
+    db.execute("DELETE FROM readings WHERE nmi = 'NDDD001888' AND channel = 'K2'")
+    db.execute("DELETE FROM readings WHERE nmi = 'NCDE001111'")
+    db.conn.commit()
+    extend_sqlite(fp)
+
+    combined = list(db.query("select * from combined_readings"))
+    net = list(db.query("select * from net_readings order by nmi, t_start"))
+    assert net == combined
+    sql = "select value from net_readings where nmi = ? and t_start = ?"
+    value = db.execute(sql, [first["nmi"], first["t_start"]]).fetchone()[0]
+    assert value != first["value"]
+
+
+def test_net_readings_upserts(tmp_path):
+    """Each upserted reading recalculates its interval at most once"""
+    db = Database(tmp_path / "net.db")
+    create_net_readings_table(db)
+    items = [
+        {
+            "nmi": "NMI1234567",
+            "channel": channel,
+            "t_start": datetime(2024, 1, 1, hour),
+            "t_end": datetime(2024, 1, 1, hour + 1),
+            "value": 1.0,
+            "quality_method": "A",
+            "event_code": None,
+            "event_desc": None,
+        }
+        for channel in ("E1", "B1")
+        for hour in range(4)
+    ]
+    changes = []
+    for value in (1.0, 1.0, 1.0, 3.0):  # Only E1 changes in the last write
+        for item in items:
+            if item["channel"] == "E1":
+                item["value"] = value
+        before = db.conn.total_changes
+        save_readings(db, items)
+        changes.append(db.conn.total_changes - before)
+        assert db["net_readings"].count == 4
+    # Insert then update each reading, and recalculate its interval once
+    assert changes == [3 * 8, 8, 8, 8 + 4]
+    values = [x["value"] for x in db["net_readings"].rows]
+    assert values == [2.0] * 4
+
+
+def write_day(path, update_datetime: str, value: float):
+    """Write a single day NEM12 file with a given UpdateDateTime"""
+    values = ",".join([str(value)] * 48)
+    path.write_text(
+        "100,NEM12,200405011135,MDA1,Ret1\n"
+        "200,VABD000163,E1,1,E1,N1,METSER123,kWh,30,\n"
+        f"300,20040201,{values},A,,,{update_datetime},\n"
+        "900\n"
+    )
+    return path
+
+
+def test_dedup_versions(tmp_path):
+    """Older versions of a day are not written over newer ones"""
+    newer = write_day(tmp_path / "newer.csv", "20040203120000", 2.0)
+    older = write_day(tmp_path / "older.csv", "20040202120000", 1.0)
+    for fp in (newer, older):
+        db_path = output_as_sqlite(fp, output_dir=tmp_path, dedup=True)
+
+    db = Database(db_path)
+    values = {x["value"] for x in db.query("select value from readings")}
+    assert values == {2.0}
+    versions = list(db.query("select * from record_versions"))
+    assert len(versions) == 1
+    assert versions[0]["update_datetime"] == "2004-02-03T12:00:00"
+    assert versions[0]["file_name"] == str(newer)
+
+    latest = write_day(tmp_path / "latest.csv", "20040204120000", 3.0)
+    output_as_sqlite(latest, output_dir=tmp_path, dedup=True)
+    values = {x["value"] for x in db.query("select value from readings")}
+    assert values == {3.0}
+
+
+def test_changed_only(tmp_path):
+    """Days are only written again if their readings have changed"""
+    first = write_day(tmp_path / "first.csv", "20040202120000", 1.0)
+    db_path = output_as_sqlite(first, output_dir=tmp_path, changed_only=True)
+    db = Database(db_path)
+    assert db["day_checksums"].count == 1
+    db.execute("UPDATE readings SET value = 0")
+    db.conn.commit()
+
+    # An unchanged day is skipped, so the edited values are not replaced
+    output_as_sqlite(first, output_dir=tmp_path, changed_only=True)
+    assert {x["value"] for x in db.query("select value from readings")} == {0.0}
+
+    second = write_day(tmp_path / "second.csv", "20040203120000", 2.0)
+    output_as_sqlite(second, output_dir=tmp_path, changed_only=True)
+    assert {x["value"] for x in db.query("select value from readings")} == {2.0}
+    assert db["day_checksums"].count == 1
+
+    # Writing without checking removes the checksums of the days written
+    output_as_sqlite(first, output_dir=tmp_path)
+    assert db["day_checksums"].count == 0
+    output_as_sqlite(second, output_dir=tmp_path, changed_only=True)
+    assert {x["value"] for x in db.query("select value from readings")} == {2.0}
+
+
+def test_changed_only_queries(tmp_path, monkeypatch):
+    """The saved checksums are loaded once for each NMI"""
+    values = ",".join(["1.0"] * 48)
+    lines = ["100,NEM12,200405011135,MDA1,Ret1"]
+    for day in ("20040201", "20040202", "20040203"):
+        for channel in ("E1", "B1"):
+            lines.append(f"200,VABD000163,E1B1,1,{channel},N1,METSER123,kWh,30,")
+            lines.append(f"300,{day},{values},A,,,20040203120000,")
+    lines.append("900")
+    file_name = tmp_path / "days.csv"
+    file_name.write_text("\n".join(lines))
+    output_as_sqlite(file_name, output_dir=tmp_path, changed_only=True)
+
+    queries = []
+    execute = Database.execute
+
+    def count_execute(self, sql, *args, **kwargs):
+        queries.append(sql)
+        return execute(self, sql, *args, **kwargs)
+
+    monkeypatch.setattr(Database, "execute", count_execute)
+    output_as_sqlite(file_name, output_dir=tmp_path, changed_only=True)
+    assert len([x for x in queries if "FROM day_checksums" in x]) == 1
+
+
+def test_batch_size(tmp_path):
+    """Writing in small batches gives the same readings"""
+    file_name = "examples/unzipped/Example_NEM12_multiple_meters.csv"
+    small = output_as_sqlite(file_name, output_dir=tmp_path, batch_size=7)
+    large = output_as_sqlite(file_name, output_dir=tmp_path, output_file="large.db")
+    sql = "select * from readings order by nmi, channel, t_start"
+    rows = list(Database(small).query(sql))
+    assert rows == list(Database(large).query(sql))
+    assert len(rows) > 7
+
+
+def test_extend_workers(tmp_path):
+    """Summaries calculated in worker processes match the serial ones"""
+    for file_name in (
+        "examples/unzipped/Example_NEM12_multiple_meters.csv",
+        "examples/unzipped/Example_NEM12_month_solar.csv",
+    ):
+        serial = output_as_sqlite(file_name, output_dir=tmp_path)
+        parallel = output_as_sqlite(
+            file_name, output_dir=tmp_path, output_file="parallel.db"
+        )
+    extend_sqlite(serial, demand_window=30)
+    extend_sqlite(parallel, demand_window=30, workers=2)
+    for table in ("daily_reads", "monthly_demand"):
+        sql = f"select * from {table} order by 1, 2"
+        rows = list(Database(serial).query(sql))
+        assert rows
+        assert rows == list(Database(parallel).query(sql))
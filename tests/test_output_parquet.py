@@ -0,0 +1,62 @@
+from pathlib import Path
+
+import pytest
+
+from nemreader import output_as_parquet
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def test_parquet_output(tmp_path: Path):
+    """Output data to a partitioned parquet dataset"""
+    file_name = "examples/unzipped/Example_NEM12_multiple_meters.csv"
+    dataset = output_as_parquet(file_name, output_dir=tmp_path)
+
+    parts = sorted(dataset.glob("nmi=*/month=*/*.parquet"))
+    assert [p.parent.parent.name for p in parts] == [
+        "nmi=NCDE001111",
+        "nmi=NDDD001888",
+    ]
+    assert parts[0].parent.name == "month=2003-12"
+
+    table = pq.read_table(tmp_path, partitioning="hive")
+    assert table.num_rows == 12 * 96
+    assert str(table.schema.field("t_start").type) == "timestamp[ms]"
+    assert table.schema.field("quality_method").type.value_type == "string"
+
+
+def test_parquet_output_row_groups(tmp_path: Path):
+    """Partitions are written out in row groups as they fill"""
+    file_name = "examples/unzipped/Example_NEM12_month_solar.csv"
+    dataset = output_as_parquet(
+        file_name, output_dir=tmp_path, set_interval=30, row_group_size=1000
+    )
+    part = next(dataset.glob("nmi=*/month=*/*.parquet"))
+    meta = pq.ParquetFile(part).metadata
+    assert meta.num_row_groups > 1
+    assert meta.num_rows == 62 * 48
+
+
+def test_parquet_output_open_partitions(tmp_path: Path):
+    """Partitions are closed when too many are open and reopened in new files"""
+    days = ["20240131", "20240201"]
+    rows = ["100,NEM12,202402020000,MDA1,Ret1"]
+    for channel in ("E1", "B1"):
+        rows.append(f"200,NMI0000001,E1B1,1,{channel},N1,SER1,kWh,30,")
+        rows += [
+            f"300,{day},{','.join(['1'] * 48)},A,,,20240202000000," for day in days
+        ]
+    rows.append("900")
+    file_name = tmp_path / "months.csv"
+    file_name.write_text("\n".join(rows))
+
+    dataset = output_as_parquet(
+        file_name, output_dir=tmp_path / "limited", max_open_partitions=1
+    )
+    parts = sorted(p.name for p in dataset.glob("nmi=*/month=2024-01/*.parquet"))
+    assert parts == ["months-1.parquet", "months.parquet"]
+    table = pq.read_table(dataset, partitioning="hive")
+    assert table.num_rows == 2 * 2 * 48
+
+    dataset = output_as_parquet(file_name, output_dir=tmp_path / "all")
+    assert len(list(dataset.glob("nmi=*/month=*/*.parquet"))) == 2
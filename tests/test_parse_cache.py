@@ -0,0 +1,109 @@
+import os
+from pathlib import Path
+
+from nemreader import NEMFile
+from nemreader.cache import ParseCache
+
+
+def test_cached_nem_data(tmp_path: Path):
+    """Data loaded from the cache matches a fresh parse"""
+    file_name = "examples/unzipped/Example_NEM12_multiple_quality.csv"
+    expected = NEMFile(file_name).nem_data()
+
+    first = NEMFile(file_name, cache=tmp_path).nem_data()
+    assert len(list(tmp_path.glob("*.npz"))) == 1
+
+    nf = NEMFile(file_name, cache=tmp_path)
+    nf.cache.save = None  # Would fail if the file were parsed again
+    cached = nf.nem_data()
+    for data in (first, cached):
+        assert data.header == expected.header
+        assert data.readings == expected.readings
+        assert data.transactions == expected.transactions
+    assert nf.nmis == {"CCCC123456"}
+
+
+def test_cached_nem13_zip(tmp_path: Path):
+    """NEM13 transactions are restored from the cache"""
+    file_name = "examples/nem13/NEM13#000000000000011#CNRGYMDP#NEMMCO.zip"
+    expected = NEMFile(file_name).nem_data()
+    NEMFile(file_name, cache=tmp_path).nem_data()
+    cached = NEMFile(file_name, cache=tmp_path).nem_data()
+    assert cached.header == expected.header
+    assert cached.readings == expected.readings
+    assert cached.transactions == expected.transactions
+
+
+def test_columnar_data(tmp_path: Path):
+    """Columnar data is returned without building readings"""
+    file_name = "examples/unzipped/Example_NEM12_multiple_meters.csv"
+    nf = NEMFile(file_name, cache=tmp_path)
+    columns = nf.columnar_data()
+    cached = NEMFile(file_name, cache=tmp_path).columnar_data()
+    assert len(columns) == len(cached) == 12 * 96
+    sl = cached.channel_slice("NDDD001888", "B1")
+    assert sl.stop - sl.start == 2 * 96
+    assert (cached.read_value == columns.read_value).all()
+    columns, transactions = NEMFile(
+        file_name, cache=tmp_path
+    ).columnar_with_transactions()
+    assert len(columns) == len(cached)
+    assert transactions == NEMFile(file_name).nem_data().transactions
+
+
+def test_cache_eviction(tmp_path: Path):
+    """Oldest entries are removed once the cache is too big"""
+    cache = ParseCache(tmp_path, max_size=1)
+    NEMFile(
+        "examples/unzipped/Example_NEM12_actual_interval.csv", cache=cache
+    ).nem_data()
+    assert not list(tmp_path.glob("*.npz"))
+    assert not list(tmp_path.glob("*.key"))
+
+
+def test_cache_eviction_key_files(tmp_path: Path):
+    """Key files are counted in the cache size and removed with their entry"""
+    files = [
+        "examples/unzipped/Example_NEM12_actual_interval.csv",
+        "examples/unzipped/Example_NEM12_multiple_meters.csv",
+    ]
+    cache = ParseCache(tmp_path)
+    NEMFile(files[0], cache=cache).nem_data()
+    entry = next(tmp_path.glob("*.npz"))
+    key_file = next(tmp_path.glob("*.key"))
+    os.utime(entry, (1, 1))  # Least recently used
+
+    # Only fits the newer entry once its key file is counted too
+    NEMFile(files[1], cache=cache).nem_data()
+    newer = [x for x in tmp_path.iterdir() if x not in (entry, key_file)]
+    cache.max_size = sum(x.stat().st_size for x in newer) + 1
+    cache.evict()
+    assert sorted(tmp_path.iterdir()) == sorted(newer)
+
+    # Key files of entries that are gone are removed as well
+    (tmp_path / "stale.key").write_text("0" * 64)
+    cache.evict()
+    assert sorted(tmp_path.iterdir()) == sorted(newer)
+
+
+def test_file_key(tmp_path: Path):
+    """The contents are only hashed when the size or modified time changes"""
+    file_name = tmp_path / "nem12.csv"
+    text = Path("examples/unzipped/Example_NEM12_actual_interval.csv").read_text()
+    file_name.write_text(text)
+    cache = ParseCache(tmp_path / "cache")
+    key = cache.file_key(file_name)
+    assert len(list(cache.cache_dir.glob("*.key"))) == 1
+
+    stat = file_name.stat()
+    file_name.write_text(text.replace("1.111", "2.222"))
+    os.utime(file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.file_key(file_name) == key  # Not hashed again
+
+    os.utime(file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.file_key(file_name) != key
+    file_name.write_text(text)
+    assert cache.file_key(file_name) == key  # Same contents
+
+    cache.clear()
+    assert not list(cache.cache_dir.glob("*.key"))
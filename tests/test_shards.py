@@ -0,0 +1,62 @@
+import pytest
+from sqlite_utils import Database
+
+from nemreader import extend_sqlite, output_as_sqlite
+from nemreader.shards import open_catalog, shard_paths
+
+FILES = (
+    "examples/unzipped/Example_NEM12_actual_interval.csv",
+    "examples/unzipped/Example_NEM12_multiple_meters.csv",
+    "examples/unzipped/Example_NEM12_month_solar.csv",
+)
+
+
+def query_all(db: Database, table: str) -> list[dict]:
+    return list(db.query(f"select * from {table} order by 1, 2, 3"))
+
+
+@pytest.mark.parametrize("shard_by", ["nmi", "month"])
+def test_sharded_output(tmp_path, shard_by):
+    """The catalog views match a single database"""
+    for file_name in FILES:
+        single = output_as_sqlite(file_name, output_dir=tmp_path)
+        catalog = output_as_sqlite(
+            file_name,
+            output_dir=tmp_path,
+            output_file="catalog.db",
+            shards=3,
+            shard_by=shard_by,
+        )
+    paths = shard_paths(catalog)
+    assert len(paths) == 3
+    assert all(x.exists() for x in paths)
+    extend_sqlite(single)
+    extend_sqlite(catalog)
+
+    db = open_catalog(catalog)
+    expected = Database(single)
+    for table in ("readings", "nmi_summary", "daily_reads", "monthly_reads"):
+        assert query_all(db, table) == query_all(expected, table)
+
+    for view in ("combined_readings", "latest_year", "latest_year_seasons"):
+        assert list(db.query(f"select * from {view} order by 1, 2")) == list(
+            expected.query(f"select * from {view} order by 1, 2")
+        )
+
+    # Each NMI is only in one shard
+    if shard_by == "nmi":
+        nmis = [x for p in paths for x in Database(p)["nmi_summary"].rows]
+        assert len(nmis) == len(query_all(expected, "nmi_summary"))
+
+
+def test_shard_settings(tmp_path):
+    """An existing catalog can not be split differently"""
+    file_name = FILES[0]
+    output_as_sqlite(file_name, output_dir=tmp_path, shards=2)
+    with pytest.raises(ValueError):
+        output_as_sqlite(file_name, output_dir=tmp_path, shards=3)
+    with pytest.raises(ValueError):
+        output_as_sqlite(file_name, output_dir=tmp_path, shards=2, shard_by="day")
+
+    output_as_sqlite(file_name, output_dir=tmp_path, shards=3, replace=True)
+    assert len(shard_paths(tmp_path / "nemdata.db")) == 3
@@ -0,0 +1,71 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from nemreader import NEMFile
+from nemreader.columnar import ARRAY_FIELDS
+from nemreader.shared_arrays import (
+    SharedReadings,
+    parse_files_shared,
+    parse_to_shared_memory,
+)
+
+
+def test_shared_matches_columnar():
+    """Arrays read from shared memory match a normal parse"""
+    file_name = "examples/unzipped/Example_NEM12_multiple_meters.csv"
+    expected = NEMFile(file_name).columnar_data()
+    handle = parse_to_shared_memory(file_name)
+    with SharedReadings(handle) as shared:
+        columns = shared.columns
+        assert columns.channels == expected.channels
+        assert columns.strings == expected.strings
+        for field in ARRAY_FIELDS:
+            np.testing.assert_array_equal(
+                getattr(columns, field), getattr(expected, field)
+            )
+        assert not columns.read_value.flags.owndata
+        assert columns.to_readings() == NEMFile(file_name).nem_data().readings
+
+        df = shared.data_frame()
+        assert len(df) == len(expected)
+        assert set(df["nmi"]) == {"NCDE001111", "NDDD001888"}
+        assert df["value"].sum() == np.nansum(expected.read_value)
+        del columns, df
+
+
+def test_parse_files_shared():
+    """Files parsed in worker processes are returned in order"""
+    file_names = [
+        "examples/unzipped/Example_NEM12_actual_interval.csv",
+        "examples/nem13/NEM13#000000000000011#CNRGYMDP#NEMMCO.zip",
+    ]
+    results = []
+    for shared in parse_files_shared(file_names, max_workers=2):
+        with shared:
+            results.append((shared.header, shared.columns.to_readings()))
+            assert shared.transactions
+    for file_name, (header, readings) in zip(file_names, results, strict=True):
+        expected = NEMFile(file_name).nem_data()
+        assert header == expected.header
+        assert readings == expected.readings
+
+
+@pytest.mark.skipif(not Path("/dev/shm").is_dir(), reason="needs /dev/shm")
+def test_parse_files_shared_cleanup():
+    """Results that are never yielded have their shared memory freed"""
+    blocks = set(Path("/dev/shm").glob("psm_*"))
+    file_names = ["examples/unzipped/Example_NEM12_actual_interval.csv"] * 4
+    results = parse_files_shared(file_names, max_workers=2)
+    with next(results) as shared:
+        assert shared.columns.to_readings()
+    results.close()
+    assert set(Path("/dev/shm").glob("psm_*")) == blocks
+
+    file_names = [file_names[0], "examples/invalid/missing.csv", *file_names]
+    with pytest.raises(FileNotFoundError):
+        for shared in parse_files_shared(file_names, max_workers=2):
+            with shared:
+                pass
+    assert set(Path("/dev/shm").glob("psm_*")) == blocks
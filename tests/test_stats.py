@@ -0,0 +1,58 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from nemreader import NEMFile, file_stats
+from nemreader.stats import ChannelStats, merge_stats
+
+
+@pytest.mark.parametrize(
+    "file_name",
+    [
+        "examples/unzipped/Example_NEM12_multiple_quality.csv",
+        "examples/unzipped/Example_NEM12_multiple_meters.csv",
+        "examples/unzipped/Example_NEM13_consumption_data.csv",
+        "examples/invalid/Example_NEM12_incomplete_interval.csv",
+    ],
+)
+def test_stats_match_readings(file_name):
+    """Statistics match those of the parsed readings"""
+    columns = NEMFile(file_name).columnar_data()
+    results = file_stats(file_name)
+    assert set(results) == set(columns.channels)
+    for key in columns.channels:
+        i = columns.channel_slice(*key)
+        values = columns.read_value[i]
+        stats = results[key]
+        assert stats.intervals == len(values)
+        assert stats.missing == np.isnan(values).sum()
+        assert stats.total == pytest.approx(np.nansum(values))
+        assert stats.maximum == np.nanmax(values)
+        assert stats.first == columns.t_start[i].min().astype(object)
+        assert stats.last == columns.t_end[i].max().astype(object)
+        quality = Counter(columns.strings[x] for x in columns.quality_method[i])
+        assert stats.quality == quality
+
+
+def test_stats_events():
+    """400 rows change the quality and events of their intervals"""
+    results = file_stats("examples/unzipped/Example_NEM12_multiple_quality.csv")
+    stats = results[("CCCC123456", "E1")]
+    assert stats.quality == {"F14": 20, "A": 4, "S14": 24}
+    assert stats.events == {"76": 20, "1": 24}
+
+
+def test_merge_stats():
+    file_name = "examples/unzipped/Example_NEM12_multiple_meters.csv"
+    results = file_stats(file_name)
+    merged = merge_stats([results, results])
+    for key, stats in results.items():
+        assert merged[key].intervals == 2 * stats.intervals
+        assert merged[key].total == pytest.approx(2 * stats.total)
+        assert merged[key].minimum == stats.minimum
+        assert merged[key].as_dict()["first"] == stats.as_dict()["first"]
+    assert stats.intervals == results[key].intervals  # Inputs are unchanged
+
+    empty = ChannelStats("NMI1", "E1")
+    assert empty.merge(ChannelStats("NMI1", "E1", "kWh")).as_dict()["minimum"] is None
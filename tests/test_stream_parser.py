@@ -0,0 +1,58 @@
+import pytest
+
+from nemreader import NEM12StreamParser, NEMFile
+
+
+def stream_file(file_name: str, chunk_size: int) -> tuple[NEM12StreamParser, list]:
+    parser = NEM12StreamParser(file_name=file_name)
+    blocks = []
+    with open(file_name, "rb") as f:
+        while chunk := f.read(chunk_size):
+            blocks += parser.feed(chunk)
+    blocks += parser.close()
+    return parser, blocks
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 100, 1_000_000])
+def test_stream_matches_file_blocks(chunk_size):
+    """Blocks are the same however the file is chunked"""
+    file_name = "examples/unzipped/Example_NEM12_multiple_quality.csv"
+    expected = list(NEMFile(file_name).iter_blocks())
+    parser, blocks = stream_file(file_name, chunk_size)
+    assert blocks == expected
+    assert parser.header.version_header == "NEM12"
+    assert parser.nmis == ["CCCC123456"]
+
+
+def test_stream_emits_blocks_early():
+    """Completed blocks are returned before the upload finishes"""
+    file_name = "examples/unzipped/Example_NEM12_month_solar.csv"
+    parser = NEM12StreamParser()
+    with open(file_name, "rb") as f:
+        data = f.read()
+    blocks = parser.feed(data[: len(data) // 2])
+    assert 0 < len(blocks) < 62
+    blocks += parser.feed(data[len(data) // 2 :])
+    blocks += parser.close()
+    assert len(blocks) == 62
+
+
+def test_stream_transactions():
+    file_name = "examples/unzipped/Example_NEM12_multiple_meters.csv"
+    parser, _ = stream_file(file_name, 50)
+    assert parser.transactions == NEMFile(file_name).nem_data().transactions
+
+
+def test_stream_missing_header():
+    file_name = "examples/invalid/Example_NEM12_missing_header.csv"
+    parser, blocks = stream_file(file_name, 64)
+    assert parser.header.assumed
+    assert blocks == list(NEMFile(file_name).iter_blocks())
+
+
+def test_stream_rejects_nem13():
+    parser = NEM12StreamParser()
+    with pytest.raises(ValueError):
+        parser.feed(b"100,NEM13,200405011135,MDA1,Ret1\n")
+    with pytest.raises(ValueError):
+        NEM12StreamParser(strict=True).close()
@@ -0,0 +1,87 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlite_utils import Database
+
+from nemreader import NEMFile, extend_sqlite, output_as_sqlite
+from nemreader.output_db import time_of_day
+from nemreader.tariffs import (
+    DEFAULT_SCHEDULE,
+    TariffPeriod,
+    TariffSchedule,
+    daily_band_totals,
+)
+
+TWO_RATE = TariffSchedule(
+    [
+        TariffPeriod("Peak", "07:00", "23:00", "weekday"),
+        TariffPeriod("Shoulder", "17:00", "20:00", "weekday", months=(6, 7, 8)),
+    ],
+    default="Off Peak",
+    holidays=[date(2024, 1, 26)],
+)
+
+
+def test_default_schedule_matches_time_of_day():
+    """The default schedule gives the same bands as time_of_day"""
+    start = datetime(2024, 3, 1)
+    times = [start + timedelta(minutes=5 * i) for i in range(7 * 288)]
+    bands = DEFAULT_SCHEDULE.label(times)
+    assert list(bands) == [time_of_day(x) for x in times]
+    assert DEFAULT_SCHEDULE.bands == ["Morning", "Day", "Evening", "Night"]
+
+
+def test_weekend_season_and_holiday():
+    times = [
+        datetime(2024, 1, 24, 8),  # Wednesday
+        datetime(2024, 1, 24, 23),  # Wednesday night
+        datetime(2024, 1, 26, 8),  # Friday public holiday
+        datetime(2024, 1, 27, 8),  # Saturday
+        datetime(2024, 7, 3, 18),  # Winter weekday evening
+        datetime(2024, 1, 3, 18),  # Summer weekday evening
+    ]
+    assert list(TWO_RATE.label(times)) == [
+        "Peak",
+        "Off Peak",
+        "Off Peak",
+        "Off Peak",
+        "Shoulder",
+        "Peak",
+    ]
+
+
+def test_wrap_past_midnight():
+    schedule = TariffSchedule([TariffPeriod("Controlled", "22:00", "07:00")])
+    times = np.array(["2024-01-01T23:00", "2024-01-01T06:30", "2024-01-01T12:00"])
+    assert list(schedule.label(times.astype("datetime64[m]"))) == [
+        "Controlled",
+        "Controlled",
+        "Other",
+    ]
+
+
+def test_data_frame_bands():
+    m = NEMFile("examples/unzipped/Example_NEM12_actual_interval.csv")
+    df = m.get_data_frame()
+    df["band"] = DEFAULT_SCHEDULE.label(df["t_start"])
+    assert df.groupby("band", observed=True).size()["Day"] == 2 * 14
+
+    days, totals = daily_band_totals(df["t_start"], df["value"])
+    assert days.tolist() == [date(2004, 2, 1)]
+    assert totals.sum() == pytest.approx(df["value"].sum())
+
+
+def test_tariff_reads(tmp_path):
+    file_name = "examples/unzipped/Example_NEM12_month_solar.csv"
+    fp = output_as_sqlite(file_name, output_dir=tmp_path)
+    extend_sqlite(fp, tariffs={"two_rate": TWO_RATE})
+
+    db = Database(fp)
+    sql = "select sum(imp) as imp from daily_tariff_reads group by day order by day"
+    tariff_totals = [x["imp"] for x in db.query(sql)]
+    daily_totals = [x["imp"] for x in db.query("select imp from daily_reads")]
+    assert len(tariff_totals) == 31
+    assert np.allclose(tariff_totals, daily_totals)
+    bands = {x["band"] for x in db.query("select band from daily_tariff_reads")}
+    assert bands == {"Peak", "Shoulder", "Off Peak"}
@@ -0,0 +1,38 @@
+import os
+
+from nemreader import NEMFile
+from nemreader.nem_reader import csv_tokenizer, fast_tokenizer
+
+
+def test_fast_tokenizer_matches_csv():
+    """Fast tokenizer splits rows the same as the csv module"""
+    test_path = os.path.abspath("examples/unzipped")
+    for file_name in os.listdir(test_path):
+        with open(os.path.join(test_path, file_name)) as f:
+            lines = f.readlines()
+        assert list(fast_tokenizer(lines)) == list(csv_tokenizer(lines))
+
+
+def test_fast_tokenizer_quoted_lines():
+    """Lines with quotes fall back to the csv module"""
+    lines = [
+        '500,S,"ORD,1",20031220154500,001123.5\r\n',
+        '300,20040201,"multi\n',
+        'line",A\n',
+        "\n",
+        "900\n",
+    ]
+    rows = list(fast_tokenizer(lines))
+    assert rows == list(csv_tokenizer(lines))
+    assert rows[0][2] == "ORD,1"
+    assert rows[1] == ["300", "20040201", "multi\nline", "A"]
+    assert rows[2] == []
+
+
+def test_pluggable_tokenizer():
+    """Parsing gives the same data whichever tokenizer is used"""
+    file_name = "examples/unzipped/Example_NEM12_multiple_quality.csv"
+    fast = NEMFile(file_name).nem_data()
+    slow = NEMFile(file_name, tokenizer=csv_tokenizer).nem_data()
+    assert fast.readings == slow.readings
+    assert fast.header == slow.header
@@ -0,0 +1,64 @@
+import glob
+
+import pytest
+
+from nemreader import NEMFile, validate_file
+
+
+@pytest.mark.parametrize(
+    "file_name",
+    sorted(glob.glob("examples/unzipped/*.csv") + glob.glob("examples/invalid/*.csv")),
+)
+def test_validate_matches_parse(file_name):
+    """A file is valid if and only if its readings can be read"""
+    result = validate_file(file_name)
+    try:
+        NEMFile(file_name).nem_data()
+    except ValueError as e:
+        assert not result.valid
+        assert result.error.startswith(str(e))
+    else:
+        assert result.valid
+        assert result.error is None
+
+
+def test_validate_warnings():
+    """Problems that are skipped over are reported"""
+    result = validate_file("examples/invalid/Example_NEM12_powercor.csv")
+    assert result.valid
+    assert result.version == "NEM12"
+    assert any("multiple end of data (900)" in x for x in result.warnings)
+
+    result = validate_file("examples/invalid/Example_NEM12_powercor.csv", strict=True)
+    assert not result.valid
+    assert "100 row" in result.error
+
+
+def test_validate_errors(tmp_path):
+    lines = [
+        "100,NEM12,200405011135,MDA1,Ret1",
+        "200,NMI1,E1,1,E1,N1,METSER123,kWh,30,",
+        "300,2004021,{},A,,,20040203120000,".format(",".join(["1.5"] * 48)),
+        "900",
+    ]
+    file_name = tmp_path / "bad_date.csv"
+    file_name.write_text("\n".join(lines))
+    result = validate_file(file_name)
+    assert not result.valid
+    assert result.error.startswith("Unable to parse line 2: Invalid interval date")
+
+    result = validate_file(tmp_path / "missing.csv")
+    assert not result.valid
+    assert result.version is None
+
+
+def test_validate_nem13_without_readings(monkeypatch):
+    """NEM13 rows are checked without calculating their readings"""
+
+    def no_readings(basic_data):
+        raise AssertionError("Reading should not be built")
+
+    monkeypatch.setattr("nemreader.nem_reader.calculate_manual_reading", no_readings)
+    result = validate_file("examples/unzipped/Example_NEM13_consumption_data.csv")
+    assert result.valid
+    assert result.version == "NEM13"